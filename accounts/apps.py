@@ -0,0 +1,12 @@
+"""
+Application configuration for the accounts app.
+"""
+from django.apps import AppConfig
+
+
+class AccountsConfig(AppConfig):
+    name = 'accounts'
+
+    def ready(self):
+        # pylint: disable=unused-import, import-outside-toplevel
+        import accounts.signals
@@ -0,0 +1,106 @@
+"""
+Avatar processing.
+
+Uploaded avatars are re-encoded in a background task (see lib.tasks), after
+the user is saved: the image is decoded (JPEGs at a reduced scale, with PIL's
+draft mode), bounded to AVATAR_SIZE and stored as a JPEG. Uploads whose
+content matches the image the current avatar was rendered from (see
+User.avatar_hash) are dropped before being written.
+
+Saving a user without uploading an avatar never touches the image.
+
+Users who didn't upload an avatar share the default avatar, rendered and
+saved once per process from the static images/avatar.png, which
+collect_media_garbage never deletes.
+"""
+import io
+from hashlib import sha256
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from lib.exceptions import LeviathanRegistrationException
+from lib.response_cache import invalidate_models
+from lib.tasks import run_in_background
+
+AVATAR_SIZE = (512, 512)
+AVATAR_QUALITY = 85
+
+DEFAULT_AVATAR_NAME = 'avatar/default.jpg'
+DEFAULT_AVATAR_SOURCE = 'images/avatar.png'
+
+_default_avatar_name = None
+
+
+def schedule_avatar_processing(user_id) -> None:
+    run_in_background(process_avatar, user_id)
+
+
+def process_avatar(user_id) -> bool:
+    """
+    Replaces a user's uploaded avatar by its processed version. Returns
+    whether the avatar changed.
+    """
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).only('avatar').first()
+    if user is None or not user.avatar:
+        return False
+    source = user.avatar.name
+    with user.avatar.open('rb') as upload:
+        content = upload.read()
+    # Named after its content by the storage, the upload is left to the
+    # garbage collection
+    user.avatar.save('avatar.jpg', ContentFile(render_avatar(content)), save=False)
+
+    with transaction.atomic():
+        # Unless another avatar was uploaded meanwhile
+        updated = User.objects.filter(pk=user_id, avatar=source).update(
+            avatar=user.avatar.name,
+            avatar_hash=sha256(content).hexdigest(),
+        )
+        if updated:
+            invalidate_models([User._meta.label])
+    return bool(updated)
+
+
+def get_content_hash(upload) -> str:
+    content_hash = sha256()
+    for chunk in upload.chunks():
+        content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def get_default_avatar(storage) -> str:
+    """
+    Returns the name of the default avatar, rendered and saved the first time
+    it's needed by the process.
+    """
+    global _default_avatar_name
+    if _default_avatar_name is None:
+        try:
+            with staticfiles_storage.open(DEFAULT_AVATAR_SOURCE) as source:
+                content = source.read()
+        except FileNotFoundError:
+            raise LeviathanRegistrationException("Missing default avatar in static files folder.")
+        # Named after its content, the file is only written once
+        _default_avatar_name = storage.save(DEFAULT_AVATAR_NAME, ContentFile(render_avatar(content)))
+    return _default_avatar_name
+
+
+def render_avatar(content: bytes) -> bytes:
+    """
+    Returns the image content as a JPEG bounded to AVATAR_SIZE.
+    """
+    image = Image.open(io.BytesIO(content))
+    # JPEGs are decoded at the smallest scale larger than AVATAR_SIZE
+    image.draft('RGB', AVATAR_SIZE)
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail(AVATAR_SIZE, Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=AVATAR_QUALITY, optimize=True)
+    return output.getvalue()
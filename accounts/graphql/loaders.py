@@ -0,0 +1,32 @@
+"""
+Provides DataLoaders for the accounts app (see lib.loaders).
+"""
+from accounts.models import User, TaggedUser, UserTagCount
+from lib.loaders import ModelLoader, GroupedLoader, CountLoader
+
+
+class UserByIdLoader(ModelLoader):
+    """
+    Loads users by primary key.
+    """
+    model = User
+
+
+class TagsByUserLoader(GroupedLoader):
+    """
+    Loads the tag names of users, by user primary key.
+    """
+
+    def get_pairs(self, keys):
+        return TaggedUser.objects.filter(
+            content_object_id__in=keys,
+        ).values_list('content_object_id', 'tag__name')
+
+
+class UserCountByTagLoader(CountLoader):
+    """
+    Loads the number of users tagged with a tag, by tag primary key.
+    """
+
+    def get_counts(self, keys):
+        return UserTagCount.objects.filter(tag_id__in=keys).values_list('tag_id', 'count')
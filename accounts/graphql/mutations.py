@@ -22,8 +22,8 @@ from graphql_jwt.relay import JSONWebTokenMutation
 from graphql_jwt.refresh_token.signals import refresh_token_rotated
 from graphql_jwt.decorators import login_required
 
-from constants.fields import USERNAME_BLACKLIST
 from accounts.models import User
+from accounts.usernames import create_user_from_email
 from accounts.graphql.types import PrivateUserType
 from lib.fields import PossiblyAbsentOrBlankCharField, TagsField
 
@@ -55,12 +55,10 @@ class RegisterUserForm(forms.ModelForm):
         Validates the captcha and saves the newly registered user to the
         database.
         """
-        user = User.objects.create_user(
-            email=self.instance.email,
-            username=self.generate_username_from_email(),
-            password=self.cleaned_data['password'],
+        return create_user_from_email(
+            self.instance.email,
+            self.cleaned_data['password'],
         )
-        return user
 
     def clean_password(self) -> str:
         """
@@ -97,27 +95,6 @@ class RegisterUserForm(forms.ModelForm):
 
     #     return username
 
-    def generate_username_from_email(self) -> str:
-        """
-        Generate the username using the provided email. Ensures that:
-
-        - it is valid (length and characters)
-        - it is not blacklisted
-        - it is not already in use
-        """
-        username = self.instance.email.split("@")[0]
-
-        i = 0
-        while User.objects.filter(username=username).exists() or username.lower() in USERNAME_BLACKLIST:
-            i += 1
-            #make sure username + number isnt over 20 characters
-            username = username[:20-len(str(i))] + str(i)
-
-        while len(username)<3:
-            username = username + "_"
-
-        return username
-
 class ProfileSettingsForm(forms.Form):
     """
     For used by profile settings mutation.
@@ -185,7 +162,7 @@ class ProfileSettingsForm(forms.Form):
                 # ... therefore we don't update it.
                 setattr(user, field, self.cleaned_data[field])
                 touched = True
-        for field in ('avatar'):
+        for field in ('avatar',):
             if len(self.cleaned_data[field]) > 0 and (self.cleaned_data[field] != getattr(user, field)):
                 # we check the length because django "normalizes" the value of
                 # absent non-required char/choice fields to empty strings
@@ -7,11 +7,14 @@ from functools import reduce
 import graphene
 from graphql_jwt.decorators import login_required
 from graphql import GraphQLError
-from django.db.models import Q
+from django.db.models import F, Q
 from django.db.models.query import QuerySet
 from django.utils.translation import ugettext_lazy as _
+from taggit.models import Tag
 
 from accounts.models import User
+from lib.connections import QuerySetConnectionField, KeysetConnectionField
+from lib.planner import QueryPlan, FieldPlan
 from .types import UserType, UserOrderBy, TagsType
 
 
@@ -21,6 +24,18 @@ class UserConnection(graphene.relay.Connection):
     class Meta:
         node = UserType
 
+    # Maps the UserType fields onto the columns and relations they need.
+    query_plan = QueryPlan({
+        'username': FieldPlan(only=('username',)),
+        'shortDescription': FieldPlan(only=('short_description',)),
+        'location': FieldPlan(only=('location',)),
+        'locationId': FieldPlan(only=('location_id',)),
+        'firstName': FieldPlan(only=('first_name',)),
+        'lastName': FieldPlan(only=('last_name',)),
+        'avatar': FieldPlan(only=('avatar',)),
+        'tags': FieldPlan(prefetch_related=('tags',)),
+    })
+
     @staticmethod
     def get_users_input_fields() -> dict:
         """
@@ -37,7 +52,7 @@ class UserConnection(graphene.relay.Connection):
         """
         Resolves the users query
         """
-        qs = User.objects.all()
+        qs = UserConnection.query_plan.apply(User.objects.all(), info)
 
         username = args.get('username', None)
         tags = args.get('tags', None)
@@ -77,7 +92,7 @@ class Query(graphene.ObjectType):
         return info.context.user.get_chat_token()
 
 
-users_field = graphene.relay.ConnectionField(
+users_field = KeysetConnectionField(
     UserConnection,
     resolver=UserConnection.resolve_users,
     **UserConnection.get_users_input_fields()
@@ -103,7 +118,10 @@ class TagsConnection(graphene.relay.Connection):
         """
         Resolves the most common tag query, filtered bu name
         """
-        qs =  User.tags.most_common()
+        # Read from the counters rather than counting the tagged users
+        qs = Tag.objects.filter(user_count__count__gt=0).annotate(
+            num_times=F('user_count__count'),
+        ).order_by('-num_times', 'pk')
 
         name = args.get('name', None)
 
@@ -112,7 +130,7 @@ class TagsConnection(graphene.relay.Connection):
 
         return qs
 
-tags_field = graphene.relay.ConnectionField(
+tags_field = QuerySetConnectionField(
     TagsConnection,
     resolver=TagsConnection.resolve_tags,
     **TagsConnection.get_tags_input_fields()
@@ -8,6 +8,9 @@ from graphene_django.converter import convert_django_field
 from taggit.models import Tag
 from taggit.managers import TaggableManager
 from accounts.models import User
+from accounts.graphql.loaders import TagsByUserLoader, UserCountByTagLoader
+from lib.loaders import get_loader
+from lib.planner import get_prefetched
 
 @convert_django_field.register(TaggableManager)
 def convert_tags_to_list_of_string(field, registry=None):
@@ -37,13 +40,26 @@ class UserType(DjangoObjectType):
         )
 
     pk = graphene.String(source='pk')
+    tags = graphene.List(graphene.String)
     similar_users = graphene.List(lambda: UserType)
 
+    def resolve_tags(self, info):
+        """
+        Resolves the user's tag names, prefetched by the query plan or through
+        the request's loader.
+        """
+        tags = get_prefetched(self, 'tags')
+        if tags is not None:
+            return [tag.name for tag in tags]
+        return get_loader(info, TagsByUserLoader).load(self.pk)
+
     def resolve_avatar(self, info) -> str:
         """
         Resolves the avatar field.
         """
-        return self.avatar.url
+        if self.avatar:
+            return self.avatar.url
+        return ''
 
     def resolve_similar_users(self, info):
         """
@@ -82,8 +98,19 @@ class PrivateUserType(DjangoObjectType):
         )
 
     pk = graphene.String(source='pk')
+    tags = graphene.List(graphene.String)
     has_password = graphene.Boolean()
 
+    def resolve_tags(self, info):
+        """
+        Resolves the user's tag names, prefetched by the query plan or through
+        the request's loader.
+        """
+        tags = get_prefetched(self, 'tags')
+        if tags is not None:
+            return [tag.name for tag in tags]
+        return get_loader(info, TagsByUserLoader).load(self.pk)
+
     def resolve_has_password(self, info) -> bool:
         """
         Resolves the has_password field.
@@ -94,7 +121,7 @@ class PrivateUserType(DjangoObjectType):
         """
         Resolves the avatar field.
         """
-        if self.avatar is not None:
+        if self.avatar:
             return self.avatar.url
         return ''
 
@@ -139,4 +166,8 @@ class TagsType(DjangoObjectType):
         """
         Resolves the number of users tagged with this tag.
         """
-        return self.accounts_taggeduser_items.count()
+        # The tags connection already read the counters
+        num_times = getattr(self, 'num_times', None)
+        if num_times is not None:
+            return num_times
+        return get_loader(info, UserCountByTagLoader).load(self.pk)
@@ -0,0 +1,136 @@
+"""
+Replaces the copies of the default avatar, written for every user registered
+before it was shared, by the shared default avatar (see accounts.avatars),
+and deletes them.
+
+Copies are recognized by their sha256: registration re-encoded the static
+avatar the same way for everyone, and the command reproduces that encoding.
+Copies made with another version of Pillow may differ, pass their sha256
+with --hash (e.g. the most frequent one in `sha256sum medias/avatar/*`).
+"""
+import io
+from hashlib import sha256
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+
+from accounts.avatars import DEFAULT_AVATAR_SOURCE, get_default_avatar
+from accounts.models import User
+from lib.models import StoredFile
+from lib.response_cache import invalidate_models
+
+
+class Command(BaseCommand):
+    help = "Replaces the per-user copies of the default avatar by the shared one."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of users checked per query.",
+        )
+        parser.add_argument(
+            '--hash',
+            action='append',
+            default=[],
+            help="sha256 of other copies of the default avatar (repeatable).",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only count the copies.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        storage = User._meta.get_field('avatar').storage
+        default = get_default_avatar(storage)
+
+        copies = get_legacy_hashes()
+        # The default avatar may also have been written under other names
+        with storage.open(default, 'rb') as avatar:
+            content = avatar.read()
+        copies[sha256(content).hexdigest()] = len(content)
+        # Files of other sizes can't be copies, unless of unknown ones
+        sizes = None if options['hash'] else set(copies.values())
+        hashes = set(copies) | {value.lower() for value in options['hash']}
+
+        users = User.objects.exclude(avatar__in=('', default)).exclude(avatar__isnull=True)
+        checked = 0
+        deduplicated = 0
+        freed = 0
+        last_pk = None
+        while True:
+            batch = users.order_by('pk')
+            if last_pk is not None:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(batch.values_list('pk', 'avatar')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            checked += len(batch)
+
+            found = {}
+            for pk, name in batch:
+                size = get_copy_size(storage, name, hashes, sizes)
+                if size is not None:
+                    found[pk] = (name, size)
+            deduplicated += len(found)
+            freed += sum(size for name, size in found.values())
+            if found and not options['dry_run']:
+                self.replace(storage, default, found)
+            self.stdout.write(f"{checked} users checked, {deduplicated} copies found")
+
+        action = "found" if options['dry_run'] else "replaced"
+        self.stdout.write(self.style.SUCCESS(
+            f"{deduplicated} copies of the default avatar {action} ({freed / 1024:.0f} KiB)."
+        ))
+
+    @staticmethod
+    def replace(storage, default: str, found: dict) -> None:
+        names = {name for name, size in found.values()}
+        # Files of the content-addressed storage are garbage-collected
+        names -= set(StoredFile.objects.filter(name__in=names).values_list('name', flat=True))
+        with transaction.atomic():
+            User.objects.filter(pk__in=list(found)).update(avatar=default, avatar_hash='')
+            invalidate_models([User._meta.label])
+            transaction.on_commit(lambda: [storage.delete(name) for name in names])
+
+
+def get_copy_size(storage, name: str, hashes: set, sizes) -> int:
+    """
+    Returns the size of the avatar file name if it is a copy of the default
+    avatar, None otherwise (or if it's missing).
+    """
+    try:
+        if sizes is not None and storage.size(name) not in sizes:
+            return None
+        with storage.open(name, 'rb') as avatar:
+            content = avatar.read()
+    except FileNotFoundError:
+        return None
+    return len(content) if sha256(content).hexdigest() in hashes else None
+
+
+def get_legacy_hashes() -> dict:
+    """
+    Returns the {sha256: size} of the copies of the default avatar made at
+    registration: encoded once by the user manager, then again by
+    User.save().
+    """
+    with staticfiles_storage.open(DEFAULT_AVATAR_SOURCE) as source:
+        image = Image.open(io.BytesIO(source.read()))
+    copies = {}
+    for size in ((512, 512), None):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail(size or image.size, Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=100)
+        content = output.getvalue()
+        copies[sha256(content).hexdigest()] = len(content)
+        image = Image.open(io.BytesIO(content))
+    return copies
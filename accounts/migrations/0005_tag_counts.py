@@ -0,0 +1,37 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_tags(apps, schema_editor):
+    TaggedUser = apps.get_model('accounts', 'TaggedUser')
+    UserTagCount = apps.get_model('accounts', 'UserTagCount')
+    UserTagCount.objects.bulk_create([
+        UserTagCount(tag_id=tag_id, count=count)
+        for tag_id, count in TaggedUser.objects.values_list('tag_id').annotate(count=models.Count('pk'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0003_taggeditem_add_unique_index'),
+        ('accounts', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTagCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='Number of users')),
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='user_count', to='taggit.Tag', verbose_name='Tag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usertagcount',
+            index=models.Index(fields=['-count'], name='accounts_us_count_fc0239_idx'),
+        ),
+        migrations.RunPython(count_tags, migrations.RunPython.noop),
+    ]
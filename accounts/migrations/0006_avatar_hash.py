@@ -0,0 +1,18 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_tag_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Avatar hash'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:53
+
+import accounts.models
+from django.db import migrations, models
+import lib.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=lib.storage.ContentAddressedStorage(), upload_to=accounts.models.upload_path_handler_avatar, verbose_name='avatar'),
+        ),
+    ]
@@ -3,24 +3,20 @@ import uuid
 from datetime import timedelta
 from typing import Optional, Union
 import os.path
-import io
-from PIL import Image as Img
 from unidecode import unidecode
 from taggit.managers import TaggableManager
 from taggit.models import TaggedItemBase
 
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.conf import settings
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager, PermissionsMixin)
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-from django.contrib.staticfiles.storage import staticfiles_storage
 
+from accounts.avatars import get_default_avatar
 from constants.fields import USERNAME_BLACKLIST
-from lib.exceptions import LeviathanRegistrationException
-from lib.storage import OverwriteStorage
+from lib.storage import ContentAddressedStorage
 
 
 def upload_path_handler_avatar(instance, filename):
@@ -37,32 +33,37 @@ class TaggedUser(TaggedItemBase):
     """
     content_object = models.ForeignKey('User', on_delete=models.CASCADE)
 
+class UserTagCount(models.Model):
+    """
+    Number of users tagged with a tag, kept up to date by the signal handlers
+    of accounts.signals.
+    """
+    tag = models.OneToOneField(
+        'taggit.Tag',
+        related_name='user_count',
+        verbose_name=_('Tag'),
+        on_delete=models.CASCADE,
+    )
+
+    count = models.IntegerField(
+        verbose_name=_('Number of users'),
+        default=0,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-count']),
+        ]
+
+    def __str__(self):
+        return f"{self.tag_id}: {self.count}"
+
 class LeviathanUserManager(BaseUserManager):
     """
     Replaces the default user manager (User.objects), providing shortcuts for
     creating users with different presets
     """
 
-    @staticmethod
-    def _duplicate_default_avatar(username: str):
-        image = Img.open(staticfiles_storage.path('images/avatar.png'))
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        image.thumbnail((512, 512), Img.ANTIALIAS)
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=100)
-        output.seek(0)
-        default_avatar = InMemoryUploadedFile(
-            output,
-            'ImageField',
-            "%s.jpg" % str(username),
-            'image/jpeg',
-            output.getbuffer().nbytes,
-            None)
-        if not default_avatar:
-            raise LeviathanRegistrationException(f"Missing default avatar in static files folder.")
-        return default_avatar
-
     def _create_user(
         self,
         email: str,
@@ -77,7 +78,7 @@ class LeviathanUserManager(BaseUserManager):
         """
         now = timezone.now()
         email = self.normalize_email(email)
-        avatar = self._duplicate_default_avatar(username)
+        avatar = get_default_avatar(self.model.avatar.field.storage)
 
         user = self.model(
             email=email.strip().lower(),
@@ -163,12 +164,21 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     avatar = models.ImageField(
         verbose_name=_('avatar'),
-        storage=OverwriteStorage(),
+        storage=ContentAddressedStorage(),
         upload_to=upload_path_handler_avatar,
         null=True,
         blank=True,
     )
 
+    # sha256 of the uploaded image the avatar was rendered from (see
+    # accounts.avatars)
+    avatar_hash = models.CharField(
+        verbose_name=_('Avatar hash'),
+        max_length=64,
+        blank=True,
+        editable=False,
+    )
+
     short_description = models.TextField(
         verbose_name=_('Short description'),
         max_length=300,
@@ -257,6 +267,14 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = LeviathanUserManager()
 
+    class Meta:
+        # Keyset pagination seeks on the ordering columns (see lib.connections)
+        indexes = [
+            models.Index(fields=['date_joined', 'id']),
+            models.Index(fields=['first_name', 'id']),
+            models.Index(fields=['last_name', 'id']),
+        ]
+
     def __str__(self):
         """
         Unicode representation fo an user model
@@ -302,29 +320,3 @@ class User(AbstractBaseUser, PermissionsMixin):
         Get user's tags
         """
         return self.tags.all()
-
-    def save(self, *args, **kwargs):
-        """
-        Save user model
-        """
-        try:
-            if self.avatar and self.avatar != (str(self.pk) + '.jpg'):
-                image = Img.open(io.BytesIO(self.avatar.read()))
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                image.thumbnail((self.avatar.width, self.avatar.height), Img.ANTIALIAS)
-                output = io.BytesIO()
-                image.save(output, format='JPEG', quality=100)
-                output.seek(0)
-                self.avatar = InMemoryUploadedFile(
-                    output,
-                    'ImageField',
-                    "%s.jpg" % str(self.pk),
-                    'image/jpeg',
-                    output.getbuffer().nbytes,
-                    None)
-
-        except Exception as e:
-            print('User avatar updates error:"', str(e))
-
-        super(User, self).save(*args, **kwargs)
@@ -0,0 +1,60 @@
+"""
+Signal handlers for the accounts app.
+
+Imported by AccountsConfig.ready() so that they are connected at startup.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.avatars import get_content_hash, schedule_avatar_processing
+from accounts.models import User, TaggedUser, UserTagCount
+from lib.counters import add_to_counter
+
+
+# ########## TAG COUNTERS ########## #
+
+
+@receiver(post_save, sender=TaggedUser)
+def count_user_tag(sender, instance, created, raw=False, **kwargs):
+    """
+    Counts a user tagged with a tag.
+    """
+    if created and not raw:
+        add_to_counter(UserTagCount, 1, tag_id=instance.tag_id)
+
+
+@receiver(post_delete, sender=TaggedUser)
+def uncount_user_tag(sender, instance, **kwargs):
+    """
+    Uncounts a user untagged (or deleted).
+    """
+    add_to_counter(UserTagCount, -1, tag_id=instance.tag_id)
+
+
+# ########## AVATARS ########## #
+
+
+@receiver(pre_save, sender=User)
+def detect_avatar_upload(sender, instance, raw=False, **kwargs):
+    """
+    Flags the users whose avatar was just uploaded, before the file is
+    committed to the storage by the save. Uploads of the image the current
+    avatar was rendered from are dropped.
+    """
+    uploaded = not raw and bool(instance.avatar) and not instance.avatar._committed
+    if uploaded and not instance._state.adding:
+        current = User.objects.filter(pk=instance.pk).values_list('avatar', 'avatar_hash').first()
+        if current and current[1] and current[1] == get_content_hash(instance.avatar):
+            instance.avatar = current[0]
+            uploaded = False
+    instance._avatar_uploaded = uploaded
+
+
+@receiver(post_save, sender=User)
+def process_uploaded_avatar(sender, instance, **kwargs):
+    """
+    Processes an uploaded avatar, in the background.
+    """
+    if getattr(instance, '_avatar_uploaded', False):
+        instance._avatar_uploaded = False
+        schedule_avatar_processing(instance.pk)
@@ -0,0 +1,71 @@
+"""
+Username generation.
+
+Registering users get the local part of their email as username, or, when it
+is taken or blacklisted, the first free one among `name1`, `name2`... (the
+name being truncated to fit the digits). The usernames taken among those
+candidates are fetched with a single query.
+
+Two concurrent registrations may still pick the same username: the loser's
+insert fails on the unique constraint, and the username is picked again.
+"""
+import re
+from itertools import count
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+
+from constants.fields import USERNAME_BLACKLIST
+
+USERNAME_MIN_LENGTH = 3
+USERNAME_MAX_LENGTH = 20
+
+# Digits appended at most to a username, enough for a million homonyms
+SUFFIX_MAX_DIGITS = 6
+
+ATTEMPTS = 5
+
+
+def create_user_from_email(email: str, password: str, **extra_fields):
+    """
+    Creates a user with a username generated from email.
+    """
+    User = get_user_model()
+    base = get_username_base(email)
+    for attempt in range(ATTEMPTS):
+        username = get_available_username(base)
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(email, username, password, **extra_fields)
+        except IntegrityError:
+            # Only a username taken meanwhile is worth another attempt
+            if attempt == ATTEMPTS - 1 or not User.objects.filter(username=username).exists():
+                raise
+
+
+def get_username_base(email: str) -> str:
+    """
+    Returns the username derived from email, before any suffix.
+    """
+    base = email.split('@')[0][:USERNAME_MAX_LENGTH]
+    return base.ljust(USERNAME_MIN_LENGTH, '_')
+
+
+def get_available_username(base: str) -> str:
+    """
+    Returns the first username neither taken nor blacklisted among base and
+    its numbered variants.
+    """
+    prefixes = {base[:USERNAME_MAX_LENGTH - digits] for digits in range(SUFFIX_MAX_DIGITS + 1)}
+    pattern = '^({})[0-9]*$'.format('|'.join(re.escape(prefix) for prefix in sorted(prefixes)))
+    taken = set(get_user_model().objects.filter(
+        # The shortest prefix, which can use the index, is refined by the regex
+        username__startswith=min(prefixes, key=len),
+        username__regex=pattern,
+    ).values_list('username', flat=True))
+
+    for i in count():
+        suffix = str(i) if i else ''
+        username = base[:USERNAME_MAX_LENGTH - len(suffix)] + suffix
+        if username not in taken and username.lower() not in USERNAME_BLACKLIST:
+            return username
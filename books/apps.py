@@ -0,0 +1,12 @@
+"""
+Application configuration for the books app.
+"""
+from django.apps import AppConfig
+
+
+class BooksConfig(AppConfig):
+    name = 'books'
+
+    def ready(self):
+        # pylint: disable=unused-import, import-outside-toplevel
+        import books.signals
@@ -0,0 +1,106 @@
+"""
+Bulk writes on books and their relations.
+
+bulk_create() and bulk_update() send no signal: these helpers write in bulk,
+then do what the handlers of books.signals would have done (tag counters,
+search index, similar books, response cache).
+"""
+from collections import Counter
+from typing import Iterable
+
+from django.db import connection, transaction
+from taggit.models import Tag
+
+from books.models import Book, Writer, BookTagCount
+from books.models.book import TaggedBook
+from books.search import index_books
+from books.similarity import schedule_similar_books_refresh
+from lib.counters import add_to_counters
+from lib.response_cache import invalidate_models
+
+
+def get_writer_ids(names: Iterable[str]) -> dict:
+    """
+    Returns the primary keys of the writers with the given names, by name,
+    creating the missing ones.
+    """
+    names = set(names)
+    writers = dict(Writer.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing = names - set(writers)
+    if missing:
+        Writer.objects.bulk_create([Writer(name=name) for name in missing], ignore_conflicts=True)
+        writers.update(Writer.objects.filter(name__in=missing).values_list('name', 'pk'))
+    return writers
+
+
+def get_tag_ids(names: Iterable[str]) -> dict:
+    """
+    Returns the primary keys of the tags with the given names, by name,
+    creating the missing ones.
+    """
+    names = set(names)
+    tags = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing = names - set(tags)
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name, slug=Tag().slugify(name)) for name in missing], ignore_conflicts=True)
+        tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+        for name in missing - set(tags):
+            # Its slug was taken by another tag, Tag.save() makes it unique
+            tags[name] = Tag.objects.get_or_create(name=name)[0].pk
+    return tags
+
+
+def create_books(books: list) -> None:
+    """
+    Inserts books in bulk, setting their primary keys.
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        Book.objects.bulk_create(books)
+    elif connection.vendor == 'sqlite':
+        with transaction.atomic():
+            Book.objects.bulk_create(books)
+            # SQLite serializes writes: until the transaction ends, no other
+            # one can insert, the books are the last rows, in insertion order
+            pks = list(Book.objects.order_by('-pk').values_list('pk', flat=True)[:len(books)])
+            for book, pk in zip(books, reversed(pks)):
+                book.pk = pk
+    else:
+        for book in books:
+            book.save()
+
+
+def add_writers(pairs: Iterable[tuple]) -> None:
+    """
+    Links books to writers, given (book_id, writer_id) pairs.
+    """
+    Book.writer.through.objects.bulk_create([
+        Book.writer.through(book_id=book_id, writer_id=writer_id)
+        for book_id, writer_id in set(pairs)
+    ], ignore_conflicts=True)
+
+
+def add_tags(pairs: Iterable[tuple]) -> None:
+    """
+    Tags books, given (book_id, tag_id) pairs of books that aren't tagged yet
+    with the tags.
+    """
+    pairs = set(pairs)
+    TaggedBook.objects.bulk_create([
+        TaggedBook(content_object_id=book_id, tag_id=tag_id) for book_id, tag_id in pairs
+    ])
+    counts = Counter(tag_id for book_id, tag_id in pairs)
+    add_to_counters(BookTagCount, {(tag_id,): count for tag_id, count in counts.items()}, ('tag_id',))
+
+
+def books_changed(book_ids: Iterable[int], retagged_ids: Iterable[int] = ()) -> None:
+    """
+    Updates what derives from books written in bulk: their search index
+    entries and the response cache, and the similar books of the books whose
+    tags changed (retagged_ids).
+    """
+    index_books(book_ids)
+    schedule_similar_books_refresh(retagged_ids)
+    invalidate_models([
+        Book._meta.label, Writer._meta.label, Book.writer.through._meta.label,
+        TaggedBook._meta.label,
+    ])
@@ -0,0 +1,129 @@
+"""
+Cover renditions.
+
+Uploaded covers are rendered in a background task (see lib.tasks) into the
+fixed set of RENDITIONS sizes, each in WebP and JPEG, along with a tiny
+blurred placeholder that clients display, inlined as a data URI, while the
+rendition loads. BookType.cover(size:) serves the URL of a rendition, or of
+the original cover until it is rendered.
+
+`manage.py render_covers` renders the covers uploaded before renditions
+existed, or left unrendered by a failed task.
+"""
+import base64
+import io
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageFilter, ImageOps
+
+from books.models import Book, CoverRendition
+from lib.response_cache import invalidate_models
+from lib.tasks import run_in_background
+
+# Bounding box of each size, covers are never enlarged
+RENDITIONS = {
+    'thumb': (160, 240),
+    'card': (400, 600),
+    'full': (1200, 1800),
+}
+
+# Pillow format and save() options of each format
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+PLACEHOLDER_SIZE = (16, 16)
+
+
+def schedule_cover_rendering(book_id: int) -> None:
+    run_in_background(render_cover, book_id)
+
+
+def render_cover(book_id: int) -> bool:
+    """
+    Renders the renditions and placeholder of a book's cover, replacing the
+    previous ones. Returns whether the cover was rendered.
+    """
+    book = Book.objects.filter(pk=book_id).only('cover').first()
+    if book is None or not book.cover:
+        return False
+    source = book.cover.name
+
+    with book.cover.open('rb') as cover:
+        image = Image.open(cover)
+        # JPEG covers are decoded at the smallest scale that fits the largest
+        # rendition, much faster than decoding them at full size
+        image.draft('RGB', max(RENDITIONS.values()))
+        image.load()
+    image = get_rgb_image(ImageOps.exif_transpose(image))
+
+    renditions = []
+    for size, box in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        for name, (image_format, options) in FORMATS.items():
+            output = io.BytesIO()
+            resized.save(output, image_format, **options)
+            rendition = CoverRendition(
+                book_id=book_id,
+                size=size,
+                format=name,
+                source=source,
+                width=resized.width,
+                height=resized.height,
+            )
+            # Named after its content by the storage
+            rendition.file.save('{}.{}'.format(size, name), ContentFile(output.getvalue()), save=False)
+            renditions.append(rendition)
+
+    with transaction.atomic():
+        if not Book.objects.select_for_update().filter(pk=book_id, cover=source).exists():
+            # The cover changed (or the book was deleted) while rendering,
+            # the files are left to the garbage collection
+            return False
+        CoverRendition.objects.filter(book_id=book_id).delete()
+        CoverRendition.objects.bulk_create(renditions)
+        Book.objects.filter(pk=book_id).update(cover_placeholder=get_placeholder(image))
+        invalidate_models([Book._meta.label, CoverRendition._meta.label])
+    return True
+
+
+def get_rgb_image(image: Image.Image) -> Image.Image:
+    """
+    Returns image in RGB mode, transparent areas becoming white.
+    """
+    if image.mode == 'RGB':
+        return image
+    image = image.convert('RGBA')
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def get_placeholder(image: Image.Image) -> str:
+    """
+    Returns a tiny blurred version of image, as a JPEG data URI.
+    """
+    placeholder = image.copy()
+    placeholder.thumbnail(PLACEHOLDER_SIZE, Image.BILINEAR)
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(1))
+    output = io.BytesIO()
+    placeholder.save(output, 'JPEG', quality=50)
+    return 'data:image/jpeg;base64,' + base64.b64encode(output.getvalue()).decode()
+
+
+def get_rendition(renditions: list, book: Book, size: str, image_format: str = 'webp'):
+    """
+    Returns the rendition of book's current cover at size, in image_format if
+    available, among renditions.
+    """
+    candidates = [
+        rendition for rendition in renditions
+        if rendition.size == size and rendition.source == book.cover.name
+    ]
+    for rendition in candidates:
+        if rendition.format == image_format:
+            return rendition
+    return candidates[0] if candidates else None
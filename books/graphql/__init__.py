@@ -13,6 +13,9 @@ from .mutations import (
     CreateWriter,
     CreateReader,
     DeleteReader,
+    CreateBooks,
+    UpdateBooks,
+    UpsertReaders,
 )
 
 from .queries import (Query, books_field, tags_field)
@@ -34,5 +37,8 @@ class Mutation(graphene.ObjectType):
     create_writer = CreateWriter.Field()
     create_reader = CreateReader.Field()
     delete_reader = DeleteReader.Field()
+    create_books = CreateBooks.Field()
+    update_books = UpdateBooks.Field()
+    upsert_readers = UpsertReaders.Field()
 
 
@@ -0,0 +1,159 @@
+"""
+Provides DataLoaders for the books app (see lib.loaders).
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Sum
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from books.models import Book, Reader, BookSimilarity, BookTagCount, ReaderStatusCount, CoverRendition
+from books.models.book import TaggedBook
+from comments.models import Comment, get_threads
+from lib.loaders import ModelLoader, GroupedLoader, CountLoader, FirstPageLoader, get_partitioned_page
+
+
+class BookByIdLoader(ModelLoader):
+    """
+    Loads books by primary key.
+    """
+    model = Book
+
+
+class WritersByBookLoader(GroupedLoader):
+    """
+    Loads the writers of books, by book primary key.
+    """
+
+    def get_pairs(self, keys):
+        rows = Book.writer.through.objects.filter(book_id__in=keys).select_related('writer')
+        return ((row.book_id, row.writer) for row in rows)
+
+
+class ReaderPageLoader(DataLoader):
+    """
+    Loads pages of the readers of books, ordered by primary key.
+
+    Keys are (book_id, status, offset, limit) tuples, status being None for
+    all the statuses. The pages sharing the same status and bounds are fetched
+    with a single query, numbering the readers of each book with ROW_NUMBER().
+    """
+
+    def batch_load_fn(self, keys):
+        # pylint: disable=method-hidden
+        book_ids_by_bounds = defaultdict(list)
+        for book_id, status, offset, limit in keys:
+            book_ids_by_bounds[(status, offset, limit)].append(book_id)
+
+        pages = defaultdict(list)
+        for (status, offset, limit), book_ids in book_ids_by_bounds.items():
+            qs = Reader.objects.filter(book_id__in=book_ids)
+            if status:
+                qs = qs.filter(status=status)
+            readers = get_partitioned_page(qs, 'book_id', F('pk').asc(), offset, offset + limit)
+            for reader in readers:
+                pages[(reader.book_id, status, offset, limit)].append(reader)
+
+        return Promise.resolve([pages.get(key, []) for key in keys])
+
+
+class ReaderCountLoader(CountLoader):
+    """
+    Loads the number of readers of books. Keys are (book_id, status) tuples,
+    status being None for all the statuses.
+    """
+
+    def get_counts(self, keys):
+        counts = defaultdict(int)
+        rows = Reader.objects.filter(
+            book_id__in={book_id for book_id, status in keys},
+        ).values('book_id', 'status').annotate(count=Count('pk')).values_list(
+            'book_id', 'status', 'count',
+        )
+        for book_id, status, count in rows:
+            counts[(book_id, status)] += count
+            counts[(book_id, None)] += count
+        return counts.items()
+
+
+class ReaderStatusCountLoader(CountLoader):
+    """
+    Loads the number of readers of books with a status, from the counters.
+    Keys are (book_id, status) tuples.
+    """
+
+    def get_counts(self, keys):
+        rows = ReaderStatusCount.objects.filter(
+            book_id__in={book_id for book_id, status in keys},
+        ).values('book_id', 'status').annotate(total=Sum('count')).values_list(
+            'book_id', 'status', 'total',
+        )
+        return (((book_id, status), total) for book_id, status, total in rows)
+
+
+class SimilarBooksByBookLoader(GroupedLoader):
+    """
+    Loads the stored similar books of books, best first, by book primary key.
+    """
+
+    def get_pairs(self, keys):
+        rows = BookSimilarity.objects.filter(
+            book_id__in=keys,
+        ).select_related('similar_book').order_by('book_id', '-score', 'similar_book_id')
+        return ((row.book_id, row.similar_book) for row in rows)
+
+
+class TagsByBookLoader(GroupedLoader):
+    """
+    Loads the tag names of books, by book primary key.
+    """
+
+    def get_pairs(self, keys):
+        return TaggedBook.objects.filter(
+            content_object_id__in=keys,
+        ).values_list('content_object_id', 'tag__name')
+
+
+class BookCountByTagLoader(CountLoader):
+    """
+    Loads the number of books tagged with a tag, by tag primary key.
+    """
+
+    def get_counts(self, keys):
+        return BookTagCount.objects.filter(tag_id__in=keys).values_list('tag_id', 'count')
+
+
+class CoverRenditionsByBookLoader(GroupedLoader):
+    """
+    Loads the cover renditions of books, by book primary key.
+    """
+
+    def get_pairs(self, keys):
+        rows = CoverRendition.objects.filter(book_id__in=keys)
+        return ((row.book_id, row) for row in rows)
+
+
+class CommentThreadsByBookLoader(GroupedLoader):
+    """
+    Loads the comment threads of books (see comments.models.get_threads), by
+    (book primary key, maximum depth).
+    """
+
+    def get_pairs(self, keys):
+        book_ids = defaultdict(list)
+        for book_id, max_depth in keys:
+            book_ids[max_depth].append(book_id)
+        for max_depth, ids in book_ids.items():
+            for comment in get_threads(Comment.objects.filter(content_id__in=ids), max_depth):
+                yield (comment.content_id, max_depth), comment
+
+
+class CommentPageByBookLoader(FirstPageLoader):
+    """
+    Loads the first top-level comments of books, oldest first (see
+    BookType.comments). Keys are (book_id, limit) tuples.
+    """
+    key_field = 'content_id'
+
+    def get_queryset(self, keys):
+        return Comment.objects.filter(content_id__in=keys, level=0).order_by('publication_date', 'pk')
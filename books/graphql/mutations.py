@@ -1,9 +1,12 @@
 """
 Provides graphql mutations for the books app.
 """
+from collections import Counter, defaultdict
 from datetime import datetime
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django import forms
@@ -16,11 +19,15 @@ from graphql_relay import from_global_id
 from graphql_jwt.utils import get_payload
 from graphql_jwt.decorators import login_required
 
-from books.models import Book, Writer, Reader
-from books.graphql.types import BookType, WriterType, ReaderType
+from books.bulk import add_tags, add_writers, books_changed, create_books, get_tag_ids
+from books.models import Book, Writer, Reader, ReaderStatusCount
+from books.models.book import TaggedBook
+from books.graphql.types import BookType, WriterType, ReaderType, BatchErrorType
+from books.similarity import schedule_similar_books_refresh
 
 from accounts.graphql.types import UserType
 from lib.fields import PossiblyAbsentOrBlankCharField, TagsField
+from lib.response_cache import invalidate_models
 
 # ########## FORMS ########## #
 class CreateBookForm(forms.ModelForm):
@@ -209,17 +216,19 @@ class CreateReader(graphene.Mutation):
         book = Book.objects.filter(pk=book_id).first()
         status = statuts
 
-        if Reader.objects.filter(user=user.id, book=book.id).exists():
-            Reader.objects.filter(user=user.id, book=book.id).update(
-                status=statuts
-            )
+        with transaction.atomic():
+            reader = Reader.objects.select_for_update().filter(user=user.id, book=book.id).first()
+            if reader is not None:
+                if reader.status != statuts:
+                    reader.status = statuts
+                    reader.save(update_fields=['status'])
 
-        else:
-            Reader.objects.create(
-                user=user,
-                book=book,
-                status=statuts,
-            )
+            else:
+                Reader.objects.create(
+                    user=user,
+                    book=book,
+                    status=statuts,
+                )
 
         return CreateReader(user=user, book=book, status=status)
 
@@ -236,3 +245,273 @@ class DeleteReader(graphene.Mutation):
         obj.delete()
         return cls(ok=True)
 
+
+# ########## BATCHES ########## #
+# Batch mutations apply a list of items in one transaction, in a number of
+# queries that doesn't depend on the number of items. Invalid items are
+# reported by their index in the list and skipped, the others are applied.
+
+MAX_BATCH_SIZE = 100
+
+
+def check_batch_size(items: list) -> None:
+    if len(items) > MAX_BATCH_SIZE:
+        raise GraphQLError(
+            _("Batches are limited to {limit} items.").format(limit=MAX_BATCH_SIZE),
+            extensions={'code': 'BATCH_TOO_LARGE'},
+        )
+
+
+def get_batch_errors(index: int, errors: dict) -> list:
+    return [
+        BatchErrorType(index=index, field=field, messages=[str(message) for message in messages])
+        for field, messages in errors.items()
+    ]
+
+
+def clean_book(book: Book, fields=None, writers=None, known_writers=()) -> dict:
+    """
+    Returns the errors of a book's fields (all of them by default) and of the
+    ids of its new writers.
+    """
+    errors = {}
+    exclude = ['cover', 'owner']
+    if fields is not None:
+        exclude = [field.name for field in Book._meta.fields if field.name not in fields]
+    try:
+        book.clean_fields(exclude=exclude)
+    except ValidationError as error:
+        errors.update(error.message_dict)
+    missing = [str(pk) for pk in writers or () if pk not in known_writers]
+    if missing:
+        errors['writer'] = [_("Unknown writers: {pks}.").format(pks=', '.join(missing))]
+    return errors
+
+
+def get_known_writers(items: list) -> set:
+    return set(Writer.objects.filter(
+        pk__in={pk for item in items for pk in item.writer or ()},
+    ).values_list('pk', flat=True))
+
+
+class BookInput(graphene.InputObjectType):
+    title = graphene.String(required=True)
+    description = graphene.String()
+    genre = graphene.String()
+    writer = graphene.List(graphene.NonNull(graphene.Int), required=True)
+    tags = graphene.List(graphene.NonNull(graphene.String))
+
+
+class CreateBooks(graphene.Mutation):
+    """
+    Creates a batch of books owned by the current user, as createBook does.
+    """
+    class Arguments:
+        input = graphene.List(graphene.NonNull(BookInput), required=True)
+
+    books = graphene.List(BookType, description="The books created, in the order of the input.")
+    errors = graphene.List(graphene.NonNull(BatchErrorType))
+
+    @login_required
+    def mutate(self, info, input):
+        check_batch_size(input)
+        known_writers = get_known_writers(input)
+
+        books = [None] * len(input)
+        errors = []
+        for index, item in enumerate(input):
+            book = Book(
+                title=item.title,
+                description=item.description,
+                genre=item.genre or None,
+                owner=info.context.user,
+            )
+            book_errors = clean_book(book, writers=item.writer, known_writers=known_writers)
+            if not item.writer:
+                book_errors['writer'] = [_("This field is required.")]
+            if book_errors:
+                errors.extend(get_batch_errors(index, book_errors))
+            else:
+                books[index] = book
+
+        created = [(book, item) for book, item in zip(books, input) if book is not None]
+        if created:
+            with transaction.atomic():
+                create_books([book for book, item in created])
+                tags = get_tag_ids({tag.lower() for book, item in created for tag in item.tags or ()})
+                add_writers((book.pk, pk) for book, item in created for pk in item.writer)
+                add_tags((book.pk, tags[tag.lower()]) for book, item in created for tag in item.tags or ())
+                books_changed(
+                    [book.pk for book, item in created],
+                    [book.pk for book, item in created if item.tags],
+                )
+        return CreateBooks(books=books, errors=errors)
+
+
+class BookUpdateInput(graphene.InputObjectType):
+    pk = graphene.Int(required=True)
+    title = graphene.String()
+    description = graphene.String()
+    genre = graphene.String()
+    ISBN = graphene.String()
+    writer = graphene.List(graphene.NonNull(graphene.Int))
+    tags = graphene.List(graphene.NonNull(graphene.String))
+
+
+class UpdateBooks(graphene.Mutation):
+    """
+    Updates a batch of books: the given fields replace the books' values
+    (an empty string clears the optional ones), writers are added and tags,
+    when given, replace the books' tags. The current user becomes the owner of the books.
+    """
+    class Arguments:
+        input = graphene.List(graphene.NonNull(BookUpdateInput), required=True)
+
+    books = graphene.List(BookType, description="The books updated, in the order of the input.")
+    errors = graphene.List(graphene.NonNull(BatchErrorType))
+
+    @login_required
+    def mutate(self, info, input):
+        check_batch_size(input)
+        existing = Book.objects.in_bulk([item.pk for item in input])
+        known_writers = get_known_writers(input)
+
+        books = [None] * len(input)
+        errors = []
+        for index, item in enumerate(input):
+            book = existing.pop(item.pk, None)
+            if book is None:
+                errors.extend(get_batch_errors(index, {'pk': [_("Unknown book, or repeated in the batch.")]}))
+                continue
+            fields = [field for field in ('title', 'description', 'genre', 'ISBN') if getattr(item, field) is not None]
+            for field in fields:
+                setattr(book, field, getattr(item, field))
+            book_errors = clean_book(book, fields, item.writer, known_writers)
+            if book_errors:
+                errors.extend(get_batch_errors(index, book_errors))
+            else:
+                book.owner = info.context.user
+                books[index] = book
+
+        updated = [(book, item) for book, item in zip(books, input) if book is not None]
+        if updated:
+            with transaction.atomic():
+                Book.objects.bulk_update(
+                    [book for book, item in updated],
+                    ['title', 'description', 'genre', 'ISBN', 'owner'],
+                )
+                add_writers((book.pk, pk) for book, item in updated for pk in item.writer or ())
+                retagged = UpdateBooks.set_tags({book.pk: item.tags for book, item in updated if item.tags is not None})
+                books_changed([book.pk for book, item in updated], retagged)
+        return UpdateBooks(books=books, errors=errors)
+
+    @staticmethod
+    def set_tags(tags_by_book: dict) -> list:
+        """
+        Replaces the tags of books, returning the ids of the books whose tags
+        changed.
+        """
+        current = defaultdict(dict)
+        for pk, book_id, name in TaggedBook.objects.filter(
+            content_object_id__in=list(tags_by_book),
+        ).values_list('pk', 'content_object_id', 'tag__name'):
+            current[book_id][name] = pk
+
+        removed = []
+        added = {}
+        for book_id, names in tags_by_book.items():
+            names = {name.lower() for name in names}
+            removed.extend(pk for name, pk in current[book_id].items() if name not in names)
+            added[book_id] = names - set(current[book_id])
+
+        # Deleted one by one, their signals update the tag counters
+        TaggedBook.objects.filter(pk__in=removed).delete()
+        tags = get_tag_ids({name for names in added.values() for name in names})
+        add_tags((book_id, tags[name]) for book_id, names in added.items() for name in names)
+        return [
+            book_id for book_id in tags_by_book
+            if added[book_id] or any(pk in removed for pk in current[book_id].values())
+        ]
+
+
+class ReaderInput(graphene.InputObjectType):
+    book_id = graphene.Int(required=True)
+    status = graphene.String(required=True)
+
+
+class UpsertReaders(graphene.Mutation):
+    """
+    Adds books to the current user's lists, or moves them to another list.
+    """
+    class Arguments:
+        input = graphene.List(graphene.NonNull(ReaderInput), required=True)
+
+    readers = graphene.List(ReaderType, description="The readers, in the order of the input.")
+    errors = graphene.List(graphene.NonNull(BatchErrorType))
+
+    @login_required
+    def mutate(self, info, input):
+        check_batch_size(input)
+        user = info.context.user
+        statuses = dict(Reader.TYPE)
+        book_ids = set(Book.objects.filter(
+            pk__in={item.book_id for item in input},
+        ).values_list('pk', flat=True))
+
+        items = {}
+        errors = []
+        for index, item in enumerate(input):
+            if item.book_id not in book_ids or item.book_id in items:
+                errors.extend(get_batch_errors(index, {'book_id': [_("Unknown book, or repeated in the batch.")]}))
+            elif item.status not in statuses:
+                errors.extend(get_batch_errors(index, {'status': [_("Unknown status.")]}))
+            else:
+                items[item.book_id] = (index, item.status)
+
+        readers = [None] * len(input)
+        if not items:
+            return UpsertReaders(readers=readers, errors=errors)
+
+        with transaction.atomic():
+            existing = {
+                reader.book_id: reader
+                for reader in Reader.objects.select_for_update().filter(user=user, book_id__in=list(items))
+            }
+            counts = Counter()
+            changed = []
+            created = []
+            for book_id, (index, status) in items.items():
+                reader = existing.get(book_id)
+                if reader is None:
+                    created.append(Reader(user=user, book_id=book_id, status=status))
+                    counts[book_id, status] += 1
+                elif reader.status != status:
+                    counts[book_id, reader.status] -= 1
+                    counts[book_id, status] += 1
+                    reader.status = status
+                    changed.append(reader)
+
+            Reader.objects.bulk_create(created, ignore_conflicts=True)
+            if created:
+                # bulk_create() only sets the primary keys on PostgreSQL, and
+                # skips the readers inserted concurrently since the lookup
+                for reader in Reader.objects.select_for_update().filter(
+                    user=user, book_id__in=[reader.book_id for reader in created],
+                ):
+                    index, status = items[reader.book_id]
+                    if reader.status != status:
+                        # Inserted, and counted, with another status
+                        counts[reader.book_id, reader.status] -= 1
+                        reader.status = status
+                        changed.append(reader)
+                    existing[reader.book_id] = reader
+                # Status changes don't affect similarities
+                schedule_similar_books_refresh([reader.book_id for reader in created])
+            Reader.objects.bulk_update(changed, ['status'])
+            ReaderStatusCount.add_many(counts)
+            if changed or created:
+                invalidate_models([Reader._meta.label])
+
+        for book_id, (index, status) in items.items():
+            readers[index] = existing[book_id]
+        return UpsertReaders(readers=readers, errors=errors)
@@ -1,15 +1,21 @@
 """
 Provides GraphQL queries for the book app.
 """
-
 import graphene
 import django_filters
 from graphql_jwt.decorators import login_required
+from django.db.models import F
 from django.db.models.query import QuerySet
+from django.utils.translation import ugettext_lazy as _
 from graphene_django.filter import DjangoFilterConnectionField
 from graphql import GraphQLError
+from taggit.models import Tag
 
 from books.models import Book, Writer, Reader, Reader
+from books.models.book import TaggedBook
+from books.search import search_books
+from lib.connections import QuerySetConnectionField, KeysetConnectionField
+from lib.planner import QueryPlan, FieldPlan
 from .types import BookType, WriterType, BookOrderBy, ReaderType, TagsType
 
 
@@ -19,6 +25,18 @@ class BookConnection(graphene.relay.Connection):
     class Meta:
         node = BookType
 
+    # Maps the BookType fields onto the columns and relations they need.
+    query_plan = QueryPlan({
+        'title': FieldPlan(only=('title',)),
+        'description': FieldPlan(only=('description',)),
+        'genre': FieldPlan(only=('genre',)),
+        'owner': FieldPlan(select_related=('owner',)),
+        'tags': FieldPlan(prefetch_related=('tags',)),
+        'writer': FieldPlan(prefetch_related=('writer',)),
+        'cover': FieldPlan(only=('cover',)),
+        'coverPlaceholder': FieldPlan(only=('cover', 'cover_placeholder')),
+    })
+
     @staticmethod
     def get_book_input_fields() -> dict:
         """
@@ -28,6 +46,7 @@ class BookConnection(graphene.relay.Connection):
             'order_by': graphene.Argument(BookOrderBy),
             'title': graphene.String(),
             'tags': graphene.List(graphene.String),
+            'search': graphene.String(),
         }
 
     @staticmethod
@@ -35,21 +54,29 @@ class BookConnection(graphene.relay.Connection):
         """
         Resolves the books query
         """
-        qs = Book.objects.all()
+        qs = BookConnection.query_plan.apply(Book.objects.all(), info)
 
         title = args.get('title', None)
         tags = args.get('tags', None)
+        search = args.get('search', None)
         order_by = args.get('order_by', None)
 
         if tags and title:
             raise GraphQLError(_("'tags' and title inputs cannot be used together."))
 
         if tags:
-            qs = qs.filter(reduce(operator.or_, (Q(tags__name__contains=x) for x in tags))).distinct()
+            # Tag names are stored lowercased (see lib.fields.TagsField)
+            qs = qs.filter(pk__in=TaggedBook.objects.filter(
+                tag__name__in=[x.lower() for x in tags],
+            ).values('content_object_id'))
 
         if title:
             return qs.filter(title=title)
 
+        if search:
+            # Results are ranked by relevance unless an order is requested
+            qs = search_books(qs, search)
+
         if order_by:
             qs =qs.order_by(order_by)
 
@@ -62,7 +89,7 @@ class Query(graphene.ObjectType):
     Reader = DjangoFilterConnectionField(ReaderType)
 
 
-books_field = graphene.relay.ConnectionField(
+books_field = KeysetConnectionField(
     BookConnection,
     resolver=BookConnection.resolve_books,
     **BookConnection.get_book_input_fields()
@@ -88,7 +115,10 @@ class TagsConnection(graphene.relay.Connection):
         """
         Resolves the most common tag query, filtered by name
         """
-        qs = Book.tags.most_common()
+        # Read from the counters rather than counting the tagged books
+        qs = Tag.objects.filter(book_count__count__gt=0).annotate(
+            num_times=F('book_count__count'),
+        ).order_by('-num_times', 'pk')
 
         name = args.get('name', None)
 
@@ -97,7 +127,7 @@ class TagsConnection(graphene.relay.Connection):
 
         return qs
 
-tags_field = graphene.relay.ConnectionField(
+tags_field = QuerySetConnectionField(
     TagsConnection,
     resolver=TagsConnection.resolve_tags,
     **TagsConnection.get_tags_input_fields()
@@ -4,10 +4,36 @@ Provides GraphQL types for the books app.
 
 import graphene
 from graphene_django import DjangoObjectType
+from promise import Promise
 from graphene_django.converter import convert_django_field
 from taggit.models import Tag
 from taggit.managers import TaggableManager
 from books.models import Book, Writer, Reader, Reader
+from books.graphql.loaders import (
+    BookByIdLoader,
+    WritersByBookLoader,
+    ReaderPageLoader,
+    ReaderCountLoader,
+    ReaderStatusCountLoader,
+    TagsByBookLoader,
+    SimilarBooksByBookLoader,
+    BookCountByTagLoader,
+    CoverRenditionsByBookLoader,
+    CommentThreadsByBookLoader,
+    CommentPageByBookLoader,
+)
+from accounts.graphql.loaders import UserByIdLoader
+from books.covers import get_rendition
+from comments.models import Comment
+from lib.connections import (
+    KeysetConnectionField,
+    QuerySetConnectionField,
+    get_page_bounds,
+    connection_from_page,
+    load_first_page,
+)
+from lib.loaders import get_loader
+from lib.planner import get_prefetched, load_related
 
 @convert_django_field.register(TaggableManager)
 def convert_tags_to_list_of_string(field, registry=None):
@@ -47,6 +73,42 @@ class ReaderType(DjangoObjectType):
 
     pk = graphene.String(source='pk')
 
+    def resolve_book(self, info):
+        return load_related(info, self, 'book', BookByIdLoader, self.book_id)
+
+    def resolve_user(self, info):
+        return load_related(info, self, 'user', UserByIdLoader, self.user_id)
+
+class ReaderConnection(graphene.relay.Connection):
+    """A custom connection for the readers of a book"""
+
+    class Meta:
+        node = ReaderType
+
+    @staticmethod
+    def get_reader_input_fields() -> dict:
+        """
+        this creates the input fields of the readers connection.
+        """
+        return {
+            'status': graphene.String(),
+        }
+
+class CoverSize(graphene.Enum):
+    """
+    The sizes of the cover renditions (see books.covers).
+    """
+    THUMB = 'thumb'
+    CARD = 'card'
+    FULL = 'full'
+
+class CoverFormat(graphene.Enum):
+    """
+    The image formats of the cover renditions.
+    """
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+
 class BookType(DjangoObjectType):
     """
     A type for the book
@@ -64,29 +126,121 @@ class BookType(DjangoObjectType):
 
     writer = graphene.Field(graphene.List(WriterType))
     pk = graphene.String(source='pk')
-    similar_books = graphene.List(lambda: BookType)
-    reader = graphene.Field(graphene.List(ReaderType))
+    tags = graphene.List(graphene.String)
+    similar_books = graphene.List(lambda: BookType, first=graphene.Int())
+    reader = QuerySetConnectionField(
+        ReaderConnection,
+        **ReaderConnection.get_reader_input_fields()
+    )
+    wish_count = graphene.Int()
+    read_count = graphene.Int()
+    like_count = graphene.Int()
+    cover = graphene.String(size=CoverSize(), format=CoverFormat())
+    cover_placeholder = graphene.String()
+    comments = KeysetConnectionField('comments.graphql.types.CommentConnection')
+    comment_threads = graphene.List('comments.graphql.types.CommentType', depth=graphene.Int())
 
     def resolve_writer(self, info) -> str:
-        return self.writer.all()
+        return load_related(info, self, 'writer', WritersByBookLoader, self.pk)
+
+    def resolve_reader(self, info, **args):
+        """
+        Resolves the book's readers. Only the requested page and the total
+        count are fetched, batched with the other books of the request.
+        """
+        status = args.get('status', None)
 
-    def resolve_reader(self, info) -> str:
-        #readers_book renvoi tous les objets user associés au livre via reader
-        readers_book = self.reader.all()
-        readers_objects = []
+        if args.get('last') is not None or args.get('before') is not None:
+            # Backward pagination needs the count first, let
+            # QuerySetConnectionField slice the queryset.
+            qs = self.readers_books.select_related('user').order_by('pk')
+            if status:
+                qs = qs.filter(status=status)
+            return qs
 
-        for person in readers_book:
-            #pour chaque user associé au livre je fais chercher l'objet reader
-            x = Reader.objects.get(book=self, user=person)
-            readers_objects.append(x)
+        offset, limit = get_page_bounds(args)
+        page = get_loader(info, ReaderPageLoader).load((self.pk, status, offset, limit))
+        length = get_loader(info, ReaderCountLoader).load((self.pk, status))
 
-        return readers_objects
+        return Promise.all([page, length]).then(
+            lambda results: connection_from_page(ReaderConnection, args, *results)
+        )
+
+    def resolve_wish_count(self, info) -> int:
+        """
+        Resolves the number of users who wish to read the book.
+        """
+        return get_loader(info, ReaderStatusCountLoader).load((self.pk, 'wish'))
 
-    def resolve_similar_books(self, info):
+    def resolve_read_count(self, info) -> int:
         """
-        books taged similarly to the requested user.
+        Resolves the number of users who read the book.
         """
-        return self.tags.similar_objects()
+        return get_loader(info, ReaderStatusCountLoader).load((self.pk, 'read'))
+
+    def resolve_like_count(self, info) -> int:
+        """
+        Resolves the number of users who like the book.
+        """
+        return get_loader(info, ReaderStatusCountLoader).load((self.pk, 'like'))
+
+    def resolve_owner(self, info):
+        return load_related(info, self, 'owner', UserByIdLoader, self.owner_id)
+
+    def resolve_cover(self, info, size=None, format='webp'):
+        """
+        Resolves the URL of the cover's rendition at size, in format if
+        available. The original cover is served until it is rendered, or
+        when no size is requested.
+        """
+        if not self.cover:
+            return None
+        if size is None:
+            return self.cover.url
+
+        def get_url(renditions):
+            rendition = get_rendition(renditions, self, size, format)
+            return rendition.file.url if rendition is not None else self.cover.url
+
+        return get_loader(info, CoverRenditionsByBookLoader).load(self.pk).then(get_url)
+
+    def resolve_cover_placeholder(self, info):
+        return self.cover_placeholder if self.cover else None
+
+    def resolve_tags(self, info):
+        """
+        Resolves the book's tag names, prefetched by the query plan or through
+        the request's loader.
+        """
+        tags = get_prefetched(self, 'tags')
+        if tags is not None:
+            return [tag.name for tag in tags]
+        return get_loader(info, TagsByBookLoader).load(self.pk)
+
+    def resolve_comments(self, info, **args):
+        """
+        The top-level comments of the book, oldest first, paginated with
+        keyset cursors (see CommentType.replies for the rest of the threads).
+        """
+        comments = Comment.objects.filter(content_id=self.pk, level=0).order_by('publication_date', 'pk')
+        return load_first_page(info, CommentPageByBookLoader, self.pk, comments, args)
+
+    def resolve_comment_threads(self, info, depth=None):
+        """
+        The comment threads of the book, down to depth levels (see
+        CommentType.children).
+        """
+        return get_loader(info, CommentThreadsByBookLoader).load((self.pk, depth))
+
+    def resolve_similar_books(self, info, first=None):
+        """
+        Books tagged or read similarly to the requested book, best first (see
+        books.similarity).
+        """
+        similar = get_loader(info, SimilarBooksByBookLoader).load(self.pk)
+        if first is None:
+            return similar
+        return similar.then(lambda books: books[:max(first, 0)])
 
 class BookOrderBy(graphene.Enum):
     """
@@ -131,4 +285,16 @@ class TagsType(DjangoObjectType):
         """
         Resolves the number of users tagged with this tag
         """
-        return self.books_taggedbook_item.count()
+        # The tags connection already read the counters
+        num_times = getattr(self, 'num_times', None)
+        if num_times is not None:
+            return num_times
+        return get_loader(info, BookCountByTagLoader).load(self.pk)
+
+class BatchErrorType(graphene.ObjectType):
+    """
+    An error on an item of a batch mutation, at `index` in its input list.
+    """
+    index = graphene.Int(required=True)
+    field = graphene.String(required=True)
+    messages = graphene.List(graphene.NonNull(graphene.String), required=True)
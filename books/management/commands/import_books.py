@@ -0,0 +1,241 @@
+"""
+Imports a catalog of books, with their writers and tags, from a CSV or JSON
+Lines file.
+
+CSV files have a header row naming the columns; JSON Lines files hold one
+object per line. Recognized columns / keys:
+
+    title (required), writers (required), tags, description, genre,
+    publisher, publication_date, pages, isbn
+
+In CSV files, writers and tags are separated by '|'. In JSON Lines files they
+are either lists or '|'-separated strings.
+
+Books are identified by their ISBN, or by their title and publication date if
+they have none: books already in the database are skipped, so importing the
+same file twice is harmless.
+"""
+import csv
+import json
+import time
+from itertools import islice
+from typing import Iterator
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import User
+from books.bulk import add_tags, add_writers, books_changed, get_tag_ids, get_writer_ids
+from books.models import Book
+
+LIST_SEPARATOR = '|'
+
+BOOK_FIELDS = ('description', 'genre', 'publisher', 'publication_date', 'pages')
+
+
+class Command(BaseCommand):
+    help = "Imports books, writers and tags from a CSV or JSON Lines file, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (.csv) or JSON Lines (.jsonl) file.")
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help="File format, guessed from the file's extension by default.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of rows imported per transaction.",
+        )
+        parser.add_argument(
+            '--owner',
+            help="Username of the owner of the imported books.",
+        )
+        parser.add_argument(
+            '--refresh-similar',
+            action='store_true',
+            help="Refresh the similar books of every imported book (slow on large "
+                 "imports, run rebuild_similar_books afterwards instead).",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        batch_size = options['batch_size']
+        self.refresh_similar = options['refresh_similar']
+
+        self.owner = None
+        if options['owner']:
+            self.owner = User.objects.filter(username=options['owner']).first()
+            if self.owner is None:
+                raise CommandError(f"Unknown user '{options['owner']}'.")
+
+        read = 0
+        created = 0
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as catalog:
+            rows = read_csv(catalog) if file_format == 'csv' else read_jsonl(catalog)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                first_line = read + 1
+                read += len(batch)
+                books = self.parse_rows(batch, first_line)
+                with transaction.atomic():
+                    created += self.import_batch(books)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{read} rows read, {created} books created ({read / elapsed:.0f} rows/s)"
+                )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {created} books out of {read} rows in {elapsed:.1f}s "
+            f"({read / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+        if created and not self.refresh_similar:
+            self.stdout.write("Run `manage.py rebuild_similar_books` to compute their similar books.")
+
+    def parse_rows(self, rows: list, first_line: int) -> list:
+        """
+        Returns the valid rows as (book, writer names, tag names) tuples,
+        reporting the others.
+        """
+        books = []
+        for line, row in enumerate(rows, first_line):
+            if not isinstance(row, dict):
+                self.stderr.write(f"Row {line} skipped: invalid JSON object")
+                continue
+            writers = get_list(row.get('writers'))
+            tags = [tag.lower() for tag in get_list(row.get('tags'))]
+            book = Book(
+                title=(row.get('title') or '').strip(),
+                ISBN=(row.get('isbn') or '').strip() or None,
+                owner=self.owner,
+                **{name: (str(row[name]).strip() or None) if row.get(name) else None for name in BOOK_FIELDS},
+            )
+            try:
+                if not writers:
+                    raise ValidationError({'writers': ["This field cannot be blank."]})
+                book.clean_fields(exclude=['cover', 'owner'])
+            except ValidationError as error:
+                self.stderr.write(f"Row {line} skipped: {error.message_dict}")
+                continue
+            books.append((book, writers, tags))
+        return books
+
+    def import_batch(self, books: list) -> int:
+        """
+        Creates the books that don't exist yet, with their writers and tags.
+        Returns the number of created books.
+        """
+        books = self.exclude_existing(books)
+        if not books:
+            return 0
+
+        writers = get_writer_ids({name for book, names, tags in books for name in names})
+        tags = get_tag_ids({name for book, writers, names in books for name in names})
+
+        Book.objects.bulk_create([book for book, writers, tags in books])
+        ids = get_book_ids([book for book, writers, tags in books])
+
+        add_writers(
+            (ids[get_key(book)], writers[name])
+            for book, names, tag_names in books
+            for name in names
+        )
+        add_tags(
+            (ids[get_key(book)], tags[name])
+            for book, writer_names, names in books
+            for name in names
+        )
+        book_ids = list(ids.values())
+        books_changed(book_ids, book_ids if self.refresh_similar else ())
+        return len(books)
+
+    @staticmethod
+    def exclude_existing(books: list) -> list:
+        """
+        Removes from books those already in the database or appearing earlier
+        in the batch.
+        """
+        isbns = [book.ISBN for book, writers, tags in books if book.ISBN]
+        titles = [book.title for book, writers, tags in books if not book.ISBN]
+        existing = {('isbn', isbn) for isbn in Book.objects.filter(
+            ISBN__in=isbns,
+        ).values_list('ISBN', flat=True)}
+        existing.update(
+            ('title', title, publication_date)
+            for title, publication_date in Book.objects.filter(
+                title__in=titles, ISBN__isnull=True,
+            ).values_list('title', 'publication_date')
+        )
+
+        new_books = []
+        for book, writers, tags in books:
+            key = get_key(book)
+            if key not in existing:
+                existing.add(key)
+                new_books.append((book, writers, tags))
+        return new_books
+
+
+def read_csv(catalog) -> Iterator[dict]:
+    yield from csv.DictReader(catalog)
+
+
+def read_jsonl(catalog) -> Iterator[dict]:
+    for line in catalog:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def get_list(value) -> list:
+    """
+    Returns the names listed in a CSV cell or a JSON value.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+    return [str(name).strip() for name in value if str(name).strip()]
+
+
+def get_key(book: Book) -> tuple:
+    """
+    Returns the key identifying a book, see the module's docstring.
+    """
+    if book.ISBN:
+        return ('isbn', book.ISBN)
+    return ('title', book.title, book.publication_date)
+
+
+def get_book_ids(books: list) -> dict:
+    """
+    Returns the primary keys of the given just-created books, by key (see
+    get_key). bulk_create() only sets them on PostgreSQL.
+    """
+    if all(book.pk for book in books):
+        return {get_key(book): book.pk for book in books}
+    keys = {get_key(book) for book in books}
+    rows = list(Book.objects.filter(
+        ISBN__in=[book.ISBN for book in books if book.ISBN],
+    ).values_list('pk', 'ISBN', 'title', 'publication_date'))
+    rows.extend(Book.objects.filter(
+        title__in=[book.title for book in books if not book.ISBN], ISBN__isnull=True,
+    ).values_list('pk', 'ISBN', 'title', 'publication_date'))
+    ids = {}
+    for pk, isbn, title, publication_date in rows:
+        key = ('isbn', isbn) if isbn else ('title', title, publication_date)
+        if key in keys:
+            ids[key] = pk
+    return ids
+
@@ -0,0 +1,41 @@
+"""
+Rebuilds the books full-text search index (see books.search).
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from books.models import Book
+from books.search import get_backend, get_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the books full-text search index, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of books indexed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        backend = get_backend()
+        backend.clear()
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            book_ids = list(
+                Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not book_ids:
+                break
+            with transaction.atomic():
+                backend.index(get_documents(book_ids))
+            indexed += len(book_ids)
+            last_pk = book_ids[-1]
+            self.stdout.write(f"Indexed {indexed} books")
+
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({indexed} books)."))
@@ -0,0 +1,37 @@
+"""
+Recomputes the similar books index (see books.similarity).
+"""
+from django.core.management.base import BaseCommand
+
+from books.models import Book
+from books.similarity import rebuild_similar_books
+
+
+class Command(BaseCommand):
+    help = "Recomputes the similar books of every book, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help="Number of books recomputed per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        computed = 0
+        last_pk = 0
+        while True:
+            book_ids = list(
+                Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not book_ids:
+                break
+            rebuild_similar_books(book_ids)
+            computed += len(book_ids)
+            last_pk = book_ids[-1]
+            self.stdout.write(f"Computed the similar books of {computed} books")
+
+        self.stdout.write(self.style.SUCCESS(f"Similar books rebuilt ({computed} books)."))
@@ -0,0 +1,90 @@
+"""
+Fixes the drift of the per-book reader counters (see ReaderStatusCount).
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from books.models import Book, Reader, ReaderStatusCount
+
+
+class Command(BaseCommand):
+    help = "Recounts the readers of every book, in batches, and fixes the counters that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of books reconciled per transaction.",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report the counters that drifted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        checked = 0
+        fixed = 0
+        last_pk = 0
+        while True:
+            book_ids = list(
+                Book.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not book_ids:
+                break
+            with transaction.atomic():
+                drifted = self.get_drifted(book_ids)
+                for (book_id, status), (stored, actual) in sorted(drifted.items()):
+                    self.stdout.write(f"Book {book_id}, {status}: {stored} counted, {actual} readers")
+                if drifted and not dry_run:
+                    self.fix(drifted)
+            fixed += len(drifted)
+            checked += len(book_ids)
+            last_pk = book_ids[-1]
+
+        verb = "drifted" if dry_run else "fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"Reader counters reconciled ({checked} books, {fixed} counters {verb})."
+        ))
+
+    @staticmethod
+    def get_drifted(book_ids: list) -> dict:
+        """
+        Returns the counters of the given books that don't match the readers,
+        as a dict of (book_id, status) -> (stored count, actual count).
+        """
+        counts = defaultdict(lambda: [0, 0])
+        # Locks the shards so that concurrent updates wait for the fix
+        for book_id, status, total in ReaderStatusCount.objects.select_for_update().filter(
+                book_id__in=book_ids,
+        ).values('book_id', 'status').annotate(total=Sum('count')).values_list(
+            'book_id', 'status', 'total',
+        ):
+            counts[(book_id, status)][0] = total
+        for book_id, status, count in Reader.objects.filter(
+                book_id__in=book_ids,
+        ).values('book_id', 'status').annotate(count=Count('pk')).values_list(
+            'book_id', 'status', 'count',
+        ):
+            counts[(book_id, status)][1] = count
+        return {key: tuple(value) for key, value in counts.items() if value[0] != value[1]}
+
+    @staticmethod
+    def fix(drifted: dict) -> None:
+        """
+        Replaces the shards of the drifted counters with a single exact one.
+        """
+        for book_id, status in drifted:
+            ReaderStatusCount.objects.filter(book_id=book_id, status=status).delete()
+        ReaderStatusCount.objects.bulk_create([
+            ReaderStatusCount(book_id=book_id, status=status, shard=0, count=actual)
+            for (book_id, status), (stored, actual) in drifted.items()
+            if actual
+        ])
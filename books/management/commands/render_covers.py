@@ -0,0 +1,63 @@
+"""
+Renders the cover renditions of the books whose cover isn't rendered yet (see
+books.covers), and deletes the renditions of removed covers.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, F, OuterRef
+
+from books.covers import render_cover
+from books.models import Book, CoverRendition
+
+
+class Command(BaseCommand):
+    help = "Renders the missing cover renditions, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help="Number of books fetched per query.",
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="Render every cover again, e.g. after changing the renditions' sizes.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        stale = CoverRendition.objects.exclude(source=F('book__cover'))
+        deleted = stale.delete()[0]
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} renditions of removed covers")
+
+        books = Book.objects.exclude(cover='').exclude(cover__isnull=True)
+        if not options['all']:
+            books = books.filter(~Exists(CoverRendition.objects.filter(
+                book=OuterRef('pk'), source=OuterRef('cover'),
+            )))
+
+        rendered = 0
+        failed = 0
+        last_pk = 0
+        started = time.monotonic()
+        while True:
+            book_ids = list(
+                books.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not book_ids:
+                break
+            for book_id in book_ids:
+                try:
+                    rendered += render_cover(book_id)
+                except Exception as error:  # pylint: disable=broad-except
+                    failed += 1
+                    self.stderr.write(f"Book {book_id}: {error}")
+            last_pk = book_ids[-1]
+            self.stdout.write(f"Rendered {rendered} covers ({time.monotonic() - started:.1f}s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} covers, {failed} failed."))
@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+# Books indexed per query when populating the index
+BATCH_SIZE = 500
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE books_book_fts USING fts5("
+            "title, description, writers, tags, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE books_book_search ("
+            "book_id integer PRIMARY KEY REFERENCES books_book (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX books_book_search_document ON books_book_search USING GIN (document)"
+        )
+
+
+def populate_search_index(apps, schema_editor):
+    """
+    Indexes the existing books, as books.search.get_documents() does with the
+    current models.
+    """
+    from books.search import get_backend
+
+    Book = apps.get_model('books', 'Book')
+    TaggedBook = apps.get_model('books', 'TaggedBook')
+    backend = get_backend()
+    book_ids = list(Book.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(book_ids), BATCH_SIZE):
+        batch = book_ids[start:start + BATCH_SIZE]
+        writers = defaultdict(list)
+        for book_id, name in Book.writer.through.objects.filter(
+                book_id__in=batch,
+        ).values_list('book_id', 'writer__name'):
+            writers[book_id].append(name)
+        tags = defaultdict(list)
+        for book_id, name in TaggedBook.objects.filter(
+                content_object_id__in=batch,
+        ).values_list('content_object_id', 'tag__name'):
+            tags[book_id].append(name)
+        backend.index([
+            (book_id, title, description or '', ' '.join(writers[book_id]), ' '.join(tags[book_id]))
+            for book_id, title, description in Book.objects.filter(
+                pk__in=batch,
+            ).values_list('pk', 'title', 'description')
+        ])
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE books_book_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE books_book_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_auto_20200304_0816'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title', 'publication_date', 'id'], name='books_book_title_754d1e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['creation_date', 'id'], name='books_book_creatio_c758fb_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSimilarity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='books.Book', verbose_name='Book')),
+                ('similar_book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='books.Book', verbose_name='Similar book')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booksimilarity',
+            index=models.Index(fields=['book', '-score'], name='books_books_book_id_1fe687_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='booksimilarity',
+            unique_together={('book', 'similar_book')},
+        ),
+    ]
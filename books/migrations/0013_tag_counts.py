@@ -0,0 +1,37 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_tags(apps, schema_editor):
+    TaggedBook = apps.get_model('books', 'TaggedBook')
+    BookTagCount = apps.get_model('books', 'BookTagCount')
+    BookTagCount.objects.bulk_create([
+        BookTagCount(tag_id=tag_id, count=count)
+        for tag_id, count in TaggedBook.objects.values_list('tag_id').annotate(count=models.Count('pk'))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0003_taggeditem_add_unique_index'),
+        ('books', '0012_booksimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTagCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0, verbose_name='Number of books')),
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='book_count', to='taggit.Tag', verbose_name='Tag')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booktagcount',
+            index=models.Index(fields=['-count'], name='books_bookt_count_c53a4d_idx'),
+        ),
+        migrations.RunPython(count_tags, migrations.RunPython.noop),
+    ]
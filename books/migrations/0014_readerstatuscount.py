@@ -0,0 +1,39 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_readers(apps, schema_editor):
+    Reader = apps.get_model('books', 'Reader')
+    ReaderStatusCount = apps.get_model('books', 'ReaderStatusCount')
+    ReaderStatusCount.objects.bulk_create([
+        ReaderStatusCount(book_id=book_id, status=status, shard=0, count=count)
+        for book_id, status, count in Reader.objects.values('book_id', 'status').annotate(
+            count=models.Count('pk'),
+        ).values_list('book_id', 'status', 'count')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_tag_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReaderStatusCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('wish', 'Whish List'), ('read', 'Read List'), ('like', 'Like List')], max_length=150, verbose_name='Status')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Shard')),
+                ('count', models.IntegerField(default=0, verbose_name='Number of readers')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reader_counts', to='books.Book', verbose_name='Book')),
+            ],
+            options={
+                'unique_together': {('book', 'status', 'shard')},
+            },
+        ),
+        migrations.RunPython(count_readers, migrations.RunPython.noop),
+    ]
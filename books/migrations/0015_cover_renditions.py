@@ -0,0 +1,36 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:47
+
+import books.models.cover
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_readerstatuscount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_placeholder',
+            field=models.TextField(blank=True, editable=False, null=True, verbose_name='Cover placeholder'),
+        ),
+        migrations.CreateModel(
+            name='CoverRendition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(choices=[('thumb', 'Thumbnail'), ('card', 'Card'), ('full', 'Full')], max_length=10, verbose_name='Size')),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=10, verbose_name='Format')),
+                ('source', models.CharField(max_length=255, verbose_name='Source')),
+                ('file', models.FileField(max_length=255, upload_to=books.models.cover.upload_path_handler_rendition, verbose_name='File')),
+                ('width', models.PositiveIntegerField(verbose_name='Width')),
+                ('height', models.PositiveIntegerField(verbose_name='Height')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cover_renditions', to='books.Book', verbose_name='Book')),
+            ],
+            options={
+                'unique_together': {('book', 'size', 'format')},
+            },
+        ),
+    ]
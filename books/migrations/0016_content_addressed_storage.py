@@ -0,0 +1,26 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:53
+
+import books.models.book
+import books.models.cover
+from django.db import migrations, models
+import lib.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_cover_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='cover',
+            field=models.ImageField(blank=True, null=True, storage=lib.storage.ContentAddressedStorage(), upload_to=books.models.book.upload_path_handler_cover, verbose_name='Cover'),
+        ),
+        migrations.AlterField(
+            model_name='coverrendition',
+            name='file',
+            field=models.FileField(max_length=255, storage=lib.storage.ContentAddressedStorage(), upload_to=books.models.cover.upload_path_handler_rendition, verbose_name='File'),
+        ),
+    ]
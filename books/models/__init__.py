@@ -5,4 +5,6 @@ Import new models here so that they are picked up by django when generating
 migrations.
 """
 
-from books.models.book import Book, Writer, Reader
+from books.models.book import Book, Writer, Reader, BookTagCount, ReaderStatusCount
+from books.models.similarity import BookSimilarity
+from books.models.cover import CoverRendition
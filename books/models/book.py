@@ -11,6 +11,8 @@ from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from books.mixins import ReaderMixin
+from lib.counters import add_to_sharded_counter, add_to_sharded_counters
+from lib.storage import ContentAddressedStorage
 
 from taggit.managers import TaggableManager
 from taggit.models import TaggedItemBase
@@ -31,6 +33,32 @@ class TaggedBook(TaggedItemBase):
     content_object = models.ForeignKey('Book', on_delete=models.CASCADE)
 
 
+class BookTagCount(models.Model):
+    """
+    Number of books tagged with a tag, kept up to date by the signal handlers
+    of books.signals.
+    """
+    tag = models.OneToOneField(
+        'taggit.Tag',
+        related_name='book_count',
+        verbose_name=_('Tag'),
+        on_delete=models.CASCADE,
+    )
+
+    count = models.IntegerField(
+        verbose_name=_('Number of books'),
+        default=0,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-count']),
+        ]
+
+    def __str__(self):
+        return f"{self.tag_id}: {self.count}"
+
+
 class Book(models.Model):
     """
     Book model
@@ -84,11 +112,20 @@ class Book(models.Model):
 
     cover = models.ImageField(
         verbose_name=_('Cover'),
+        storage=ContentAddressedStorage(),
         upload_to=upload_path_handler_cover,
         null=True,
         blank=True,
     )
 
+    # Tiny blurred version of the cover, as a data URI (see books.covers)
+    cover_placeholder = models.TextField(
+        verbose_name=_('Cover placeholder'),
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
     publication_date = models.CharField(
         verbose_name=_('Year of parution'),
         max_length=4,
@@ -137,6 +174,11 @@ class Book(models.Model):
 
     class Meta:
         ordering = ('title', 'publication_date',)
+        # Keyset pagination seeks on the ordering columns (see lib.connections)
+        indexes = [
+            models.Index(fields=['title', 'publication_date', 'id']),
+            models.Index(fields=['creation_date', 'id']),
+        ]
 
 
 class Writer(models.Model):
@@ -191,3 +233,56 @@ class Reader(models.Model):
         blank=False,
         default='wish',
     )
+
+
+class ReaderStatusCount(models.Model):
+    """
+    Number of readers of a book with a given status, kept up to date by the
+    signal handlers of books.signals and by the bulk writes. Sharded
+    (see lib.counters), the count is the sum of the shards.
+
+    `manage.py reconcile_reader_counts` fixes any drift.
+    """
+    SHARDS = 8
+
+    book = models.ForeignKey(
+        'books.Book',
+        related_name='reader_counts',
+        verbose_name=_('Book'),
+        on_delete=models.CASCADE,
+    )
+
+    status = models.CharField(
+        verbose_name=_('Status'),
+        choices=Reader.TYPE,
+        max_length=150,
+    )
+
+    shard = models.PositiveSmallIntegerField(
+        verbose_name=_('Shard'),
+    )
+
+    count = models.IntegerField(
+        verbose_name=_('Number of readers'),
+        default=0,
+    )
+
+    class Meta:
+        unique_together = [['book', 'status', 'shard']]
+
+    def __str__(self):
+        return f"{self.book_id} {self.status}#{self.shard}: {self.count}"
+
+    @classmethod
+    def add(cls, book_id: int, status: str, delta: int) -> None:
+        """
+        Adds delta to the number of readers of the book with the status.
+        """
+        add_to_sharded_counter(cls, delta, cls.SHARDS, book_id=book_id, status=status)
+
+    @classmethod
+    def add_many(cls, deltas: dict) -> None:
+        """
+        Adds deltas to the numbers of readers, given by (book id, status).
+        """
+        add_to_sharded_counters(cls, deltas, cls.SHARDS, ('book_id', 'status'))
@@ -0,0 +1,78 @@
+"""
+Cover rendition Model
+"""
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+from lib.storage import ContentAddressedStorage
+
+
+def upload_path_handler_rendition(instance, filename):
+    """
+    Cover renditions path
+    """
+    return "cover/renditions/{id}/{filename}".format(id=instance.book_id, filename=filename)
+
+
+class CoverRendition(models.Model):
+    """
+    A resized copy of a book's cover, rendered by books.covers.
+    """
+
+    SIZES = [
+        ('thumb', 'Thumbnail'),
+        ('card', 'Card'),
+        ('full', 'Full'),
+    ]
+
+    FORMATS = [
+        ('webp', 'WebP'),
+        ('jpeg', 'JPEG'),
+    ]
+
+    book = models.ForeignKey(
+        'books.Book',
+        related_name='cover_renditions',
+        verbose_name=_('Book'),
+        on_delete=models.CASCADE,
+    )
+
+    size = models.CharField(
+        verbose_name=_('Size'),
+        choices=SIZES,
+        max_length=10,
+    )
+
+    format = models.CharField(
+        verbose_name=_('Format'),
+        choices=FORMATS,
+        max_length=10,
+    )
+
+    # Name of the cover the rendition was rendered from, renditions of a
+    # previous cover are ignored
+    source = models.CharField(
+        verbose_name=_('Source'),
+        max_length=255,
+    )
+
+    file = models.FileField(
+        verbose_name=_('File'),
+        storage=ContentAddressedStorage(),
+        upload_to=upload_path_handler_rendition,
+        max_length=255,
+    )
+
+    width = models.PositiveIntegerField(
+        verbose_name=_('Width'),
+    )
+
+    height = models.PositiveIntegerField(
+        verbose_name=_('Height'),
+    )
+
+    class Meta:
+        unique_together = [['book', 'size', 'format']]
+
+    def __str__(self):
+        return f"{self.book_id} {self.size}.{self.format} ({self.width}x{self.height})"
@@ -0,0 +1,38 @@
+"""
+Book similarity Model
+"""
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class BookSimilarity(models.Model):
+    """
+    One of the top similar books of a book, materialized by books.similarity.
+    """
+
+    book = models.ForeignKey(
+        'books.Book',
+        related_name='similarities',
+        verbose_name=_('Book'),
+        on_delete=models.CASCADE,
+    )
+
+    similar_book = models.ForeignKey(
+        'books.Book',
+        related_name='+',
+        verbose_name=_('Similar book'),
+        on_delete=models.CASCADE,
+    )
+
+    score = models.FloatField(
+        verbose_name=_('Score'),
+    )
+
+    class Meta:
+        unique_together = [['book', 'similar_book']]
+        indexes = [
+            models.Index(fields=['book', '-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} ~ {self.similar_book_id} ({self.score:.3f})"
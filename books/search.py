@@ -0,0 +1,244 @@
+"""
+Full-text search over books.
+
+Books are indexed on their title, description, writer names and tags in a
+side table maintained by the signal handlers of books.signals:
+
+- on SQLite, an FTS5 virtual table ranked with bm25(),
+- on PostgreSQL, a weighted tsvector column with a GIN index, ranked with
+  ts_rank().
+
+Other databases fall back on unranked icontains lookups. The index can be
+rebuilt at any time with `manage.py rebuild_search_index`.
+"""
+import re
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from books.models import Book
+from books.models.book import TaggedBook
+from lib.tasks import run_in_background
+
+SQLITE_TABLE = 'books_book_fts'
+POSTGRES_TABLE = 'books_book_search'
+
+# Text search configuration used to build the PostgreSQL tsvectors. 'simple'
+# doesn't stem, as books are described in several languages.
+POSTGRES_CONFIG = 'simple'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def get_search_terms(text: str) -> list:
+    """
+    Splits the user's input into words, dropping any search operator.
+    """
+    return WORD_RE.findall(text.lower())
+
+
+def get_documents(book_ids: Iterable[int]) -> list:
+    """
+    Returns the (book_id, title, description, writers, tags) tuples to index
+    for the given books.
+    """
+    book_ids = list(book_ids)
+    writers = defaultdict(list)
+    for book_id, name in Book.writer.through.objects.filter(
+            book_id__in=book_ids,
+    ).values_list('book_id', 'writer__name'):
+        writers[book_id].append(name)
+
+    tags = defaultdict(list)
+    for book_id, name in TaggedBook.objects.filter(
+            content_object_id__in=book_ids,
+    ).values_list('content_object_id', 'tag__name'):
+        tags[book_id].append(name)
+
+    return [
+        (book_id, title, description or '', ' '.join(writers[book_id]), ' '.join(tags[book_id]))
+        for book_id, title, description in Book.objects.filter(
+            pk__in=book_ids,
+        ).values_list('pk', 'title', 'description')
+    ]
+
+
+class SearchBackend:
+    """
+    Fallback backend for databases without a full-text index: no indexing,
+    unranked substring matching.
+    """
+
+    def index(self, documents: list) -> None:
+        """
+        Adds or replaces the given documents (see get_documents) in the index.
+        """
+
+    def remove(self, book_ids: list) -> None:
+        """
+        Removes the given books from the index.
+        """
+
+    def clear(self) -> None:
+        """
+        Empties the index.
+        """
+
+    def search(self, qs: QuerySet, terms: list) -> QuerySet:
+        """
+        Filters qs on the search terms and annotates it with a `search_rank`,
+        the lower the better.
+        """
+        for term in terms:
+            qs = qs.filter(
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(writer__name__icontains=term)
+                | Q(tags__name__icontains=term)
+            )
+        return qs.distinct().extra(select={'search_rank': '0'})
+
+
+class SqliteSearchBackend(SearchBackend):
+    """
+    FTS5 backend. The book's primary key is used as the rowid of the virtual
+    table.
+    """
+    # bm25() weights of the title, description, writers and tags columns
+    WEIGHTS = (10.0, 1.0, 5.0, 3.0)
+
+    def index(self, documents):
+        self.remove([document[0] for document in documents])
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, title, description, writers, tags) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                documents,
+            )
+
+    def remove(self, book_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s',
+                [(book_id,) for book_id in book_ids],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+
+    def search(self, qs, terms):
+        # Every term must match, as a prefix
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        return qs.extra(
+            tables=[SQLITE_TABLE],
+            where=[
+                f'{SQLITE_TABLE}.rowid = books_book.id',
+                f'{SQLITE_TABLE} MATCH %s',
+            ],
+            params=[match],
+            select={'search_rank': f'bm25({SQLITE_TABLE}, {weights})'},
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    tsvector backend. Title, writers, tags and description are weighted A, B,
+    C and D respectively.
+    """
+    DOCUMENT_SQL = (
+        "setweight(to_tsvector('{config}', %s), 'A') || "
+        "setweight(to_tsvector('{config}', %s), 'D') || "
+        "setweight(to_tsvector('{config}', %s), 'B') || "
+        "setweight(to_tsvector('{config}', %s), 'C')"
+    ).format(config=POSTGRES_CONFIG)
+
+    def index(self, documents):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {POSTGRES_TABLE} (book_id, document) '
+                f'VALUES (%s, {self.DOCUMENT_SQL}) '
+                'ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document',
+                documents,
+            )
+
+    def remove(self, book_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {POSTGRES_TABLE} WHERE book_id = ANY(%s)',
+                [list(book_ids)],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {POSTGRES_TABLE}')
+
+    def search(self, qs, terms):
+        # Every term must match, as a prefix
+        tsquery = ' & '.join('{}:*'.format(term) for term in terms)
+        return qs.extra(
+            tables=[POSTGRES_TABLE],
+            where=[
+                f'{POSTGRES_TABLE}.book_id = books_book.id',
+                f"{POSTGRES_TABLE}.document @@ to_tsquery('{POSTGRES_CONFIG}', %s)",
+            ],
+            params=[tsquery],
+            # ts_rank is higher for better matches, negate it so that the
+            # lower search_rank is, the better, like bm25()
+            select={
+                'search_rank': f"-ts_rank({POSTGRES_TABLE}.document, "
+                               f"to_tsquery('{POSTGRES_CONFIG}', %s))",
+            },
+            select_params=[tsquery],
+        )
+
+
+def get_backend() -> SearchBackend:
+    """
+    Returns the search backend for the default database.
+    """
+    if connection.vendor == 'sqlite':
+        return SqliteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SearchBackend()
+
+
+def search_books(qs: QuerySet, text: str) -> QuerySet:
+    """
+    Filters the books queryset on the search text, ordered by relevance. Books
+    are annotated with their `search_rank` (the lower the better).
+    """
+    terms = get_search_terms(text)
+    if not terms:
+        return qs.none()
+    return get_backend().search(qs, terms).order_by('search_rank', 'pk')
+
+
+def index_books(book_ids: Iterable[int]) -> None:
+    """
+    (Re)indexes the given books.
+    """
+    get_backend().index(get_documents(book_ids))
+
+
+def remove_books(book_ids: Iterable[int]) -> None:
+    """
+    Removes the given books from the index.
+    """
+    get_backend().remove(list(book_ids))
+
+
+def schedule_writer_books_indexing(writer_id: int) -> None:
+    run_in_background(index_writer_books, writer_id)
+
+
+def index_writer_books(writer_id: int) -> None:
+    """
+    (Re)indexes the books of a writer, e.g. after it was renamed.
+    """
+    index_books(Book.writer.through.objects.filter(writer_id=writer_id).values_list('book_id', flat=True))
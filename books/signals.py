@@ -0,0 +1,162 @@
+"""
+Signal handlers for the books app.
+
+Imported by BooksConfig.ready() so that they are connected at startup.
+"""
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from books.covers import schedule_cover_rendering
+from books.models import Book, Writer, Reader, BookTagCount, ReaderStatusCount
+from books.models.book import TaggedBook
+from books.search import index_books, remove_books, schedule_writer_books_indexing
+from books.similarity import schedule_similar_books_refresh
+from lib.counters import add_to_counter
+
+
+# ########## SEARCH INDEX ########## #
+
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    """
+    Reindexes a book whenever it is saved.
+    """
+    if not raw:
+        index_books([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    """
+    Removes a deleted book from the search index.
+    """
+    remove_books([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.writer.through)
+@receiver(m2m_changed, sender=TaggedBook)
+def index_book_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Reindexes books when their writers or tags change.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Book):
+        index_books([instance.pk])
+    elif pk_set:
+        # Changed from the writer's side, e.g. writer.book_set.add(...)
+        index_books(pk_set)
+
+
+@receiver(post_save, sender=Writer)
+def index_writer_books(sender, instance, created, raw=False, **kwargs):
+    """
+    Reindexes the books of a writer whose name may have changed, in the
+    background.
+    """
+    if not created and not raw:
+        schedule_writer_books_indexing(instance.pk)
+
+
+# ########## SIMILAR BOOKS ########## #
+
+
+@receiver(m2m_changed, sender=TaggedBook)
+def refresh_tagged_book_similarities(sender, instance, action, **kwargs):
+    """
+    Refreshes the similar books of a book whose tags changed, in the
+    background.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_similar_books_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Reader)
+@receiver(post_delete, sender=Reader)
+def refresh_read_book_similarities(sender, instance, raw=False, created=True, **kwargs):
+    """
+    Refreshes the similar books of a book whose readers changed, in the
+    background. Status changes don't affect similarities.
+    """
+    if created and not raw:
+        schedule_similar_books_refresh([instance.book_id])
+
+
+# ########## TAG COUNTERS ########## #
+
+
+@receiver(post_save, sender=TaggedBook)
+def count_book_tag(sender, instance, created, raw=False, **kwargs):
+    """
+    Counts a book tagged with a tag.
+    """
+    if created and not raw:
+        add_to_counter(BookTagCount, 1, tag_id=instance.tag_id)
+
+
+@receiver(post_delete, sender=TaggedBook)
+def uncount_book_tag(sender, instance, **kwargs):
+    """
+    Uncounts a book untagged (or deleted).
+    """
+    add_to_counter(BookTagCount, -1, tag_id=instance.tag_id)
+
+
+# ########## READER COUNTERS ########## #
+
+
+@receiver(pre_save, sender=Reader)
+def detect_reader_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Remembers the book and status a reader is counted with before it is
+    saved, to move it between counters if they change.
+    """
+    instance._counted_as = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not {'book', 'book_id', 'status'} & set(update_fields):
+        return
+    instance._counted_as = Reader.objects.filter(pk=instance.pk).values_list('book_id', 'status').first()
+
+
+@receiver(post_save, sender=Reader)
+def count_reader(sender, instance, created, raw=False, **kwargs):
+    """
+    Counts a new reader, or moves a reader whose status (or book) changed
+    between counters.
+    """
+    if raw:
+        return
+    if created:
+        ReaderStatusCount.add(instance.book_id, instance.status, 1)
+        return
+    previous = getattr(instance, '_counted_as', None)
+    current = (instance.book_id, instance.status)
+    if previous is not None and previous != current:
+        ReaderStatusCount.add_many({previous: -1, current: 1})
+
+
+@receiver(post_delete, sender=Reader)
+def uncount_reader(sender, instance, **kwargs):
+    """
+    Uncounts a deleted reader.
+    """
+    ReaderStatusCount.add(instance.book_id, instance.status, -1)
+
+
+# ########## COVERS ########## #
+
+
+@receiver(post_save, sender=Book)
+def render_saved_cover(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Renders the renditions of a new cover, in the background.
+    """
+    if raw or not instance.cover:
+        return
+    if update_fields is not None and 'cover' not in update_fields:
+        return
+    if not instance.cover_renditions.filter(source=instance.cover.name).exists():
+        schedule_cover_rendering(instance.pk)
+
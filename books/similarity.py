@@ -0,0 +1,211 @@
+"""
+Similar books index.
+
+The similarity of two books combines:
+
+- the Jaccard index of their tags: shared tags / tags of either book,
+- the cosine similarity of their readers: shared readers /
+  sqrt(readers of the first book * readers of the second one).
+
+Only the TOP_N most similar books of each book are stored, in BookSimilarity.
+The scores being symmetric, refreshing a book also updates its entry in the
+lists of the books it is similar to. The lists are refreshed in the
+background (see lib.tasks) when the tags or readers of books change, and can
+be fully recomputed with `manage.py rebuild_similar_books`.
+
+Popular tags and books relate a book to a large part of the catalogue: only
+the MAX_CANDIDATES books sharing the most tags, and those sharing the most
+readers, are scored, and tags on more than MAX_TAG_BOOKS books, too common to
+tell books apart, aren't used to find them. Scores are computed for a set of
+books at once, in a few queries per CHUNK_SIZE books.
+"""
+import math
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from books.models import Reader, BookSimilarity, BookTagCount
+from books.models.book import TaggedBook
+from lib.response_cache import invalidate_models
+from lib.tasks import run_in_background
+
+# Number of similar books stored per book
+TOP_N = 20
+
+TAGS_WEIGHT = 0.6
+READERS_WEIGHT = 0.4
+
+# Books scored per book, among those sharing the most tags, and readers
+MAX_CANDIDATES = 200
+MAX_TAG_BOOKS = 10000
+
+# Books per query, within SQLite's limit of query parameters
+CHUNK_SIZE = 500
+
+
+def compute_scores(book_ids: Iterable[int]) -> dict:
+    """
+    Returns the similarity scores of the candidate books sharing a tag or a
+    reader with each of the given books, as a dict of book id -> {other book
+    id: score}. Runs a few queries per CHUNK_SIZE books and candidates.
+    """
+    book_ids = list(set(book_ids))
+    scores = defaultdict(lambda: defaultdict(float))
+    if not book_ids:
+        return scores
+
+    tagged = TaggedBook._meta.db_table
+    shared_tags = _get_shared(f"""
+        SELECT a.content_object_id AS book_id, b.content_object_id AS other_id, COUNT(*) AS shared
+        FROM {tagged} a
+        JOIN {tagged} b ON b.tag_id = a.tag_id AND b.content_object_id <> a.content_object_id
+        WHERE a.content_object_id IN ({{ids}})
+        AND a.tag_id NOT IN (SELECT tag_id FROM {BookTagCount._meta.db_table} WHERE count > %s)
+        GROUP BY a.content_object_id, b.content_object_id
+    """, book_ids, [MAX_TAG_BOOKS])
+    tags_counts = _count_by(TaggedBook.objects.all(), 'content_object_id', book_ids, shared_tags)
+    for book_id, other_id, shared in shared_tags:
+        union = tags_counts[book_id] + tags_counts[other_id] - shared
+        scores[book_id][other_id] += TAGS_WEIGHT * shared / union
+
+    readers = Reader._meta.db_table
+    shared_readers = _get_shared(f"""
+        SELECT a.book_id AS book_id, b.book_id AS other_id, COUNT(*) AS shared
+        FROM {readers} a
+        JOIN {readers} b ON b.user_id = a.user_id AND b.book_id <> a.book_id
+        WHERE a.book_id IN ({{ids}})
+        GROUP BY a.book_id, b.book_id
+    """, book_ids)
+    readers_counts = _count_by(Reader.objects.all(), 'book_id', book_ids, shared_readers)
+    for book_id, other_id, shared in shared_readers:
+        norm = math.sqrt(readers_counts[book_id] * readers_counts[other_id])
+        scores[book_id][other_id] += READERS_WEIGHT * shared / norm
+
+    return scores
+
+
+def _get_shared(sql: str, book_ids: list, params: list = ()) -> list:
+    """
+    Returns the (book_id, other_id, shared) rows of sql, a query grouping
+    the pairs of books of {ids} and the books they share something with,
+    keeping the MAX_CANDIDATES other books sharing the most per book.
+    """
+    rows = []
+    with connection.cursor() as cursor:
+        for chunk in _chunks(book_ids):
+            cursor.execute(
+                'SELECT book_id, other_id, shared FROM ('
+                '  SELECT pairs.*, ROW_NUMBER() OVER ('
+                '    PARTITION BY book_id ORDER BY shared DESC, other_id'
+                '  ) AS position FROM ({}) pairs'
+                ') ranked WHERE position <= %s'.format(sql.format(ids=', '.join(['%s'] * len(chunk)))),
+                [*chunk, *params, MAX_CANDIDATES],
+            )
+            rows.extend(cursor.fetchall())
+    return rows
+
+
+def _count_by(queryset, field: str, book_ids: list, pairs: list) -> dict:
+    """
+    Returns the number of rows of queryset per book, for the books and the
+    other books of pairs.
+    """
+    ids = set(book_ids) | {other_id for book_id, other_id, shared in pairs}
+    counts = defaultdict(int)
+    for chunk in _chunks(list(ids)):
+        counts.update(queryset.filter(**{f'{field}__in': chunk}).values_list(field).annotate(
+            count=Count('pk'),
+        ).order_by())
+    return counts
+
+
+def _chunks(items: list) -> list:
+    return [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+
+
+def get_top(scores: dict) -> dict:
+    """
+    Returns the TOP_N best scores, ties broken by book id.
+    """
+    best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:TOP_N]
+    return dict(best)
+
+
+def _replace_lists(lists: dict) -> None:
+    """
+    Replaces the stored similar books of the books in lists, a dict of book id
+    -> {similar book id: score}.
+    """
+    for chunk in _chunks(list(lists)):
+        BookSimilarity.objects.filter(book_id__in=chunk).delete()
+    BookSimilarity.objects.bulk_create([
+        BookSimilarity(book_id=book_id, similar_book_id=similar_id, score=score)
+        for book_id, similar in lists.items()
+        for similar_id, score in similar.items()
+    ])
+
+
+def schedule_similar_books_refresh(book_ids: Iterable[int]) -> None:
+    """
+    Refreshes the similar books of the given books in the background, once
+    the current transaction is committed.
+    """
+    book_ids = sorted(set(book_ids))
+    if book_ids:
+        run_in_background(refresh_similar_books, book_ids)
+
+
+def refresh_similar_books(book_ids: Iterable[int]) -> None:
+    """
+    Recomputes the similar books of the given books, and their entry in the
+    lists of the other books, CHUNK_SIZE books at a time.
+    """
+    for chunk in _chunks(sorted(set(book_ids))):
+        with transaction.atomic():
+            _refresh_chunk(chunk)
+    invalidate_models([BookSimilarity._meta.label])
+
+
+def _refresh_chunk(book_ids: list) -> None:
+    refreshed = set(book_ids)
+    scores = compute_scores(book_ids)
+
+    # Books whose list may have to include, update or drop the refreshed
+    # books: their candidates and the books listing them
+    candidates = {other_id for book_id in book_ids for other_id in scores[book_id]} - refreshed
+    current = defaultdict(dict)
+    rows = list(BookSimilarity.objects.filter(
+        book_id__in=BookSimilarity.objects.filter(similar_book_id__in=book_ids).values('book_id'),
+    ).values_list('book_id', 'similar_book_id', 'score'))
+    for chunk in _chunks(list(candidates)):
+        rows.extend(BookSimilarity.objects.filter(book_id__in=chunk).values_list(
+            'book_id', 'similar_book_id', 'score',
+        ))
+    for other_id, similar_id, score in rows:
+        current[other_id][similar_id] = score
+
+    changed = {book_id: get_top(scores[book_id]) for book_id in book_ids}
+    for other_id in (candidates | set(current)) - refreshed:
+        similar = {
+            similar_id: score for similar_id, score in current[other_id].items() if similar_id not in refreshed
+        }
+        for book_id in book_ids:
+            if scores[book_id].get(other_id):
+                similar[book_id] = scores[book_id][other_id]
+        similar = get_top(similar)
+        if similar != current[other_id]:
+            changed[other_id] = similar
+
+    _replace_lists(changed)
+
+
+def rebuild_similar_books(book_ids: Iterable[int]) -> None:
+    """
+    Recomputes the similar books of the given books only, e.g. when rebuilding
+    the whole index.
+    """
+    with transaction.atomic():
+        scores = compute_scores(book_ids)
+        _replace_lists({book_id: get_top(scores[book_id]) for book_id in set(book_ids)})
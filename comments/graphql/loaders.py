@@ -0,0 +1,34 @@
+"""
+Provides DataLoaders for the comments app (see lib.loaders).
+"""
+from comments.models import Comment
+from lib.loaders import ModelLoader, GroupedLoader, FirstPageLoader
+
+
+class CommentByIdLoader(ModelLoader):
+    """
+    Loads comments by primary key.
+    """
+    model = Comment
+
+
+class RepliesByCommentLoader(GroupedLoader):
+    """
+    Loads the direct replies to comments, in thread order, by comment
+    primary key.
+    """
+
+    def get_pairs(self, keys):
+        rows = Comment.objects.filter(parent_id__in=keys).order_by('tree_id', 'lft')
+        return ((row.parent_id, row) for row in rows)
+
+
+class ReplyPageByCommentLoader(FirstPageLoader):
+    """
+    Loads the first direct replies to comments, oldest first (see
+    CommentType.replies). Keys are (comment_id, limit) tuples.
+    """
+    key_field = 'parent_id'
+
+    def get_queryset(self, keys):
+        return Comment.objects.filter(parent_id__in=keys).order_by('publication_date', 'pk')
@@ -9,6 +9,7 @@ from django.db.models.query import QuerySet
 from graphene_django.filter import DjangoFilterConnectionField
 
 from comments.models import Comment
+from lib.connections import KeysetFilterConnectionField
 from .types import CommentType
 
 
@@ -23,4 +24,4 @@ from .types import CommentType
 
 
 class Query(graphene.ObjectType):
-    Comments = DjangoFilterConnectionField(CommentType)
+    Comments = KeysetFilterConnectionField(CommentType)
@@ -5,7 +5,13 @@ Provides GraphQL types for the comments app.
 import graphene
 from graphene_django import DjangoObjectType
 from comments.models import Comment
+from comments.graphql.loaders import CommentByIdLoader, RepliesByCommentLoader, ReplyPageByCommentLoader
 from accounts.graphql.types import UserType
+from accounts.graphql.loaders import UserByIdLoader
+from books.graphql.loaders import BookByIdLoader
+from lib.connections import KeysetConnectionField, load_first_page
+from lib.loaders import get_loader
+from lib.planner import load_related
 
 class CommentType(DjangoObjectType):
     """
@@ -24,6 +30,53 @@ class CommentType(DjangoObjectType):
     # upvotes = graphene.Field(graphene.List(UserType))
     # downvotes = graphene.Field(graphene.List(UserType))
     pk = graphene.String(source='pk')
+    thread = graphene.List(lambda: CommentType, depth=graphene.Int())
+    children = graphene.List(lambda: CommentType)
+    reply_count = graphene.Int(description=(
+        "The number of replies in the comment's thread, replies to replies "
+        "included: replies only lists the direct ones."
+    ))
+    replies = KeysetConnectionField(lambda: CommentConnection)
+
+    def resolve_owner(self, info):
+        return load_related(info, self, 'owner', UserByIdLoader, self.owner_id)
+
+    def resolve_content(self, info):
+        return load_related(info, self, 'content', BookByIdLoader, self.content_id)
+
+    def resolve_parent(self, info):
+        return load_related(info, self, 'parent', CommentByIdLoader, self.parent_id)
+
+    def resolve_thread(self, info, depth=None):
+        """
+        The replies to the comment, whose children are fetched along, down to
+        depth levels.
+        """
+        return self.get_thread(depth)
+
+    def resolve_children(self, info):
+        """
+        The direct replies to the comment, already fetched within a thread.
+        """
+        if hasattr(self, '_cached_children'):
+            return self._cached_children
+        return get_loader(info, RepliesByCommentLoader).load(self.pk)
+
+    def resolve_reply_count(self, info) -> int:
+        """
+        The number of replies in the comment's thread, all levels included
+        (more than the direct replies of CommentType.replies), which MPTT's
+        tree fields give without counting them.
+        """
+        return (self.rght - self.lft - 1) // 2
+
+    def resolve_replies(self, info, **args):
+        """
+        The direct replies to the comment, oldest first, paginated with keyset
+        cursors.
+        """
+        replies = Comment.objects.filter(parent_id=self.pk).order_by('publication_date', 'pk')
+        return load_first_page(info, ReplyPageByCommentLoader, self.pk, replies, args)
 
     # def resolve_upvotes(self, info) -> str:
     #     return self.upvotes.all()
@@ -41,3 +94,10 @@ class CommentType(DjangoObjectType):
     #         return 'user in downvotes'
     #     else:
     #         return ''
+
+
+class CommentConnection(graphene.relay.Connection):
+    """A connection for the comments of a book, or the replies to a comment"""
+
+    class Meta:
+        node = CommentType
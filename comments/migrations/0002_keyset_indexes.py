@@ -0,0 +1,17 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['publication_date', 'id'], name='comments_co_publica_8f3eab_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['tree_id', 'lft'], name='comments_tree_lft_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['content', 'tree_id', 'lft'], name='comments_content_tree_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_thread_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['content', 'level', 'publication_date', 'id'], name='comments_content_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent', 'publication_date', 'id'], name='comments_parent_date_idx'),
+        ),
+    ]
@@ -5,4 +5,4 @@ Import new models here so that they are picked up by django when generating
 migrations.
 """
 
-from comments.models.comments import Comment
+from comments.models.comments import Comment, get_threads
@@ -2,9 +2,11 @@
 Comments Model
 """
 import os.path
+from typing import Optional
 
 from django.db import models
 from django.db.models import Count
+from django.db.models.query import QuerySet
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -12,6 +14,7 @@ from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from mptt.models import MPTTModel, TreeForeignKey
+from mptt.utils import get_cached_trees
 
 class Comment(MPTTModel):
     """
@@ -68,6 +71,18 @@ class Comment(MPTTModel):
 
     class Meta:
         ordering = ('publication_date',)
+        # Keyset pagination seeks on the ordering columns (see lib.connections)
+        indexes = [
+            models.Index(fields=['publication_date', 'id']),
+            # Threads are fetched as ranges of the tree fields (see
+            # get_threads). Named explicitly since MPTT only adds the tree
+            # fields once the model is created.
+            models.Index(fields=['tree_id', 'lft'], name='comments_tree_lft_idx'),
+            models.Index(fields=['content', 'tree_id', 'lft'], name='comments_content_tree_idx'),
+            # Top-level comments of a book and replies, in keyset order
+            models.Index(fields=['content', 'level', 'publication_date', 'id'], name='comments_content_level_idx'),
+            models.Index(fields=['parent', 'publication_date', 'id'], name='comments_parent_date_idx'),
+        ]
 
     # def get_score(self) -> str:
     #     """
@@ -75,28 +90,25 @@ class Comment(MPTTModel):
     #     """
     #     return self.upvotes.count() - self.downvotes.count()
 
-    def get_all_children(self, include_self=False):
+    def get_thread(self, max_depth: Optional[int] = None) -> list:
         """
-        Gets all of the comment thread.
+        Returns the replies to the comment, down to max_depth levels, with
+        their own replies cached (see get_threads).
         """
-        children_list = self._recurse_for_children(self)
-        if include_self:
-            ix = 0
-        else:
-            ix = 1
-        flat_list = self._flatten(children_list[ix:])
-        return flat_list
-
-    def _recurse_for_children(self, node):
-        children= []
-        children.append(node)
-        for child in node.sub_comment.enabled():
-            if child != self:
-                children_list = self._recurse_for_children(child)
-                children.append(children_list)
-        return children
-
-    def _flatten(self, L):
-        if type(L) != type([]): return [L]
-        if L == []: return L
-        return self._flatten(L[0]) + self._flatten(L[1:])
+        return get_threads(self.get_descendants(), max_depth, self.level + 1)
+
+
+def get_threads(comments: QuerySet, max_depth: Optional[int] = None, top_level: int = 0) -> list:
+    """
+    Returns the top comments among comments, the replies of each being
+    cached, so that get_children() walks the threads without querying.
+
+    Threads are fetched with a single query, ordered on the tree fields so
+    that MPTT rebuilds them in one pass. Only the comments less than
+    max_depth levels below top_level are fetched.
+    """
+    if max_depth is not None:
+        if max_depth <= 0:
+            return []
+        comments = comments.filter(level__lt=top_level + max_depth)
+    return get_cached_trees(list(comments.order_by('tree_id', 'lft')))
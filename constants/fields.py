@@ -5,8 +5,8 @@ Constants related to field types and values, internal or external
 # checks.
 # FACEBOOK_REGISTRATION_FIELDS = ("email", "first_name", "last_name")
 
-# The blacklist is checked against when creating new users.
-USERNAME_BLACKLIST = [
+# The blacklist is checked against when creating new users, in lowercase.
+USERNAME_BLACKLIST = frozenset({
     'allmecen', 'all_mecen', 'leviathan', 'crowdfunding', 'artists', 'artist', 'artworks',
     'artwork', 'art', 'arts', 'videos', 'campaigns', 'favorite', 'favorites', 'collection',
     'collections', 'products', 'gallery', 'galleries', 'cv', 'resume', 'job', 'manifest',
@@ -71,5 +71,4 @@ USERNAME_BLACKLIST = [
     'view', 'void', 'vote', 'webmail', 'webmaster', 'website', 'widget', 'widgets', 'wiki', 'wpad',
     'write', 'www', 'www-data', 'www1', 'www2', 'www3', 'www4', 'you', 'yourname', 'yourusername',
     'zlib'
-]
-
+})
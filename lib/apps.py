@@ -0,0 +1,12 @@
+"""
+Application configuration for the shared lib package.
+"""
+from django.apps import AppConfig
+
+
+class LibConfig(AppConfig):
+    name = 'lib'
+
+    def ready(self):
+        # pylint: disable=unused-import, import-outside-toplevel
+        import lib.response_cache
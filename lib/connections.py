@@ -0,0 +1,379 @@
+"""
+Relay connection helpers shared by all apps.
+"""
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as Base64Error
+from typing import Optional
+
+import graphene
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from django.db.models.query import QuerySet
+from django.utils.translation import ugettext_lazy as _
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
+from graphql_relay.connection.arrayconnection import (
+    connection_from_list_slice,
+    get_offset_with_default,
+)
+
+from lib.loaders import get_loader
+
+
+class QuerySetConnectionField(graphene.relay.ConnectionField):
+    """
+    A ConnectionField that counts and slices QuerySets in the database.
+
+    graphene's default implementation calls len() on the resolved value, which
+    loads every row of the table (and runs every prefetch on all of them)
+    before slicing the requested page out of it.
+    """
+
+    @classmethod
+    def resolve_connection(cls, connection_type, args, resolved):
+        if not isinstance(resolved, QuerySet):
+            return super().resolve_connection(connection_type, args, resolved)
+
+        length = resolved.count()
+        connection = connection_from_list_slice(
+            resolved,
+            args,
+            slice_start=0,
+            list_length=length,
+            list_slice_length=length,
+            connection_type=connection_type,
+            edge_type=connection_type.Edge,
+            pageinfo_type=graphene.relay.PageInfo,
+        )
+        connection.iterable = resolved
+        return connection
+
+
+# Page size of the keyset-paginated connections (KeysetConnectionField,
+# KeysetFilterConnectionField) when the client provides neither `first` nor
+# `last`: their pageInfo tells whether there are more. Other connections
+# return every item by default.
+DEFAULT_PAGE_SIZE = 100
+
+
+def with_default_page(args) -> dict:
+    """
+    Returns the arguments of a connection, requesting the first
+    DEFAULT_PAGE_SIZE items if no page size was given.
+    """
+    if args.get('first') is None and args.get('last') is None:
+        return dict(args, first=DEFAULT_PAGE_SIZE)
+    return args
+
+
+def get_page_bounds(args) -> tuple:
+    """
+    Returns the (offset, limit) of the page requested by the `after` and
+    `first` arguments of a connection.
+    """
+    offset = get_offset_with_default(args.get('after'), -1) + 1
+    limit = args.get('first')
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    return offset, limit
+
+
+def connection_from_page(connection_type, args, page: list, length: int):
+    """
+    Builds a connection out of the page described by get_page_bounds(args),
+    already fetched, in a list of the given total length.
+    """
+    offset, limit = get_page_bounds(args)
+    return connection_from_list_slice(
+        page,
+        dict(args, first=limit),
+        slice_start=offset,
+        list_length=length,
+        list_slice_length=len(page),
+        connection_type=connection_type,
+        edge_type=connection_type.Edge,
+        pageinfo_type=graphene.relay.PageInfo,
+    )
+
+
+# ########## KEYSET PAGINATION ########## #
+
+KEYSET_CURSOR_PREFIX = 'keyset:'
+
+
+class KeysetConnectionField(QuerySetConnectionField):
+    """
+    A ConnectionField paginating QuerySets with keyset cursors (see
+    keyset_connection), so that deep pages cost the same as the first one.
+    Pages have DEFAULT_PAGE_SIZE items by default.
+    """
+
+    @classmethod
+    def resolve_connection(cls, connection_type, args, resolved):
+        args = with_default_page(args)
+        if isinstance(resolved, LoadedFirstPage):
+            return resolved.get_connection(connection_type)
+        if isinstance(resolved, QuerySet):
+            connection = keyset_connection(connection_type, args, resolved)
+            if connection is not None:
+                return connection
+        return super().resolve_connection(connection_type, args, resolved)
+
+
+class KeysetFilterConnectionField(DjangoFilterConnectionField):
+    """
+    A DjangoFilterConnectionField paginating with keyset cursors (see
+    keyset_connection). Pages have DEFAULT_PAGE_SIZE items by default.
+    """
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, **kwargs):
+        # graphene-django >= 2.11 also passes the max_limit of the field
+        args = with_default_page(args)
+        max_limit = kwargs.get('max_limit')
+        if max_limit:
+            args = dict(args, **{
+                name: min(args[name], max_limit) for name in ('first', 'last') if args.get(name) is not None
+            })
+        if isinstance(iterable, QuerySet):
+            keyset = keyset_connection(connection, args, iterable)
+            if keyset is not None:
+                return keyset
+        return super().resolve_connection(connection, args, iterable, **kwargs)
+
+
+def keyset_connection(connection_type, args, qs: QuerySet):
+    """
+    Builds the page of qs requested by args using keyset ("seek") pagination.
+
+    Cursors are opaque encodings of the ordering fields of the edge's node,
+    plus its primary key as a tiebreaker: the next page is fetched with a
+    `WHERE (sort key, pk) > (cursor's sort key, pk)` condition that the
+    database resolves with an index seek, instead of an OFFSET that scans and
+    discards every previous row.
+
+    Returns None when the queryset's ordering can't be used as a keyset (e.g.
+    an ordering on a many-to-many relation or on an annotation), in which case
+    the caller should fall back on offset pagination.
+    """
+    terms = get_keyset_terms(qs)
+    if terms is None:
+        return None
+
+    names = [order_name for order_name, field, descending in terms]
+    first = args.get('first')
+    last = args.get('last')
+    after = args.get('after')
+    before = args.get('before')
+
+    if after:
+        qs = qs.filter(_seek_filter(terms, decode_keyset_cursor(after, names)))
+    if before:
+        qs = qs.filter(_seek_filter(terms, decode_keyset_cursor(before, names), backwards=True))
+
+    # Make sure the ordering fields are loaded if the query plan deferred them
+    field_names, defer = qs.query.deferred_loading
+    if not defer:
+        qs = qs.only(*field_names, *(field.name for name, field, descending in terms))
+
+    # Backward pagination without first: read the ordering in reverse and put
+    # the page back in order afterwards.
+    backwards = last is not None and first is None
+    qs = qs.order_by(*(_order_expression(field, descending ^ backwards)
+                       for name, field, descending in terms))
+
+    limit = first if not backwards else last
+    if limit is not None:
+        # One extra row tells whether there is a page after this one
+        nodes = list(qs[:limit + 1])
+        has_more = len(nodes) > limit
+        nodes = nodes[:limit]
+    else:
+        nodes = list(qs)
+        has_more = False
+
+    if backwards:
+        nodes.reverse()
+    elif last is not None:
+        nodes = nodes[max(len(nodes) - last, 0):]
+
+    return _keyset_page(
+        connection_type, nodes, terms,
+        has_previous_page=has_more if backwards else bool(after),
+        has_next_page=bool(before) if backwards else has_more,
+    )
+
+
+class LoadedFirstPage:
+    """
+    The first page of a queryset, fetched by a lib.loaders.FirstPageLoader
+    along with the pages of the other nodes being resolved (see
+    load_first_page). KeysetConnectionField turns it into the connection
+    keyset_connection would have returned.
+    """
+
+    def __init__(self, qs: QuerySet, rows: list, limit: int):
+        self.qs = qs
+        self.rows = rows
+        self.limit = limit
+
+    def get_connection(self, connection_type):
+        return _keyset_page(
+            connection_type, self.rows[:self.limit], get_keyset_terms(self.qs),
+            has_previous_page=False,
+            has_next_page=len(self.rows) > self.limit,
+        )
+
+
+def load_first_page(info, loader_class, key, qs: QuerySet, args):
+    """
+    Returns the resolved value of a KeysetConnectionField listing qs, the
+    rows of key in loader_class (a lib.loaders.FirstPageLoader, ordered as
+    qs).
+
+    The first pages of all the nodes are loaded at once, instead of running
+    a query per node; qs is only paginated on its own for the other pages.
+    """
+    if any(args.get(name) is not None for name in ('after', 'before', 'last')):
+        return qs
+    limit = get_page_bounds(args)[1]
+    return get_loader(info, loader_class).load((key, limit)).then(
+        lambda rows: LoadedFirstPage(qs, rows, limit),
+    )
+
+
+def _keyset_page(connection_type, nodes: list, terms, **page_info):
+    """
+    Returns the connection listing nodes, with their keyset cursors.
+    """
+    edges = [
+        connection_type.Edge(node=node, cursor=encode_keyset_cursor(node, terms))
+        for node in nodes
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=graphene.relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            **page_info,
+        ),
+    )
+
+
+def get_keyset_terms(qs: QuerySet) -> Optional[list]:
+    """
+    Returns the ordering of qs as a list of (name, field, descending) tuples
+    ending with the primary key, or None if it can't be used as a keyset.
+    """
+    query = qs.query
+    if query.extra_order_by:
+        return None
+    ordering = query.order_by or (query.default_ordering and qs.model._meta.ordering) or ()
+
+    opts = qs.model._meta
+    terms = []
+    for term in ordering:
+        if not isinstance(term, str) or '__' in term or term == '?':
+            return None
+        descending = term.startswith('-')
+        name = term.lstrip('-')
+        try:
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many:
+            return None
+        terms.append((term, field, descending))
+
+    if not any(field.primary_key for name, field, descending in terms):
+        terms.append(('pk', opts.pk, False))
+    return terms
+
+
+def encode_keyset_cursor(node, terms) -> str:
+    """
+    Returns the cursor of node: its values for the ordering fields.
+    """
+    payload = {
+        'order': [name for name, field, descending in terms],
+        'values': [getattr(node, field.attname) for name, field, descending in terms],
+    }
+    data = json.dumps(payload, default=str, separators=(',', ':'))
+    return b64encode((KEYSET_CURSOR_PREFIX + data).encode()).decode()
+
+
+def decode_keyset_cursor(cursor: str, names: list) -> list:
+    """
+    Returns the ordering values encoded in cursor, checking that it was
+    produced with the same ordering.
+    """
+    try:
+        data = b64decode(cursor.encode()).decode()
+        if not data.startswith(KEYSET_CURSOR_PREFIX):
+            raise ValueError
+        payload = json.loads(data[len(KEYSET_CURSOR_PREFIX):])
+        if payload['order'] != names:
+            raise ValueError
+        return payload['values']
+    except (Base64Error, UnicodeDecodeError, ValueError, KeyError, TypeError):
+        raise GraphQLError(_("Invalid cursor, or a cursor used with a different ordering."))
+
+
+def _order_expression(field, descending: bool):
+    """
+    NULL values are always considered greater than any other, whatever the
+    database's default.
+    """
+    if not field.null:
+        return F(field.attname).desc() if descending else F(field.attname).asc()
+    if descending:
+        return F(field.attname).desc(nulls_first=True)
+    return F(field.attname).asc(nulls_last=True)
+
+
+def _seek_filter(terms, values, backwards=False) -> Q:
+    """
+    Returns the condition selecting the rows strictly after (or before) the
+    given ordering values: (a > va) OR (a = va AND b > vb) OR ...
+    """
+    condition = None
+    equal = Q()
+    for (name, field, descending), value in zip(terms, values):
+        after = _seek_field_filter(field, value, descending ^ backwards)
+        if after is not None:
+            after = equal & after
+            condition = after if condition is None else condition | after
+        if value is None:
+            equal &= Q(**{f'{field.attname}__isnull': True})
+        else:
+            equal &= Q(**{field.attname: value})
+    if condition is None:
+        return Q(pk__in=[])
+
+    # Redundant bound on the leading ordering field, which lets the database
+    # turn the condition into an index range scan.
+    name, field, descending = terms[0]
+    bound = _seek_field_filter(field, values[0], descending ^ backwards, inclusive=True)
+    if bound is not None:
+        condition = bound & condition
+    return condition
+
+
+def _seek_field_filter(field, value, descending: bool, inclusive=False) -> Optional[Q]:
+    """
+    Returns the condition on a single field selecting the values after (or
+    equal to, if inclusive) value, or None if there is no such condition. NULL
+    is greater than any other value.
+    """
+    name = field.attname
+    if value is None:
+        if inclusive:
+            return None if descending else Q(**{f'{name}__isnull': True})
+        if descending:
+            return Q(**{f'{name}__isnull': False})
+        return None
+    lookup = ('lt' if descending else 'gt') + ('e' if inclusive else '')
+    if descending or not field.null:
+        return Q(**{f'{name}__{lookup}': value})
+    return Q(**{f'{name}__{lookup}': value}) | Q(**{f'{name}__isnull': True})
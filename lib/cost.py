@@ -0,0 +1,277 @@
+"""
+Static cost analysis of GraphQL operations.
+
+Before an operation is executed, its selection is walked along the schema to
+estimate how many objects it may resolve:
+
+- every field returning an object (or a list of objects) costs 1, scalars are
+  free; weights can be overridden per field in GRAPHQL_COST['FIELD_COSTS'],
+- the cost of the selection of a connection is multiplied by the requested
+  page size (`first` or `last`, the default page size otherwise),
+- the cost of the selection of a list is multiplied by its `first` argument,
+  or by its expected size (GRAPHQL_COST['LIST_SIZES'], DEFAULT_LIST_SIZE
+  otherwise).
+
+Operations exceeding MAX_COST, nesting fields deeper than MAX_DEPTH or
+requesting pages larger than MAX_PAGE_SIZE are rejected. The edges / node /
+pageInfo levels of connections don't count in the depth, nor do introspection
+fields.
+
+Fields are identified as 'TypeName.fieldName', as in the GraphQL schema.
+"""
+from typing import Optional
+
+from django.conf import settings
+from django.utils.translation import ugettext_lazy as _
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.type.definition import (
+    GraphQLInterfaceType,
+    GraphQLList,
+    GraphQLNonNull,
+    GraphQLObjectType,
+)
+
+from lib.connections import DEFAULT_PAGE_SIZE
+
+DEFAULTS = {
+    'MAX_COST': 5000,
+    'MAX_DEPTH': 8,
+    'MAX_PAGE_SIZE': DEFAULT_PAGE_SIZE,
+    'DEFAULT_LIST_SIZE': 10,
+    'FIELD_COSTS': {},
+    'LIST_SIZES': {},
+}
+
+
+def get_cost_settings() -> dict:
+    """
+    Returns the DEFAULTS overridden by the GRAPHQL_COST setting.
+    """
+    return dict(DEFAULTS, **getattr(settings, 'GRAPHQL_COST', {}))
+
+
+class QueryCost:
+    """
+    The estimated cost and the depth of an operation.
+    """
+
+    def __init__(self, cost: int = 0, depth: int = 0):
+        self.cost = cost
+        self.depth = depth
+
+    def as_dict(self) -> dict:
+        limits = get_cost_settings()
+        return {
+            'cost': self.cost,
+            'maxCost': limits['MAX_COST'],
+            'depth': self.depth,
+            'maxDepth': limits['MAX_DEPTH'],
+        }
+
+
+def check_query_cost(schema, document_ast, operation_name=None, variables=None) -> QueryCost:
+    """
+    Returns the cost of the operation to execute, raising a GraphQLError if it
+    is over budget.
+    """
+    limits = get_cost_settings()
+    query_cost = analyze_query_cost(schema, document_ast, operation_name, variables, limits)
+    if query_cost.depth > limits['MAX_DEPTH']:
+        raise GraphQLError(
+            _("The query is nested {depth} levels deep, the limit is {limit}.").format(
+                depth=query_cost.depth, limit=limits['MAX_DEPTH'],
+            ),
+            extensions={'code': 'QUERY_TOO_DEEP'},
+        )
+    if query_cost.cost > limits['MAX_COST']:
+        raise GraphQLError(
+            _("The query's cost is {cost}, the limit is {limit}.").format(
+                cost=query_cost.cost, limit=limits['MAX_COST'],
+            ),
+            extensions={'code': 'QUERY_TOO_COSTLY'},
+        )
+    return query_cost
+
+
+def analyze_query_cost(schema, document_ast, operation_name=None, variables=None, limits=None) -> QueryCost:
+    """
+    Returns the cost of the operation to execute. Raises a GraphQLError when a
+    page larger than MAX_PAGE_SIZE is requested.
+    """
+    operation = _get_operation(document_ast, operation_name)
+    if operation is None:
+        # Execution reports the error
+        return QueryCost()
+
+    if operation.operation == 'mutation':
+        root_type = schema.get_mutation_type()
+    elif operation.operation == 'subscription':
+        root_type = schema.get_subscription_type()
+    else:
+        root_type = schema.get_query_type()
+
+    analyzer = _Analyzer(schema, document_ast, operation, variables or {}, limits or get_cost_settings())
+    cost, depth = analyzer.selection_cost(root_type, operation.selection_set)
+    return QueryCost(cost, depth)
+
+
+def _get_operation(document_ast, operation_name) -> Optional[ast.OperationDefinition]:
+    operations = [
+        definition for definition in document_ast.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name:
+        for operation in operations:
+            if operation.name and operation.name.value == operation_name:
+                return operation
+        return None
+    return operations[0] if len(operations) == 1 else None
+
+
+class _Analyzer:
+    """
+    Walks the selection of an operation, see analyze_query_cost.
+    """
+
+    def __init__(self, schema, document_ast, operation, variables, limits):
+        self.schema = schema
+        self.limits = limits
+        self.fragments = {
+            definition.name.value: definition for definition in document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        self.variables = {
+            definition.variable.name.value: _get_value(definition.default_value, {})
+            for definition in operation.variable_definitions or ()
+            if definition.default_value is not None
+        }
+        self.variables.update(variables)
+
+    def selection_cost(self, parent_type, selection_set) -> tuple:
+        """
+        Returns the (cost, depth) of a selection on parent_type.
+        """
+        total_cost = 0
+        max_depth = 0
+        for field_type, node in self.collect_fields(parent_type, selection_set):
+            cost, depth = self.field_cost(field_type, node)
+            total_cost += cost
+            max_depth = max(max_depth, depth)
+        return total_cost, max_depth
+
+    def collect_fields(self, parent_type, selection_set, visited=None):
+        """
+        Yields the (parent type, field node) of the fields of a selection,
+        fragments included.
+        """
+        visited = set() if visited is None else visited
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                yield parent_type, selection
+                continue
+            if isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                if name in visited or name not in self.fragments:
+                    continue
+                visited.add(name)
+                selection = self.fragments[name]
+            fragment_type = parent_type
+            if selection.type_condition is not None:
+                fragment_type = self.schema.get_type(selection.type_condition.name.value) or parent_type
+            yield from self.collect_fields(fragment_type, selection.selection_set, visited)
+
+    def field_cost(self, parent_type, node) -> tuple:
+        """
+        Returns the (cost, depth) of a field and its selection.
+        """
+        name = node.name.value
+        if name.startswith('__') or not hasattr(parent_type, 'fields'):
+            return 0, 0
+        field = parent_type.fields.get(name)
+        if field is None:
+            return 0, 0
+
+        field_type = field.type
+        is_list = False
+        while isinstance(field_type, (GraphQLNonNull, GraphQLList)):
+            is_list = is_list or isinstance(field_type, GraphQLList)
+            field_type = field_type.of_type
+        is_composite = isinstance(field_type, (GraphQLObjectType, GraphQLInterfaceType))
+
+        key = '{}.{}'.format(parent_type.name, name)
+        args = self.get_arguments(node)
+        page_size = self.get_page_size(key, args)
+
+        if _is_connection_plumbing(parent_type, name):
+            weight, multiplier, level = 0, 1, 0
+        else:
+            weight = self.limits['FIELD_COSTS'].get(key, 1 if is_composite else 0)
+            level = 1
+            if _is_connection(field_type):
+                multiplier = page_size or DEFAULT_PAGE_SIZE
+            elif is_list and is_composite:
+                multiplier = page_size or self.limits['LIST_SIZES'].get(
+                    key, self.limits['DEFAULT_LIST_SIZE'],
+                )
+            else:
+                multiplier = 1
+
+        if node.selection_set is None:
+            return weight, level
+        cost, depth = self.selection_cost(field_type, node.selection_set)
+        return weight + multiplier * cost, level + depth
+
+    def get_arguments(self, node) -> dict:
+        return {
+            argument.name.value: _get_value(argument.value, self.variables)
+            for argument in node.arguments or ()
+        }
+
+    def get_page_size(self, key: str, args: dict) -> Optional[int]:
+        """
+        Returns the page size requested by the `first` or `last` arguments of
+        a field, if any.
+        """
+        sizes = [
+            args[name] for name in ('first', 'last')
+            if isinstance(args.get(name), int)
+        ]
+        if not sizes:
+            return None
+        size = max(sizes)
+        if size > self.limits['MAX_PAGE_SIZE']:
+            raise GraphQLError(
+                _("{field} requests {size} items, the limit is {limit}.").format(
+                    field=key, size=size, limit=self.limits['MAX_PAGE_SIZE'],
+                ),
+                extensions={'code': 'PAGE_TOO_LARGE'},
+            )
+        return size
+
+
+def _get_value(value, variables):
+    """
+    Returns the Python value of an argument's literal (scalars only).
+    """
+    if isinstance(value, ast.Variable):
+        return variables.get(value.name.value)
+    if isinstance(value, ast.IntValue):
+        return int(value.value)
+    return None
+
+
+def _is_connection(graphql_type) -> bool:
+    fields = getattr(graphql_type, 'fields', None) or {}
+    return 'edges' in fields and 'pageInfo' in fields
+
+
+def _is_connection_plumbing(parent_type, name: str) -> bool:
+    """
+    Whether the field is one of the intermediate levels of a connection, whose
+    cost is accounted for by the connection field.
+    """
+    if name in ('edges', 'pageInfo'):
+        return _is_connection(parent_type)
+    fields = parent_type.fields
+    return name == 'node' and 'cursor' in fields
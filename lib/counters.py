@@ -0,0 +1,152 @@
+"""
+Helpers for denormalized counters.
+
+Counters are rows holding a `count` column, updated with
+`UPDATE ... SET count = count + delta` so that concurrent updates never lose
+increments. They are meant to be updated from signal handlers, inside the
+transaction that changes the rows they count.
+
+Counters updated very often (e.g. for popular objects) can be split across
+several rows, or shards: each update picks one at random, so that concurrent
+transactions rarely wait on each other's row lock, and reads sum the shards.
+
+Bulk writes, which send no signal, update many counters at once with
+add_to_counters() and add_to_sharded_counters(), in a few queries per
+BATCH_SIZE counters.
+"""
+import random
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+# Counters looked up and updated per query: SQLite limits the depth of
+# expressions, which grows with the number of OR and WHEN terms
+BATCH_SIZE = 250
+
+
+def add_to_counter(model, delta: int, **lookup) -> None:
+    """
+    Adds delta to the counter of model identified by lookup, creating it if
+    needed. Negative deltas never create counters.
+    """
+    if model.objects.filter(**lookup).update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(count=delta, **lookup)
+    except IntegrityError:
+        # Created concurrently since the update
+        model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+def add_to_sharded_counter(model, delta: int, shards: int, **lookup) -> None:
+    """
+    Adds delta to a random shard among `shards` of the counter of model
+    identified by lookup. model must have a `shard` field.
+    """
+    shard = random.randrange(shards)
+    if delta < 0 and not model.objects.filter(shard=shard, **lookup).exists():
+        # Only the sum of the shards matters, decrement an existing one
+        shard = model.objects.filter(**lookup).values_list('shard', flat=True).first()
+        if shard is None:
+            return
+    add_to_counter(model, delta, shard=shard, **lookup)
+
+
+def add_to_counters(model, deltas: dict, fields: tuple) -> None:
+    """
+    Adds deltas to several counters of model, creating them if needed.
+    deltas maps the values of `fields` identifying each counter (a tuple) to
+    the delta to add. Negative deltas never create counters.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if len(deltas) > BATCH_SIZE:
+        for batch in _split(deltas):
+            add_to_counters(model, batch, fields)
+        return
+    if not deltas:
+        return
+    pks = {
+        tuple(key): pk
+        for pk, *key in model.objects.filter(_match(fields, deltas)).values_list('pk', *fields)
+    }
+    _update_counters(model, {pks[key]: delta for key, delta in deltas.items() if key in pks})
+    _create_counters(model, fields, {
+        key: delta for key, delta in deltas.items() if key not in pks and delta > 0
+    })
+
+
+def add_to_sharded_counters(model, deltas: dict, shards: int, fields: tuple) -> None:
+    """
+    Like add_to_counters(), adding the deltas to a random shard among
+    `shards` (the same one for every counter).
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if len(deltas) > BATCH_SIZE:
+        for batch in _split(deltas):
+            add_to_sharded_counters(model, batch, shards, fields)
+        return
+    if not deltas:
+        return
+    shard = random.randrange(shards)
+    chosen = {}
+    existing = {}
+    rows = model.objects.filter(_match(fields, deltas)).values_list('pk', 'shard', *fields)
+    for pk, row_shard, *key in rows:
+        key = tuple(key)
+        existing[key] = pk
+        if row_shard == shard:
+            chosen[key] = pk
+
+    updates = {}
+    creations = {}
+    for key, delta in deltas.items():
+        if key in chosen:
+            updates[chosen[key]] = delta
+        elif delta > 0:
+            creations[key] = delta
+        elif key in existing:
+            # Only the sum of the shards matters, decrement an existing one
+            updates[existing[key]] = delta
+    _update_counters(model, updates)
+    _create_counters(model, fields, creations, shard=shard)
+
+
+def _split(deltas: dict) -> list:
+    items = list(deltas.items())
+    return [dict(items[i:i + BATCH_SIZE]) for i in range(0, len(items), BATCH_SIZE)]
+
+
+def _match(fields: tuple, keys) -> Q:
+    return reduce(or_, (Q(**dict(zip(fields, key))) for key in keys))
+
+
+def _update_counters(model, deltas: dict) -> None:
+    """
+    Adds deltas (by counter's primary key) to existing counters, in one query.
+    """
+    if deltas:
+        model.objects.filter(pk__in=list(deltas)).update(count=F('count') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            output_field=IntegerField(),
+        ))
+
+
+def _create_counters(model, fields: tuple, deltas: dict, **lookup) -> None:
+    """
+    Creates the counters identified by the keys of deltas, in one query.
+    """
+    if not deltas:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([
+                model(count=delta, **dict(zip(fields, key)), **lookup)
+                for key, delta in deltas.items()
+            ])
+    except IntegrityError:
+        # Some were created concurrently since they were looked up
+        for key, delta in deltas.items():
+            add_to_counter(model, delta, **dict(zip(fields, key)), **lookup)
@@ -0,0 +1,217 @@
+"""
+Parsing, validation and persistence of the GraphQL documents sent to the
+/graphql endpoint.
+
+- CachedDocumentBackend parses and validates each distinct document once and
+  keeps the result in a per-process LRU cache keyed by the document's sha256.
+  graphql-core's own backends validate the document on every execution.
+  Operations are then checked against the cost limits of lib.cost before
+  being executed.
+
+- get_persisted_query implements automatic persisted queries (Apollo's
+  protocol): clients send the sha256 of the document in
+  `extensions.persistedQuery.sha256Hash`, alone at first, along with the
+  document if the server answers `PersistedQueryNotFound`. Known documents are
+  stored in the default Django cache for GRAPHQL_PERSISTED_QUERY_TIMEOUT
+  seconds. Registration is open to any client, so it is bounded: documents
+  longer than GRAPHQL_PERSISTED_QUERY_MAX_LENGTH and those beyond
+  GRAPHQL_PERSISTED_QUERY_REGISTRATIONS per hour are executed but not
+  registered.
+
+The GRAPHQL_PERSISTED_QUERIES setting selects the mode:
+
+- 'auto' (the default): ad-hoc documents are accepted, and registered when
+  sent with their hash,
+- 'allowlist': only the documents of the GRAPHQL_QUERY_ALLOWLIST JSON file (a
+  {sha256: document} object, e.g. generated by the clients' build) are
+  executed, whether sent in full or by hash.
+"""
+import json
+import time
+from collections import OrderedDict
+from functools import lru_cache, partial
+from hashlib import sha256
+from threading import Lock
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import ugettext_lazy as _
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import execute, ExecutionResult
+from graphql.language.base import parse, print_ast
+from graphql.validation import validate
+
+from lib.cost import check_query_cost
+
+PERSISTED_QUERY_CACHE_PREFIX = 'graphql:persisted:'
+PERSISTED_QUERY_REGISTRATIONS_KEY = 'graphql:persisted-registrations:{}'
+
+PERSISTED_QUERY_TIMEOUT = 24 * 3600
+PERSISTED_QUERY_MAX_LENGTH = 20000
+PERSISTED_QUERY_REGISTRATIONS = 1000
+
+MODE_AUTO = 'auto'
+MODE_ALLOWLIST = 'allowlist'
+
+
+def get_document_hash(document: str) -> str:
+    """
+    Returns the sha256 of a document, as used by persisted queries.
+    """
+    return sha256(document.encode()).hexdigest()
+
+
+class CachedDocumentBackend(GraphQLBackend):
+    """
+    A graphql-core backend keeping the last `size` parsed and validated
+    documents. Documents that fail validation are cached too, along with their
+    errors.
+    """
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self._documents = OrderedDict()
+        self._lock = Lock()
+
+    def document_from_string(self, schema, document_string):
+        key = (id(schema), get_document_hash(document_string))
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                return document
+
+        # Syntax errors raise, and are reported by the view
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        if errors:
+            run = partial(_invalid_result, errors)
+        else:
+            run = partial(_execute_within_budget, schema, document_ast)
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=run,
+        )
+        # Identifies the document whatever its formatting (see lib.response_cache)
+        document.normalized_hash = get_document_hash(print_ast(document_ast))
+
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.size:
+                self._documents.popitem(last=False)
+        return document
+
+
+def _invalid_result(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+def _execute_within_budget(schema, document_ast, *args, **kwargs):
+    """
+    Executes the document if its cost is within the limits (see lib.cost),
+    reporting the cost in the result's extensions.
+    """
+    try:
+        query_cost = check_query_cost(
+            schema, document_ast, kwargs.get('operation_name'), kwargs.get('variables'),
+        )
+    except GraphQLError as error:
+        return ExecutionResult(errors=[error], invalid=True)
+    result = execute(schema, document_ast, *args, **kwargs)
+    result.extensions['cost'] = query_cost.as_dict()
+    return result
+
+
+class PersistedQueryError(GraphQLError):
+    """
+    Raised when a persisted query can't be resolved. The `code` extension
+    tells clients how to recover (e.g. by sending the full document).
+    """
+
+    def __init__(self, message, code: str):
+        super().__init__(message, extensions={'code': code})
+
+
+def get_persisted_query(query: Optional[str], extensions: Optional[dict]) -> Optional[str]:
+    """
+    Returns the document to execute for a request, given its `query` and
+    `extensions` parameters, registering it if needed.
+    """
+    mode = getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', MODE_AUTO)
+    persisted = (extensions or {}).get('persistedQuery')
+
+    if persisted is None:
+        if mode == MODE_ALLOWLIST and query:
+            if get_document_hash(query) not in get_allowlist():
+                raise PersistedQueryError(
+                    _("Only allowlisted queries can be executed."),
+                    'PERSISTED_QUERY_NOT_ALLOWED',
+                )
+        return query
+
+    document_hash = persisted.get('sha256Hash') if isinstance(persisted, dict) else None
+    if not isinstance(document_hash, str):
+        raise PersistedQueryError(_("Invalid persisted query."), 'PERSISTED_QUERY_INVALID')
+
+    if query:
+        if get_document_hash(query) != document_hash:
+            raise PersistedQueryError(
+                _("The query doesn't match its sha256Hash."), 'PERSISTED_QUERY_INVALID',
+            )
+        if mode == MODE_ALLOWLIST:
+            if document_hash not in get_allowlist():
+                raise PersistedQueryError(
+                    _("Only allowlisted queries can be executed."),
+                    'PERSISTED_QUERY_NOT_ALLOWED',
+                )
+        else:
+            register_persisted_query(document_hash, query)
+        return query
+
+    if mode == MODE_ALLOWLIST:
+        query = get_allowlist().get(document_hash)
+    else:
+        query = cache.get(PERSISTED_QUERY_CACHE_PREFIX + document_hash)
+    if query is None:
+        # Apollo clients look for this exact message
+        raise PersistedQueryError('PersistedQueryNotFound', 'PERSISTED_QUERY_NOT_FOUND')
+    return query
+
+
+def register_persisted_query(document_hash: str, query: str) -> None:
+    """
+    Stores a document sent with its hash, unless it is known already, too
+    long, or too many documents were registered in the current hour.
+    """
+    key = PERSISTED_QUERY_CACHE_PREFIX + document_hash
+    if len(query) > getattr(settings, 'GRAPHQL_PERSISTED_QUERY_MAX_LENGTH', PERSISTED_QUERY_MAX_LENGTH):
+        return
+    if cache.get(key) is not None:
+        return
+
+    counter = PERSISTED_QUERY_REGISTRATIONS_KEY.format(int(time.time() // 3600))
+    cache.add(counter, 0, 3600)
+    try:
+        registrations = cache.incr(counter)
+    except ValueError:
+        # Expired meanwhile
+        registrations = 1
+    if registrations > getattr(settings, 'GRAPHQL_PERSISTED_QUERY_REGISTRATIONS', PERSISTED_QUERY_REGISTRATIONS):
+        return
+    cache.add(key, query, getattr(settings, 'GRAPHQL_PERSISTED_QUERY_TIMEOUT', PERSISTED_QUERY_TIMEOUT))
+
+
+@lru_cache(maxsize=None)
+def get_allowlist() -> dict:
+    """
+    Returns the {sha256: document} allowlist, read once per process.
+    """
+    path = getattr(settings, 'GRAPHQL_QUERY_ALLOWLIST', None)
+    if not path:
+        return {}
+    with open(path) as allowlist:
+        return json.load(allowlist)
@@ -0,0 +1,163 @@
+"""
+Request-scoped DataLoaders shared by all apps.
+
+Resolvers never query relations directly: they ask the loaders attached to the
+request (see lib.views.LeviathanGraphQLView), which collect the keys requested
+while a level of the query is being resolved and fetch them all at once with a
+single `IN (...)` query.
+
+Apps declare their loaders in their graphql/loaders.py module, resolvers then
+use them with `get_loader(info, SomeLoader).load(key)`.
+"""
+from abc import ABCMeta, abstractmethod
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from promise import Promise
+from promise.dataloader import DataLoader
+
+
+class LoaderRegistry:
+    """
+    Holds one instance of every loader class used during a request, so that
+    all resolvers share the same batches and cache.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+
+    def get(self, loader_class) -> DataLoader:
+        """
+        Returns the request's instance of loader_class, creating it if needed.
+        """
+        loader = self._loaders.get(loader_class)
+        if loader is None:
+            loader = self._loaders[loader_class] = loader_class()
+        return loader
+
+
+def get_loader(info, loader_class) -> DataLoader:
+    """
+    Returns the request's instance of loader_class.
+
+    The registry is created on the fly when the schema is executed outside of
+    LeviathanGraphQLView (e.g. from a shell).
+    """
+    registry = getattr(info.context, 'loaders', None)
+    if registry is None:
+        registry = LoaderRegistry()
+        setattr(info.context, 'loaders', registry)
+    return registry.get(loader_class)
+
+
+class ModelLoader(DataLoader):
+    """
+    Loads model instances by primary key. Unknown keys resolve to None.
+    """
+    model = None
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def batch_load_fn(self, keys):
+        # pylint: disable=method-hidden
+        instances = self.get_queryset().in_bulk(keys)
+        return Promise.resolve([instances.get(key) for key in keys])
+
+
+class GroupedLoader(DataLoader, metaclass=ABCMeta):
+    """
+    Loads lists of values grouped by a key, e.g. all the writers of a book.
+
+    Subclasses implement `get_pairs(keys)`, which must return an iterable of
+    `(key, value)` tuples fetched with a single query.
+    """
+
+    @abstractmethod
+    def get_pairs(self, keys):
+        pass
+
+    def batch_load_fn(self, keys):
+        # pylint: disable=method-hidden
+        grouped = defaultdict(list)
+        for key, value in self.get_pairs(keys):
+            grouped[key].append(value)
+        return Promise.resolve([grouped.get(key, []) for key in keys])
+
+
+class CountLoader(DataLoader, metaclass=ABCMeta):
+    """
+    Loads a number per key, e.g. the number of books tagged with a tag.
+
+    Subclasses implement `get_counts(keys)`, which must return an iterable of
+    `(key, count)` tuples fetched with a single query. Missing keys count as 0.
+    """
+
+    @abstractmethod
+    def get_counts(self, keys):
+        pass
+
+    def batch_load_fn(self, keys):
+        # pylint: disable=method-hidden
+        counts = dict(self.get_counts(keys))
+        return Promise.resolve([counts.get(key, 0) for key in keys])
+
+
+class FirstPageLoader(DataLoader, metaclass=ABCMeta):
+    """
+    Loads the first rows of lists grouped by a key, e.g. the first comments
+    of books, with one more row than requested telling whether there are
+    more (see lib.connections.load_first_page).
+
+    Keys are (key, limit) tuples. Subclasses set `key_field`, the field the
+    rows are grouped by, and implement `get_queryset(keys)`, which must return
+    the ordered rows of all those keys. The pages of the same limit are
+    fetched with a single query, numbering the rows of each key with
+    ROW_NUMBER().
+    """
+    key_field = None
+
+    @abstractmethod
+    def get_queryset(self, keys):
+        pass
+
+    def batch_load_fn(self, keys):
+        # pylint: disable=method-hidden
+        keys_by_limit = defaultdict(list)
+        for key, limit in keys:
+            keys_by_limit[limit].append(key)
+
+        pages = defaultdict(list)
+        for limit, limit_keys in keys_by_limit.items():
+            qs = self.get_queryset(limit_keys)
+            ordering = [
+                F(term[1:]).desc() if term.startswith('-') else F(term).asc()
+                for term in qs.query.order_by
+            ]
+            for row in get_partitioned_page(qs, self.key_field, ordering, 0, limit + 1):
+                pages[(getattr(row, self.key_field), limit)].append(row)
+
+        return Promise.resolve([pages.get(key, []) for key in keys])
+
+
+def get_partitioned_page(qs, partition: str, order, lower: int, upper: int):
+    """
+    Returns the rows of qs partitioned by the field named partition and
+    numbered from 1 in each partition by order (expressions), keeping those
+    numbered in (lower, upper], as a RawQuerySet ordered by partition then
+    position.
+    """
+    qs = qs.order_by().annotate(position=Window(
+        expression=RowNumber(),
+        partition_by=[F(partition)],
+        order_by=order,
+    ))
+    # Window annotations can't be filtered on with this version of Django, so
+    # the numbered query is wrapped in a raw one.
+    sql, params = qs.query.sql_with_params()
+    return qs.model._default_manager.raw(
+        'SELECT * FROM ({}) numbered WHERE position > %s AND position <= %s '
+        'ORDER BY {}, position'.format(sql, qs.model._meta.get_field(partition).column),
+        (*params, lower, upper),
+    )
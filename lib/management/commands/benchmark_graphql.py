@@ -0,0 +1,527 @@
+"""
+Load benchmark of the GraphQL endpoint.
+
+Runs a mix of operations (settings.GRAPHQL_BENCHMARK, see zola.benchmark),
+or operations recorded from real traffic (--replay, see lib.traffic),
+through the whole Django stack: in-process by default, or against a running
+server with --url (e.g. `runserver` or a WSGI server on the same database).
+The same operations are run with every number of concurrent workers
+(--workers), reporting the latency percentiles, errors and SQL queries of
+each operation, and the throughput.
+
+With --output, results are saved as JSON, to be passed as --baseline to a
+later run: operations whose p95 latency or number of queries grew, or a
+throughput which dropped, by more than --tolerance percent are reported and
+fail the command.
+
+In-process, every run starts with an empty response cache (or none, with
+--no-response-cache). Against a server, the number of queries is read from
+its /metrics (see lib.metrics). Mutations write to the database: benchmark
+a copy, e.g. generated with `manage.py seed_scale`, or use --read-only.
+"""
+import json
+import random
+import re
+import time
+from importlib import import_module
+from queue import Empty, Queue
+from threading import Lock, Thread
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from graphql import parse
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
+
+from lib.metrics import get_metrics_settings, get_operation_name
+from lib.response_cache import get_cache, get_response_cache_settings
+from lib.traffic import read_recording, unredact, unredact_query
+
+GRAPHQL_PATH = '/graphql'
+
+METRIC_RE = re.compile(r'^graphql_operation_sql_queries_(sum|count)\{operation="((?:[^"\\]|\\.)*)"\} (\S+)$')
+
+PERCENTILES = (50, 95, 99)
+
+
+class Command(BaseCommand):
+    help = "Measures the latency and throughput of GraphQL operations under concurrent load."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help="URL of the GraphQL endpoint of a running server, instead of running in-process.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4],
+            help="Numbers of concurrent workers to run the operations with.",
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help="Number of operations per run (300 by default, every recorded one with --replay).",
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=20,
+            help="Number of the first operations run once before measuring.",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--operation',
+            action='append',
+            default=[],
+            help="Only run these operations (repeatable).",
+        )
+        parser.add_argument(
+            '--read-only',
+            action='store_true',
+            help="Skip the mutations.",
+        )
+        parser.add_argument(
+            '--no-response-cache',
+            action='store_true',
+            help="Disables the response cache (see lib.response_cache), in-process.",
+        )
+        parser.add_argument(
+            '--catalogue',
+            default=getattr(settings, 'GRAPHQL_BENCHMARK', 'zola.benchmark'),
+            help="Module of the operation mix.",
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help="Prefix of the usernames of the users to log in (see seed_scale).",
+        )
+        parser.add_argument(
+            '--password',
+            default='password1234',
+            help="Password of the users, for tokenAuth and the redacted recorded passwords.",
+        )
+        parser.add_argument(
+            '--replay',
+            metavar='FILE',
+            help="Runs the operations recorded in FILE (see lib.traffic) instead of the mix.",
+        )
+        parser.add_argument(
+            '--output',
+            metavar='FILE',
+            help="Saves the results to FILE, as JSON.",
+        )
+        parser.add_argument(
+            '--baseline',
+            metavar='FILE',
+            help="Compares the results to those saved in FILE.",
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=10,
+            help="Percentage by which a result may be worse than the baseline.",
+        )
+        parser.add_argument(
+            '--metrics-token',
+            default=get_metrics_settings()['TOKEN'],
+            help="Token of the server's /metrics, with --url.",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['replay']:
+            calls = self.get_recorded_calls(options)
+        else:
+            calls = self.get_mix_calls(rng, options)
+        if options['operation']:
+            calls = [call for call in calls if call['name'] in options['operation']]
+        if options['read_only']:
+            calls = [call for call in calls if not is_mutation(call)]
+        if not calls:
+            raise CommandError("No operation to run.")
+
+        # Keyed by the primary keys as recorded, i.e. as strings
+        users = get_user_model().objects.in_bulk({call['user'] for call in calls if call['user']})
+        users = {str(pk): user for pk, user in users.items()}
+        if options['url']:
+            client_factory = lambda: HttpClient(options['url'], users)
+            metrics = MetricsReader(options['url'], options['metrics_token'])
+        else:
+            client_factory = lambda: InProcessClient(users)
+            metrics = None
+
+        if options['no_response_cache'] and not options['url']:
+            with override_settings(RESPONSE_CACHE=dict(get_response_cache_settings(), ENABLED=False)):
+                results = self.run(calls, client_factory, metrics, options)
+        else:
+            results = self.run(calls, client_factory, metrics, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = self.compare(json.load(baseline), results, options['tolerance'])
+            if regressions:
+                raise CommandError(f"{regressions} regressions against the baseline.")
+
+    def run(self, calls: list, client_factory, metrics, options) -> dict:
+        """
+        Runs calls with every number of workers, returning the results.
+        """
+        warmup = client_factory()
+        for call in calls[:options['warmup']]:
+            warmup.execute(call)
+        warmup.close()
+
+        results = {'url': options['url'], 'operations': len(calls), 'runs': {}}
+        for workers in sorted(set(options['workers'])):
+            if not options['url']:
+                # Every run starts with the same, empty, response cache
+                get_cache().clear()
+            queries = metrics.read() if metrics else None
+            run = run_calls(calls, workers, client_factory)
+            if metrics:
+                set_server_queries(run, queries, metrics.read())
+            results['runs'][str(workers)] = run
+            self.report(workers, run)
+        return results
+
+    def get_mix_calls(self, rng, options) -> list:
+        """
+        Returns the operations of the mix to run, drawn according to their
+        weights.
+        """
+        catalogue = import_module(options['catalogue'])
+        dataset = catalogue.load_dataset(rng, options['password'], options['prefix'])
+        operations = [
+            operation for operation in catalogue.OPERATIONS
+            if (not options['operation'] or operation['name'] in options['operation'])
+            and not (options['read_only'] and operation.get('mutation'))
+        ]
+        missing = {
+            name for operation in operations for name in operation.get('requires', ()) if not dataset[name]
+        }
+        if missing:
+            self.stderr.write(f"No {', '.join(sorted(missing))} to run operations on, skipping them.")
+            operations = [
+                operation for operation in operations
+                if not missing.intersection(operation.get('requires', ()))
+            ]
+        if not operations:
+            return []
+        calls = []
+        weights = [operation['weight'] for operation in operations]
+        for operation in rng.choices(operations, weights, k=options['requests'] or 300):
+            calls.append({
+                'name': operation['name'],
+                'query': operation['query'],
+                'variables': operation['variables'](dataset, rng),
+                'operationName': operation['name'],
+                'user': rng.choice(dataset['users'])[0] if operation.get('user') else None,
+            })
+        return calls
+
+    @staticmethod
+    def get_recorded_calls(options) -> list:
+        """
+        Returns the recorded operations to run, in their order.
+        """
+        try:
+            recorded = read_recording(options['replay'])
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f"Cannot read {options['replay']}: {error}")
+        if options['requests']:
+            recorded = recorded[:options['requests']]
+        return [
+            {
+                'name': get_operation_name(operation['query'], operation.get('operationName')),
+                'query': unredact_query(operation['query'], options['password']),
+                'variables': unredact(operation.get('variables') or {}, options['password']),
+                'operationName': operation.get('operationName'),
+                'user': operation.get('user'),
+            }
+            for operation in recorded
+        ]
+
+    def report(self, workers: int, run: dict) -> None:
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{workers} workers: {run['count']} operations in {run['seconds']:.1f}s, "
+            f"{run['throughput']:.1f} operations/s"
+        ))
+        self.stdout.write(
+            f"  {'Operation':<32} {'Count':>6} {'Errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL/op':>7}"
+        )
+        for name, stats in sorted(run['operations'].items()):
+            queries = '-' if stats['queries'] is None else f"{stats['queries']:.1f}"
+            line = (
+                f"  {name:<32} {stats['count']:>6} {stats['errors']:>6} {stats['p50'] * 1000:>8.1f} "
+                f"{stats['p95'] * 1000:>8.1f} {stats['p99'] * 1000:>8.1f} {queries:>7}"
+            )
+            self.stdout.write(self.style.ERROR(line) if stats['errors'] else line)
+            for error in stats['first_errors']:
+                self.stdout.write(f"    {error}")
+
+    def compare(self, baseline: dict, results: dict, tolerance: float) -> int:
+        """
+        Reports the differences with the baseline's results, returning the
+        number of regressions.
+        """
+        self.stdout.write(self.style.MIGRATE_HEADING("Against the baseline:"))
+        regressions = 0
+        for workers, run in sorted(results['runs'].items(), key=lambda item: int(item[0])):
+            previous = baseline.get('runs', {}).get(workers)
+            if previous is None:
+                continue
+            changes = [(f"{workers} workers", 'operations/s', previous['throughput'], run['throughput'], -1)]
+            for name, stats in sorted(run['operations'].items()):
+                before = previous['operations'].get(name)
+                if before is None:
+                    continue
+                changes.append((f"{workers} workers {name}", 'p95 ms', before['p95'] * 1000, stats['p95'] * 1000, 1))
+                if before['queries'] is not None and stats['queries'] is not None:
+                    changes.append((f"{workers} workers {name}", 'SQL/op', before['queries'], stats['queries'], 1))
+
+            for label, measure, before, after, direction in changes:
+                change = (after - before) / before * 100 if before else 0
+                line = f"  {label} {measure}: {before:.1f} -> {after:.1f} ({change:+.0f}%)"
+                if change * direction > tolerance:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(line))
+                elif change * direction < -tolerance:
+                    self.stdout.write(self.style.SUCCESS(line))
+                else:
+                    self.stdout.write(line)
+        return regressions
+
+
+def is_mutation(call: dict) -> bool:
+    try:
+        document = parse(call['query'])
+    except Exception:  # pylint: disable=broad-except
+        return False
+    for definition in document.definitions:
+        if getattr(definition, 'operation', None) is None:
+            continue
+        name = definition.name.value if definition.name else None
+        if not call['operationName'] or name == call['operationName']:
+            return definition.operation == 'mutation'
+    return False
+
+
+def run_calls(calls: list, workers: int, client_factory) -> dict:
+    """
+    Executes calls with `workers` concurrent workers, each with its own
+    client (and database connection). Returns the statistics of the run.
+    """
+    pending = Queue()
+    for call in calls:
+        pending.put(call)
+    measures = []
+    lock = Lock()
+
+    def work():
+        client = client_factory()
+        try:
+            while True:
+                try:
+                    call = pending.get_nowait()
+                except Empty:
+                    return
+                measure = client.execute(call)
+                with lock:
+                    measures.append(measure)
+        finally:
+            client.close()
+
+    started = time.perf_counter()
+    threads = [Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    operations = {}
+    for name, duration, error, queries in measures:
+        operations.setdefault(name, []).append((duration, error, queries))
+    return {
+        'count': len(measures),
+        'seconds': seconds,
+        'throughput': len(measures) / seconds if seconds else 0,
+        'operations': {name: get_stats(operation) for name, operation in operations.items()},
+    }
+
+
+def get_stats(measures: list) -> dict:
+    durations = sorted(duration for duration, error, queries in measures)
+    errors = [error for duration, error, queries in measures if error]
+    queries = [queries for duration, error, queries in measures if queries is not None]
+    stats = {
+        'count': len(measures),
+        'errors': len(errors),
+        'first_errors': sorted(set(errors))[:3],
+        'queries': sum(queries) / len(queries) if queries else None,
+    }
+    for percentile in PERCENTILES:
+        # Nearest rank
+        stats[f'p{percentile}'] = durations[max(0, -(-len(durations) * percentile // 100) - 1)]
+    return stats
+
+
+def get_error(status: int, content: bytes) -> str:
+    """
+    Returns the first error of a GraphQL response, or None.
+    """
+    try:
+        errors = json.loads(content).get('errors')
+    except ValueError:
+        errors = None
+    if errors:
+        return str(errors[0].get('message'))[:200]
+    if status != 200:
+        return f"HTTP {status}"
+    return None
+
+
+def get_allowed_host() -> str:
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    return 'localhost'
+
+
+class InProcessClient:
+    """
+    Executes operations through Django's request handler, counting their
+    SQL queries.
+    """
+
+    def __init__(self, users: dict):
+        self.users = users
+        self.client = Client(raise_request_exception=False, HTTP_HOST=get_allowed_host())
+        self.queries = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def execute(self, call: dict) -> tuple:
+        """
+        Returns the name, duration, error and number of queries of call.
+        """
+        headers = get_headers(call, self.users)
+        self.queries = 0
+        with connection.execute_wrapper(self.count_query):
+            start = time.perf_counter()
+            response = self.client.post(
+                GRAPHQL_PATH,
+                get_body(call),
+                content_type='application/json',
+                **{'HTTP_' + name.upper().replace('-', '_'): value for name, value in headers.items()},
+            )
+            duration = time.perf_counter() - start
+        return call['name'], duration, get_error(response.status_code, response.content), self.queries
+
+    @staticmethod
+    def close() -> None:
+        connection.close()
+
+
+class HttpClient:
+    """
+    Executes operations against a running server.
+    """
+
+    def __init__(self, url: str, users: dict):
+        self.url = url
+        self.users = users
+
+    def execute(self, call: dict) -> tuple:
+        headers = dict(get_headers(call, self.users), **{'Content-Type': 'application/json'})
+        request = Request(self.url, get_body(call).encode(), headers)
+        start = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                status, content = response.status, response.read()
+        except HTTPError as error:
+            status, content = error.code, error.read()
+        except URLError as error:
+            status, content = 0, json.dumps({'errors': [{'message': str(error.reason)}]}).encode()
+        duration = time.perf_counter() - start
+        return call['name'], duration, get_error(status, content), None
+
+    def close(self) -> None:
+        pass
+
+
+def get_body(call: dict) -> str:
+    return json.dumps({
+        'query': call['query'],
+        'variables': call['variables'],
+        'operationName': call['operationName'],
+    })
+
+
+def get_headers(call: dict, users: dict) -> dict:
+    """
+    Returns the headers logging in the user of call, if any. Tokens are
+    created for every request, as they expire during long runs.
+    """
+    user = users.get(str(call['user'])) if call['user'] else None
+    if user is None:
+        return {}
+    return {'Authorization': f'{jwt_settings.JWT_AUTH_HEADER_PREFIX} {get_token(user)}'}
+
+
+class MetricsReader:
+    """
+    Reads the SQL queries counted by a server's /metrics, per operation.
+    """
+
+    def __init__(self, url: str, token: str = None):
+        self.url = urljoin(url, '/metrics')
+        self.token = token
+
+    def read(self) -> dict:
+        """
+        Returns {operation: [queries, operations]}, or None if the metrics
+        cannot be read.
+        """
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        try:
+            with urlopen(Request(self.url, headers=headers)) as response:
+                content = response.read().decode()
+        except (HTTPError, URLError):
+            return None
+        totals = {}
+        for line in content.splitlines():
+            match = METRIC_RE.match(line)
+            if match:
+                kind, name, value = match.groups()
+                name = name.replace('\\n', '\n').replace('\\"', '"').replace('\\\\', '\\')
+                totals.setdefault(name, [0, 0])[kind == 'count'] = float(value)
+        return totals
+
+
+def set_server_queries(run: dict, before: dict, after: dict) -> None:
+    """
+    Sets the mean number of queries of the operations of run, from the
+    server's metrics before and after it.
+    """
+    if before is None or after is None:
+        return
+    for name, stats in run['operations'].items():
+        queries, operations = after.get(name, (0, 0))
+        previous_queries, previous_operations = before.get(name, (0, 0))
+        if operations > previous_operations:
+            stats['queries'] = (queries - previous_queries) / (operations - previous_operations)
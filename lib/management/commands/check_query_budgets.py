@@ -0,0 +1,124 @@
+"""
+Checks the number of SQL queries of a catalogue of GraphQL operations
+(settings.GRAPHQL_QUERY_BUDGETS, see zola.query_budgets).
+
+The catalogue module provides:
+
+- OPERATIONS: a list of {'name', 'query', 'budget'} dicts, with optional
+  'variables' (a dict, or a callable taking the fixture) and 'user' (whether
+  to run the operation as the fixture's user);
+- seed(size): creates a fixture growing with size and returns a dict
+  describing it (e.g. primary keys), passed to the variables callables.
+
+Each operation is executed against every fixture size. It fails if its
+number of queries varies with the size (queries run per object), or exceeds
+its budget. Everything is done in a transaction which is rolled back.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+
+from lib.loaders import LoaderRegistry
+
+
+class Command(BaseCommand):
+    help = "Checks that GraphQL operations run a constant number of SQL queries, within their budget."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[3, 9],
+            help="Sizes of the fixtures the operations are run against.",
+        )
+        parser.add_argument(
+            '--operation',
+            action='append',
+            default=[],
+            help="Only check these operations (repeatable).",
+        )
+        parser.add_argument(
+            '--catalogue',
+            default=getattr(settings, 'GRAPHQL_QUERY_BUDGETS', 'zola.query_budgets'),
+            help="Module of the operations and fixture.",
+        )
+
+    def handle(self, *args, **options):
+        catalogue = import_module(options['catalogue'])
+        operations = [
+            operation for operation in catalogue.OPERATIONS
+            if not options['operation'] or operation['name'] in options['operation']
+        ]
+        if not operations:
+            raise CommandError("No operation to check.")
+        sizes = sorted(set(options['sizes']))
+        schema = import_string(settings.GRAPHENE['SCHEMA'])
+
+        # Operation name -> [(size, queries, errors)]
+        runs = {operation['name']: [] for operation in operations}
+        for size in sizes:
+            with transaction.atomic():
+                fixture = catalogue.seed(size)
+                user = None
+                if fixture.get('user') is not None:
+                    user = get_user_model().objects.get(pk=fixture['user'])
+                for operation in operations:
+                    runs[operation['name']].append(
+                        (size, *run_operation(schema, operation, fixture, user))
+                    )
+                transaction.set_rollback(True)
+
+        failures = 0
+        for operation in operations:
+            name = operation['name']
+            counts = [len(queries) for size, queries, errors in runs[name]]
+            problems = []
+            errors = [error for size, queries, run_errors in runs[name] for error in run_errors]
+            if errors:
+                problems.append("errors: {}".format('; '.join(map(str, errors))))
+            if len(set(counts)) > 1:
+                problems.append("query count grows with the data")
+            if max(counts) > operation['budget']:
+                problems.append("over budget")
+
+            summary = "{}: {} queries (sizes {}), budget {}".format(
+                name,
+                ' / '.join(map(str, counts)),
+                ' / '.join(map(str, sizes)),
+                operation['budget'],
+            )
+            if not problems:
+                self.stdout.write(self.style.SUCCESS("OK    " + summary))
+                continue
+            failures += 1
+            self.stdout.write(self.style.ERROR("FAIL  {} ({})".format(summary, ', '.join(problems))))
+            size, queries, run_errors = runs[name][-1]
+            self.stdout.write("  Queries with size {}:".format(size))
+            for query in queries:
+                self.stdout.write("    " + query['sql'])
+
+        if failures:
+            raise CommandError("{} of {} operations failed.".format(failures, len(operations)))
+
+
+def run_operation(schema, operation: dict, fixture: dict, user) -> tuple:
+    """
+    Executes operation, returning the queries it ran and its errors.
+    """
+    variables = operation.get('variables') or {}
+    if callable(variables):
+        variables = variables(fixture)
+    request = RequestFactory().post('/graphql')
+    request.user = user if operation.get('user') and user is not None else AnonymousUser()
+    request.loaders = LoaderRegistry()
+    with CaptureQueriesContext(connection) as context:
+        result = schema.execute(operation['query'], context_value=request, variables=variables)
+    return context.captured_queries, result.errors or []
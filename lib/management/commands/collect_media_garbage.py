@@ -0,0 +1,111 @@
+"""
+Deletes the files of the content-addressed storage (see lib.storage) that no
+FileField references anymore, except the default avatar, which new users are
+given without saving it again (see accounts.avatars).
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+from accounts.avatars import get_default_avatar
+from lib.models import StoredFile
+from lib.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = "Deletes the stored files no longer referenced, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of files checked per query.",
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=int,
+            default=24,
+            help="Files saved more recently are kept: rows referencing them "
+                 "may not be committed yet.",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only count the unreferenced files.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = get_content_addressed_fields()
+        storage = ContentAddressedStorage()
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        stored_files = StoredFile.objects.filter(last_saved__lt=cutoff).exclude(
+            name=get_default_avatar(storage),
+        )
+
+        checked = 0
+        collected = 0
+        freed = 0
+        last_pk = 0
+        while True:
+            batch = list(stored_files.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            names = {stored_file.name for stored_file in batch}
+            for model, field in fields:
+                names -= set(model._default_manager.filter(
+                    **{f'{field.name}__in': names},
+                ).values_list(field.name, flat=True))
+
+            garbage = [stored_file for stored_file in batch if stored_file.name in names]
+            if garbage and not options['dry_run']:
+                garbage = delete_garbage(storage, garbage, cutoff)
+            collected += len(garbage)
+            freed += sum(stored_file.size for stored_file in garbage)
+            self.stdout.write(f"{checked} files checked, {collected} unreferenced")
+
+        action = "found" if options['dry_run'] else "deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{collected} unreferenced files {action} ({freed / 1024:.0f} KiB)."
+        ))
+
+
+def delete_garbage(storage, garbage: list, cutoff) -> list:
+    """
+    Deletes the files of garbage not saved again since cutoff, returning
+    their StoredFile.
+
+    Saving a file first bumps its last_saved (see ContentAddressedStorage), so
+    a file saved again since it was found unreferenced keeps its row. The rows
+    are deleted first, and stay locked until the files are deleted too: a
+    concurrent save of the same content waits, then writes the file again.
+    """
+    with transaction.atomic():
+        deleted = list(StoredFile.objects.select_for_update().filter(
+            pk__in=[stored_file.pk for stored_file in garbage],
+            last_saved__lt=cutoff,
+        ))
+        StoredFile.objects.filter(pk__in=[stored_file.pk for stored_file in deleted]).delete()
+        for stored_file in deleted:
+            storage.delete(stored_file.name)
+    return deleted
+
+
+def get_content_addressed_fields() -> list:
+    """
+    Returns the (model, field) of the file fields using a
+    ContentAddressedStorage.
+    """
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    ]
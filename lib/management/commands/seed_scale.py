@@ -0,0 +1,422 @@
+"""
+Fills the database with a large synthetic dataset, for load tests and
+benchmarks:
+
+    manage.py seed_scale --books 1M --users 200k --readers 20M --comments 5M
+
+Books, writers, tags, users, readers and comment threads are generated with
+skewed (Zipfian) distributions: a few tags, writers and books are very
+popular and most are not, as in real catalogues. Threads are mostly short and
+shallow, with a long tail of large and deep ones. The same --seed always
+generates the same dataset.
+
+Rows are written with chunked bulk_create(), which sends no signal: the
+counters are updated in bulk (see lib.counters), users share the default
+avatar, and comments get their MPTT tree fields computed directly. Primary
+keys are assigned by the command, which is meant to run alone on the
+database; sequences are reset afterwards. The similar books and the search
+index are left to `rebuild_similar_books` and `rebuild_search_index`.
+"""
+import random
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from taggit.models import Tag
+
+from accounts.avatars import get_default_avatar
+from accounts.models import User, TaggedUser, UserTagCount
+from books.bulk import add_tags, add_writers
+from books.models import Book, Reader, ReaderStatusCount, Writer
+from comments.models import Comment
+from lib.counters import add_to_counters
+from lib.response_cache import invalidate_models
+
+SUFFIXES = {'k': 10 ** 3, 'm': 10 ** 6}
+
+WORDS = (
+    'silent', 'river', 'night', 'garden', 'empire', 'stone', 'winter', 'shadow', 'glass',
+    'city', 'ocean', 'last', 'little', 'red', 'golden', 'lost', 'house', 'war', 'star',
+    'dream', 'forest', 'iron', 'summer', 'secret', 'king', 'machine', 'memory', 'storm',
+)
+
+GENRES = [genre for genre, label in Book.GENRE]
+
+# Relative frequencies of the reader statuses
+STATUSES = {'wish': 5, 'read': 3, 'like': 2}
+
+MAX_THREAD_SIZE = 500
+
+
+def parse_count(value: str) -> int:
+    """
+    Parses a number of rows such as 5000, 200k or 1.5M.
+    """
+    value = value.strip().lower()
+    multiplier = SUFFIXES.get(value[-1:], 1)
+    if multiplier > 1:
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError:
+        raise CommandError(f"Invalid count '{value}'.")
+
+
+class Zipf:
+    """
+    Draws items, the item of rank k (from 1) being drawn with a probability
+    proportional to 1 / k ** skew. Ranks are shuffled over the items, so that
+    popularity doesn't follow their order.
+    """
+
+    def __init__(self, items, skew: float, rng: random.Random):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.rng = rng
+        self.cum_weights = list(accumulate(1 / rank ** skew for rank in range(1, len(self.items) + 1)))
+
+    def draw(self, k: int = 1) -> list:
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def draw_distinct(self, k: int) -> list:
+        drawn = set()
+        k = min(k, len(self.items))
+        while len(drawn) < k:
+            drawn.update(self.draw(k - len(drawn)))
+        return list(drawn)
+
+    def shares(self, total: int, cap: int) -> dict:
+        """
+        Splits total among the items according to their popularity, giving
+        at most cap to any of them. Returns the {item: share} of the items
+        getting some.
+        """
+        weight = self.cum_weights[-1]
+        shares = {}
+        assigned = 0
+        previous = 0
+        for item, cum_weight in zip(self.items, self.cum_weights):
+            share = min(int(total * (cum_weight - previous) / weight), cap)
+            previous = cum_weight
+            if share:
+                shares[item] = share
+                assigned += share
+        # What the rounding left, drawn again among the items below the cap
+        attempts = 0
+        while assigned < total and attempts < 10 * total:
+            attempts += 1
+            item = self.draw()[0]
+            if shares.get(item, 0) < cap:
+                shares[item] = shares.get(item, 0) + 1
+                assigned += 1
+        return shares
+
+
+class Command(BaseCommand):
+    help = "Generates a large synthetic dataset of books, users, readers and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=parse_count, default=10000)
+        parser.add_argument('--users', type=parse_count, default=2000)
+        parser.add_argument('--readers', type=parse_count, default=100000)
+        parser.add_argument('--comments', type=parse_count, default=20000)
+        parser.add_argument(
+            '--writers',
+            type=parse_count,
+            help="Number of writers, a quarter of the books by default.",
+        )
+        parser.add_argument('--tags', type=parse_count, default=2000)
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help="Exponent of the Zipfian distributions, the higher the more skewed.",
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help="Number of rows written per transaction.",
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help="Prefix of the generated usernames, tags and writers.",
+        )
+        parser.add_argument(
+            '--password',
+            default='password1234',
+            help="Password of every generated user.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.skew = options['skew']
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f"Users prefixed with '{self.prefix}' exist already, use another --prefix.")
+
+        started = time.monotonic()
+        users = self.create_users(options['users'], options['password'])
+        tags = self.create_tags(options['tags'])
+        writers = self.create_writers(
+            options['writers'] if options['writers'] is not None else max(options['books'] // 4, 1),
+        )
+        books = self.create_books(options['books'], writers, tags)
+        self.tag_users(users, tags)
+        if users and books:
+            self.create_readers(options['readers'], users, books)
+            self.create_comments(options['comments'], users, books)
+        self.reset_sequences()
+        invalidate_models([
+            model._meta.label for model in (
+                User, TaggedUser, UserTagCount, Tag, Writer, Book, Book.writer.through,
+                Book.tags.through, Reader, ReaderStatusCount, Comment,
+            )
+        ])
+
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated in {time.monotonic() - started:.0f}s."))
+        self.stdout.write(
+            "Run `manage.py rebuild_similar_books` and `manage.py rebuild_search_index` to "
+            "compute the similar books and index the books."
+        )
+
+    def report(self, name: str, count: int, started: float) -> None:
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"{count} {name} created in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.0f} rows/s)")
+
+    def write(self, model, rows: list) -> None:
+        with transaction.atomic():
+            model.objects.bulk_create(rows)
+
+    @staticmethod
+    def get_next_pk(model) -> int:
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def create_users(self, count: int, password: str) -> list:
+        """
+        Creates count users, sharing a password hash and the default avatar.
+        Returns their primary keys.
+        """
+        started = time.monotonic()
+        password = make_password(password)
+        avatar = get_default_avatar(User._meta.get_field('avatar').storage)
+        ids = []
+        for start in range(0, count, self.batch_size):
+            users = []
+            for i in range(start, min(start + self.batch_size, count)):
+                user_id = uuid.UUID(int=self.rng.getrandbits(128), version=4)
+                users.append(User(
+                    id=user_id,
+                    username=f'{self.prefix}{i}',
+                    email=f'{self.prefix}{i}@example.com',
+                    password=password,
+                    avatar=avatar,
+                    location=self.rng.choice(('', 'Paris', 'Lyon', 'Marseille', 'Lille')),
+                ))
+                ids.append(user_id)
+            self.write(User, users)
+        self.report('users', count, started)
+        return ids
+
+    def create_tags(self, count: int) -> range:
+        started = time.monotonic()
+        first = self.get_next_pk(Tag)
+        self.write(Tag, [
+            Tag(pk=first + i, name=f'{self.prefix}-tag-{i}', slug=f'{self.prefix}-tag-{i}')
+            for i in range(count)
+        ])
+        self.report('tags', count, started)
+        return range(first, first + count)
+
+    def create_writers(self, count: int) -> range:
+        started = time.monotonic()
+        first = self.get_next_pk(Writer)
+        self.write(Writer, [Writer(pk=first + i, name=f'{self.prefix} writer {i}') for i in range(count)])
+        self.report('writers', count, started)
+        return range(first, first + count)
+
+    def create_books(self, count: int, writers: range, tags: range) -> range:
+        """
+        Creates count books, with one or two writers and up to five tags,
+        popular writers and tags being drawn more often.
+        """
+        started = time.monotonic()
+        writer_popularity = Zipf(writers, self.skew, self.rng)
+        tag_popularity = Zipf(tags, self.skew, self.rng)
+        first = self.get_next_pk(Book)
+        for start in range(0, count, self.batch_size):
+            ids = range(first + start, first + min(start + self.batch_size, count))
+            books = []
+            book_writers = []
+            book_tags = []
+            for book_id in ids:
+                books.append(Book(
+                    pk=book_id,
+                    title=' '.join(self.rng.choices(WORDS, k=self.rng.randint(1, 4))).capitalize(),
+                    genre=self.rng.choice(GENRES),
+                    publication_date=str(self.rng.randint(1850, 2020)),
+                    pages=str(self.rng.randint(50, 900)),
+                ))
+                if writers:
+                    number = 1 if self.rng.random() < 0.8 else 2
+                    book_writers.extend((book_id, writer) for writer in writer_popularity.draw_distinct(number))
+                if tags:
+                    book_tags.extend(
+                        (book_id, tag) for tag in tag_popularity.draw_distinct(self.rng.randint(0, 5))
+                    )
+            with transaction.atomic():
+                Book.objects.bulk_create(books)
+                add_writers(book_writers)
+                add_tags(book_tags)
+            self.stdout.write(f"{start + len(ids)} books")
+        self.report('books', count, started)
+        return range(first, first + count)
+
+    def tag_users(self, users: list, tags: range) -> None:
+        if not tags:
+            return
+        started = time.monotonic()
+        tag_popularity = Zipf(tags, self.skew, self.rng)
+        tagged = 0
+        for start in range(0, len(users), self.batch_size):
+            rows = [
+                TaggedUser(content_object_id=user_id, tag_id=tag)
+                for user_id in users[start:start + self.batch_size]
+                for tag in tag_popularity.draw_distinct(self.rng.randint(0, 5))
+            ]
+            counts = Counter(row.tag_id for row in rows)
+            with transaction.atomic():
+                TaggedUser.objects.bulk_create(rows)
+                add_to_counters(UserTagCount, {(tag,): n for tag, n in counts.items()}, ('tag_id',))
+            tagged += len(rows)
+        self.report('user tags', tagged, started)
+
+    def create_readers(self, count: int, users: list, books: range) -> None:
+        """
+        Creates about count readers, popular books getting most of them (at
+        most one per user and book).
+        """
+        started = time.monotonic()
+        shares = Zipf(books, self.skew, self.rng).shares(count, len(users))
+        statuses = list(STATUSES)
+        cum_weights = list(accumulate(STATUSES.values()))
+        created = 0
+        rows = []
+        for book_id in sorted(shares):
+            for user_id in self.rng.sample(users, shares[book_id]):
+                status = self.rng.choices(statuses, cum_weights=cum_weights)[0]
+                rows.append(Reader(user_id=user_id, book_id=book_id, status=status))
+            if len(rows) >= self.batch_size:
+                created += self.write_readers(rows)
+                rows = []
+                self.stdout.write(f"{created} readers")
+        created += self.write_readers(rows)
+        self.report('readers', created, started)
+
+    def write_readers(self, rows: list) -> int:
+        # The readers of a book are all written at once, and the books are
+        # new: their counters are created rather than looked up.
+        counts = Counter((row.book_id, row.status) for row in rows)
+        with transaction.atomic():
+            Reader.objects.bulk_create(rows)
+            ReaderStatusCount.objects.bulk_create(
+                ReaderStatusCount(book_id=book_id, status=status, shard=0, count=n)
+                for (book_id, status), n in counts.items()
+            )
+        return len(rows)
+
+    def create_comments(self, count: int, users: list, books: range) -> None:
+        """
+        Creates count comments, in threads whose size and depth follow
+        Zipfian distributions, on books drawn by popularity.
+        """
+        started = time.monotonic()
+        book_popularity = Zipf(books, self.skew, self.rng)
+        user_activity = Zipf(users, self.skew, self.rng)
+        sizes = list(accumulate(1 / size ** self.skew for size in range(1, MAX_THREAD_SIZE + 1)))
+        next_pk = self.get_next_pk(Comment)
+        tree_id = (Comment.objects.aggregate(last=Max('tree_id'))['last'] or 0) + 1
+        created = 0
+        rows = []
+        while created + len(rows) < count:
+            size = min(
+                bisect_left(sizes, self.rng.random() * sizes[-1]) + 1,
+                count - created - len(rows),
+            )
+            thread = self.get_thread(size, next_pk, tree_id, book_popularity.draw()[0], user_activity)
+            rows.extend(thread)
+            next_pk += len(thread)
+            tree_id += 1
+            if len(rows) >= self.batch_size:
+                self.write(Comment, rows)
+                created += len(rows)
+                rows = []
+                self.stdout.write(f"{created} comments")
+        self.write(Comment, rows)
+        created += len(rows)
+        self.report('comments', created, started)
+
+    def get_thread(self, size: int, first_pk: int, tree_id: int, book_id: int, user_activity: Zipf) -> list:
+        """
+        Returns the comments of a thread of size comments, with their MPTT
+        fields. Each reply answers a comment of a level drawn with a
+        probability decreasing with the level, so that threads are mostly
+        shallow.
+        """
+        comments = [Comment(pk=first_pk, level=0, parent_id=None)]
+        levels = [[comments[0]]]
+        children = {first_pk: []}
+        for pk in range(first_pk + 1, first_pk + size):
+            weights = list(accumulate(1 / (level + 1) ** self.skew for level in range(len(levels))))
+            level = bisect_left(weights, self.rng.random() * weights[-1])
+            parent = self.rng.choice(levels[level])
+            comment = Comment(pk=pk, level=level + 1, parent_id=parent.pk)
+            if level + 1 == len(levels):
+                levels.append([])
+            levels[level + 1].append(comment)
+            children[parent.pk].append(comment)
+            children[pk] = []
+            comments.append(comment)
+
+        # Numbers the nodes depth-first, without recursion
+        counter = 1
+        stack = [(comments[0], False)]
+        while stack:
+            comment, visited = stack.pop()
+            if visited:
+                comment.rght = counter
+                counter += 1
+                continue
+            comment.lft = counter
+            counter += 1
+            stack.append((comment, True))
+            stack.extend((child, False) for child in reversed(children[comment.pk]))
+
+        owners = user_activity.draw(size)
+        for comment, owner in zip(comments, owners):
+            comment.tree_id = tree_id
+            comment.content_id = book_id
+            comment.owner_id = owner
+            comment.message = ' '.join(self.rng.choices(WORDS, k=self.rng.randint(3, 20))).capitalize()
+        return comments
+
+    @staticmethod
+    def reset_sequences() -> None:
+        """
+        Moves the primary key sequences past the keys assigned by the
+        command.
+        """
+        statements = connection.ops.sequence_reset_sql(no_style(), [Tag, Writer, Book, Comment])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,191 @@
+"""
+Serving of the user-uploaded files (MEDIA_ROOT).
+
+serve_media answers conditional requests (If-None-Match / If-Modified-Since)
+with 304 and single byte ranges with 206, and streams files with
+FileResponse. Behind a front proxy, the transfer itself can be handed off
+with X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd), the proxy
+handling ranges then.
+
+Content-addressed files, whose name embeds a hash of their content
+(`name.0123456789ab.ext`, see MEDIA_SERVING['IMMUTABLE_PATTERN']), never
+change: they are cached for a year without revalidation. Other files are
+cached for MEDIA_SERVING['MAX_AGE'] seconds.
+"""
+import mimetypes
+import re
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+DEFAULTS = {
+    'MAX_AGE': 3600,
+    'IMMUTABLE_MAX_AGE': 365 * 24 * 3600,
+    'IMMUTABLE_PATTERN': r'\.[0-9a-f]{12}\.\w+$',
+    # e.g. '/protected-medias/', an nginx `internal` location aliasing
+    # MEDIA_ROOT
+    'ACCEL_REDIRECT_PREFIX': None,
+    'SENDFILE': False,
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_media_settings() -> dict:
+    """
+    Returns the DEFAULTS overridden by the MEDIA_SERVING setting.
+    """
+    return dict(DEFAULTS, **getattr(settings, 'MEDIA_SERVING', {}))
+
+
+@lru_cache(maxsize=None)
+def _get_immutable_re(pattern: str):
+    return re.compile(pattern)
+
+
+def is_immutable(name: str) -> bool:
+    """
+    Whether the file name is content-addressed.
+    """
+    return bool(_get_immutable_re(get_media_settings()['IMMUTABLE_PATTERN']).search(name))
+
+
+@require_safe
+def serve_media(request, path: str):
+    """
+    Serves the file at path under MEDIA_ROOT.
+    """
+    options = get_media_settings()
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = full_path.stat()
+    except OSError:
+        raise Http404
+    if not full_path.is_file():
+        raise Http404
+
+    etag = '"{:x}-{:x}"'.format(stat.st_mtime_ns, stat.st_size)
+    last_modified = int(stat.st_mtime)
+    if is_immutable(path):
+        cache_control = 'public, max-age={}, immutable'.format(options['IMMUTABLE_MAX_AGE'])
+    else:
+        cache_control = 'public, max-age={}'.format(options['MAX_AGE'])
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _get_file_response(request, full_path, path, stat.st_size, etag, last_modified, options)
+    if response.status_code != 416:
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control
+    return response
+
+
+def _get_file_response(request, full_path: Path, path: str, size: int, etag: str, last_modified: int, options: dict):
+    content_type, encoding = mimetypes.guess_type(str(full_path))
+    content_type = content_type or 'application/octet-stream'
+
+    if options['ACCEL_REDIRECT_PREFIX']:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = options['ACCEL_REDIRECT_PREFIX'] + quote(path)
+        return response
+    if options['SENDFILE']:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = str(full_path)
+        return response
+
+    byte_range = None
+    if _is_range_applicable(request, etag, last_modified):
+        byte_range = _parse_range(request.META.get('HTTP_RANGE'), size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    elif byte_range is None:
+        response = FileResponse(full_path.open('rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        media = full_path.open('rb')
+        media.seek(start)
+        response = FileResponse(_RangeFile(media, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+        response['Content-Length'] = end - start + 1
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _is_range_applicable(request, etag: str, last_modified: int) -> bool:
+    """
+    Whether the Range header applies, i.e. the file didn't change since the
+    If-Range validator.
+    """
+    if 'HTTP_RANGE' not in request.META:
+        return False
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _parse_range(header: str, size: int):
+    """
+    Returns the (start, end) bytes of a single range, None to ignore the
+    header (invalid or several ranges, answered with the whole file) and
+    False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None or size == 0:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # Suffix range: the last `end` bytes
+        if int(end) == 0:
+            return False
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(end), size - 1) if end else size - 1
+
+
+class _RangeFile:
+    """
+    A file-like object reading at most `length` bytes of `media`.
+    """
+
+    def __init__(self, media, length: int):
+        self.media = media
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.media.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.media.close()
@@ -0,0 +1,290 @@
+"""
+Metrics of the GraphQL operations, exposed in the Prometheus text format.
+
+LeviathanGraphQLView measures every sampled operation (see
+METRICS['SAMPLE_RATE']): its duration, the number and duration of its SQL
+queries (through connection.execute_wrapper) and its errors, labelled with
+the operation name. Within a fraction of the sampled operations
+(METRICS['RESOLVER_SAMPLE_RATE']), MetricsMiddleware also times every field
+resolver; the fields taking the most time overall are exported. Outside of
+sampled operations, the middleware only checks an attribute of the request.
+
+Metrics are kept per process since it started, along with the response
+cache's statistics (see lib.response_cache). They are served at /metrics, to
+the holders of METRICS['TOKEN'], or to anyone when DEBUG is on and no token
+is set.
+"""
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from lib.response_cache import get_stats
+
+DEFAULTS = {
+    'SAMPLE_RATE': 1.0,
+    'RESOLVER_SAMPLE_RATE': 0.01,
+    'DURATION_BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'QUERY_COUNT_BUCKETS': (1, 2, 5, 10, 20, 50, 100, 200, 500),
+    # Operation names are chosen by clients, the others are counted as OTHER
+    'MAX_OPERATIONS': 200,
+    'TOP_RESOLVERS': 50,
+    'TOKEN': None,
+}
+
+ANONYMOUS = 'anonymous'
+OTHER = 'other'
+
+OPERATION_NAME_RE = re.compile(r'\b(?:query|mutation|subscription)\s+(\w+)')
+
+_metrics_lock = Lock()
+
+
+def get_metrics_settings() -> dict:
+    """
+    Returns the DEFAULTS overridden by the METRICS setting.
+    """
+    return dict(DEFAULTS, **getattr(settings, 'METRICS', {}))
+
+
+class Histogram:
+    """
+    Cumulative buckets of observed values, as Prometheus histograms.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> list:
+        lines = [
+            '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, count)
+            for bound, count in zip(self.buckets, self.counts)
+        ]
+        lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, self.count))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, self.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, self.count))
+        return lines
+
+
+class OperationMetrics:
+    """
+    What was measured of the operations sharing a name.
+    """
+
+    def __init__(self, options: dict):
+        self.duration = Histogram(options['DURATION_BUCKETS'])
+        self.queries = Histogram(options['QUERY_COUNT_BUCKETS'])
+        self.query_seconds = 0
+        self.errors = 0
+
+
+_operations = {}
+# Field -> [calls, seconds]
+_resolvers = defaultdict(lambda: [0, 0])
+
+
+class OperationSample:
+    """
+    The measures of a single operation, collected while it executes.
+    """
+
+    def __init__(self, time_resolvers: bool):
+        self.time_resolvers = time_resolvers
+        self.queries = 0
+        self.query_seconds = 0
+        self.errors = 0
+        self.resolvers = defaultdict(lambda: [0, 0])
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+
+@contextmanager
+def measure_operation(request, query: str, operation_name: str = None):
+    """
+    Measures the GraphQL operation executed within the block, if it is
+    sampled. Yields the OperationSample, on which the caller sets the number
+    of errors of the result.
+    """
+    options = get_metrics_settings()
+    if not options['SAMPLE_RATE'] or random.random() >= options['SAMPLE_RATE']:
+        yield None
+        return
+
+    sample = OperationSample(random.random() < options['RESOLVER_SAMPLE_RATE'])
+    request.metrics_sample = sample
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(sample):
+            yield sample
+    finally:
+        duration = time.perf_counter() - start
+        request.metrics_sample = None
+        record_operation(get_operation_name(query, operation_name), duration, sample, options)
+
+
+def get_operation_name(query: str, operation_name: str = None) -> str:
+    """
+    Returns the name of the executed operation: the requested one, or the
+    first one declared by the query.
+    """
+    if operation_name:
+        return operation_name
+    match = OPERATION_NAME_RE.search(query or '')
+    return match.group(1) if match else ANONYMOUS
+
+
+def record_operation(name: str, duration: float, sample: OperationSample, options: dict) -> None:
+    with _metrics_lock:
+        metrics = _operations.get(name)
+        if metrics is None:
+            if len(_operations) >= options['MAX_OPERATIONS']:
+                name = OTHER
+            metrics = _operations.get(name)
+            if metrics is None:
+                metrics = _operations[name] = OperationMetrics(options)
+        metrics.duration.observe(duration)
+        metrics.queries.observe(sample.queries)
+        metrics.query_seconds += sample.query_seconds
+        metrics.errors += sample.errors
+        for field, (calls, seconds) in sample.resolvers.items():
+            totals = _resolvers[field]
+            totals[0] += calls
+            totals[1] += seconds
+
+
+class MetricsMiddleware:
+    """
+    Graphene middleware timing the field resolvers of the operations sampled
+    for it.
+    """
+
+    def resolve(self, next, root, info, **args):
+        # pylint: disable=redefined-builtin
+        sample = getattr(info.context, 'metrics_sample', None)
+        if sample is None or not sample.time_resolvers:
+            return next(root, info, **args)
+
+        # Only the synchronous part of the resolver is timed: results loaded
+        # by DataLoaders are fetched once for the whole batch.
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            totals = sample.resolvers['{}.{}'.format(info.parent_type.name, info.field_name)]
+            totals[0] += 1
+            totals[1] += time.perf_counter() - start
+
+
+def render_metrics() -> str:
+    """
+    Returns the metrics in the Prometheus text exposition format.
+    """
+    options = get_metrics_settings()
+    lines = []
+    with _metrics_lock:
+        operations = sorted(_operations.items())
+        lines += [
+            '# HELP graphql_operation_duration_seconds Duration of the GraphQL operations.',
+            '# TYPE graphql_operation_duration_seconds histogram',
+        ]
+        for name, metrics in operations:
+            lines += metrics.duration.render('graphql_operation_duration_seconds', _labels(operation=name))
+        lines += [
+            '# HELP graphql_operation_sql_queries SQL queries run by the GraphQL operations.',
+            '# TYPE graphql_operation_sql_queries histogram',
+        ]
+        for name, metrics in operations:
+            lines += metrics.queries.render('graphql_operation_sql_queries', _labels(operation=name))
+        lines += [
+            '# HELP graphql_operation_sql_seconds_total Time spent in the SQL queries of the GraphQL operations.',
+            '# TYPE graphql_operation_sql_seconds_total counter',
+        ]
+        lines += [
+            'graphql_operation_sql_seconds_total{{{}}} {}'.format(_labels(operation=name), metrics.query_seconds)
+            for name, metrics in operations
+        ]
+        lines += [
+            '# HELP graphql_operation_errors_total Errors returned by the GraphQL operations.',
+            '# TYPE graphql_operation_errors_total counter',
+        ]
+        lines += [
+            'graphql_operation_errors_total{{{}}} {}'.format(_labels(operation=name), metrics.errors)
+            for name, metrics in operations
+        ]
+
+        resolvers = sorted(_resolvers.items(), key=lambda item: item[1][1], reverse=True)
+        resolvers = resolvers[:options['TOP_RESOLVERS']]
+        lines += [
+            '# HELP graphql_resolver_seconds_total Time spent in the slowest field resolvers.',
+            '# TYPE graphql_resolver_seconds_total counter',
+        ]
+        lines += [
+            'graphql_resolver_seconds_total{{{}}} {}'.format(_labels(field=field), seconds)
+            for field, (calls, seconds) in resolvers
+        ]
+        lines += [
+            '# HELP graphql_resolver_calls_total Calls of the slowest field resolvers.',
+            '# TYPE graphql_resolver_calls_total counter',
+        ]
+        lines += [
+            'graphql_resolver_calls_total{{{}}} {}'.format(_labels(field=field), calls)
+            for field, (calls, seconds) in resolvers
+        ]
+
+    for name, value in get_stats().items():
+        lines += [
+            '# TYPE graphql_response_cache_{}_total counter'.format(name),
+            'graphql_response_cache_{}_total {}'.format(name, value),
+        ]
+    lines += [
+        '# HELP graphql_metrics_sample_rate Fraction of the operations measured.',
+        '# TYPE graphql_metrics_sample_rate gauge',
+        'graphql_metrics_sample_rate {}'.format(options['SAMPLE_RATE']),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels) -> str:
+    return ','.join(
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+
+
+@require_safe
+def metrics_view(request):
+    """
+    Serves the metrics, in the Prometheus text format.
+    """
+    token = get_metrics_settings()['TOKEN']
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
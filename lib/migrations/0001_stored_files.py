@@ -0,0 +1,23 @@
+# Generated by Django 3.0.3 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='Name')),
+                ('size', models.BigIntegerField(verbose_name='Size')),
+                ('last_saved', models.DateTimeField(db_index=True, verbose_name='Last saved')),
+            ],
+        ),
+    ]
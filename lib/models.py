@@ -0,0 +1,31 @@
+"""
+Models of the shared lib package.
+"""
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+
+class StoredFile(models.Model):
+    """
+    A file written by lib.storage.ContentAddressedStorage, tracked so that it
+    can be garbage-collected once no longer referenced.
+    """
+
+    name = models.CharField(
+        verbose_name=_('Name'),
+        max_length=255,
+        unique=True,
+    )
+
+    size = models.BigIntegerField(
+        verbose_name=_('Size'),
+    )
+
+    # Files saved recently may be referenced by rows not yet committed
+    last_saved = models.DateTimeField(
+        verbose_name=_('Last saved'),
+        db_index=True,
+    )
+
+    def __str__(self):
+        return self.name
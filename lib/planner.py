@@ -0,0 +1,144 @@
+"""
+Selection-set-aware query planning for connection resolvers.
+
+A QueryPlan maps the GraphQL fields of a node type onto the columns and
+relations they need. Given the `info` of a connection resolver, it walks the
+requested `edges { node { ... } }` selection (fragments included) and applies
+the matching only() / select_related() / prefetch_related() to the queryset,
+so that list views never load columns or relations the client didn't ask for.
+
+Relation resolvers use `load_related` which returns what the plan already
+fetched and falls back on the request's DataLoaders (see lib.loaders)
+otherwise.
+"""
+from typing import Iterable, Optional
+
+from django.db.models.query import QuerySet
+from graphql.language import ast
+
+from lib.loaders import get_loader
+
+
+class FieldPlan:
+    """
+    What a single GraphQL field needs from the database.
+    """
+
+    def __init__(
+        self,
+        only: Iterable[str] = (),
+        select_related: Iterable[str] = (),
+        prefetch_related: Iterable = (),
+    ):
+        self.only = tuple(only)
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+
+class QueryPlan:
+    """
+    Maps GraphQL field names (as they appear in queries, i.e. camelCased) of a
+    node type to FieldPlans. Columns listed in `always` are loaded whatever
+    the selection.
+    """
+
+    def __init__(self, fields: dict, always: Iterable[str] = ('pk',)):
+        self.fields = fields
+        self.always = tuple(always)
+
+    def apply(self, qs: QuerySet, info, path: Iterable[str] = ('edges', 'node')) -> QuerySet:
+        """
+        Returns qs restricted to what the selection found under `path` needs.
+        """
+        selected = get_selected_fields(info, path)
+        if selected is None:
+            return qs
+
+        only = list(self.always)
+        select_related = []
+        prefetch_related = []
+        for name in selected:
+            plan = self.fields.get(name)
+            if plan is None:
+                continue
+            only.extend(plan.only)
+            select_related.extend(plan.select_related)
+            prefetch_related.extend(plan.prefetch_related)
+
+        # A select_related() relation cannot be deferred, make sure the
+        # foreign key column is always part of only().
+        only.extend(select_related)
+
+        qs = qs.only(*_unique(only))
+        if select_related:
+            qs = qs.select_related(*_unique(select_related))
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+        return qs
+
+
+def get_selected_fields(info, path: Iterable[str] = ()) -> Optional[set]:
+    """
+    Returns the names of the fields selected under `path`, starting from the
+    field being resolved, or None if the path isn't part of the selection.
+    """
+    nodes = list(info.field_asts)
+    for name in path:
+        nodes = _collect_fields(info, nodes).get(name)
+        if not nodes:
+            return None
+    return set(_collect_fields(info, nodes))
+
+
+def _collect_fields(info, nodes) -> dict:
+    """
+    Collects the sub-fields of the given AST nodes, merging fragments, as a
+    dict of field name -> list of Field nodes.
+    """
+    fields = {}
+    for node in nodes:
+        if node.selection_set is None:
+            continue
+        for selection in node.selection_set.selections:
+            if isinstance(selection, ast.Field):
+                fields.setdefault(selection.name.value, []).append(selection)
+            else:
+                if isinstance(selection, ast.FragmentSpread):
+                    selection = info.fragments[selection.name.value]
+                for name, sub_nodes in _collect_fields(info, [selection]).items():
+                    fields.setdefault(name, []).extend(sub_nodes)
+    return fields
+
+
+def _unique(values):
+    return list(dict.fromkeys(values))
+
+
+def get_prefetched(instance, name: str) -> Optional[list]:
+    """
+    Returns the objects prefetched for the relation `name` on instance, or None
+    if the relation wasn't prefetched.
+    """
+    cache = getattr(instance, '_prefetched_objects_cache', {})
+    if name in cache:
+        return list(cache[name])
+    return None
+
+
+def load_related(info, instance, name: str, loader_class, key):
+    """
+    Resolves the relation `name` of instance: from the select_related() /
+    prefetch_related() cache when the plan fetched it, through loader_class
+    otherwise.
+    """
+    prefetched = get_prefetched(instance, name)
+    if prefetched is not None:
+        return prefetched
+
+    field = instance._meta.get_field(name)
+    if (field.many_to_one or field.one_to_one) and field.is_cached(instance):
+        return field.get_cached_value(instance)
+
+    if key is None:
+        return None
+    return get_loader(info, loader_class).load(key)
@@ -0,0 +1,225 @@
+"""
+Full-response cache for anonymous GraphQL queries.
+
+Logged-out visitors all get the same answer to the same query, so the data of
+anonymous query operations is cached, keyed by the hash of the normalized
+document (see lib.documents), the operation name and the variables.
+
+Each entry is tagged with the models whose tables were read to compute it
+(captured from the SQL run during the execution). Every model has a version
+number, bumped by the post_save / post_delete / m2m_changed signals of its
+instances (connected by lib.apps), once committed: an entry is served only if none of its models changed since it
+was stored. Models updated in bulk, without signals, are bumped along with the
+models they derive from (RESPONSE_CACHE['DEPENDENCIES']).
+
+Entries and versions are stored in the Django cache RESPONSE_CACHE['CACHE'],
+which must be shared by every process serving the API, e.g. files or Redis:
+a write bumps the versions of the process's own cache only, so with a local
+memory cache (per process) the other workers would serve stale responses
+until they expire. Local memory is only safe with a single worker process.
+"""
+import json
+import re
+from collections import Counter
+from threading import Lock
+from typing import Iterable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from graphql_jwt.utils import get_http_authorization
+
+from lib.documents import get_document_hash
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'TIMEOUT': 300,
+    'DEPENDENCIES': {},
+}
+
+ENTRY_PREFIX = 'graphql:response:'
+VERSION_PREFIX = 'graphql:version:'
+
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+["`]?(\w+)["`]?', re.IGNORECASE)
+
+_stats = Counter()
+_stats_lock = Lock()
+
+
+def get_response_cache_settings() -> dict:
+    """
+    Returns the DEFAULTS overridden by the RESPONSE_CACHE setting.
+    """
+    return dict(DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {}))
+
+
+def get_cache():
+    return caches[get_response_cache_settings()['CACHE']]
+
+
+def is_cacheable_request(request) -> bool:
+    """
+    Whether the request comes from an anonymous visitor: neither logged in
+    with a session nor carrying a JSON Web Token.
+    """
+    user = getattr(request, 'user', None)
+    return (
+        get_response_cache_settings()['ENABLED']
+        and (user is None or user.is_anonymous)
+        and not get_http_authorization(request)
+    )
+
+
+def get_entry_key(document, operation_name: Optional[str], variables: Optional[dict]) -> str:
+    payload = json.dumps([operation_name, variables or {}], sort_keys=True, default=str)
+    return '{}{}:{}'.format(
+        ENTRY_PREFIX, document.normalized_hash, get_document_hash(payload),
+    )
+
+
+def get_response(key: str) -> Optional[dict]:
+    """
+    Returns the cached response stored under key, if its models haven't
+    changed since.
+    """
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is None:
+        _count('misses')
+        return None
+
+    labels = list(entry['versions'])
+    versions = cache.get_many([VERSION_PREFIX + label for label in labels])
+    for label in labels:
+        if versions.get(VERSION_PREFIX + label, 0) != entry['versions'][label]:
+            _count('stale')
+            _count('misses')
+            return None
+    _count('hits')
+    return entry['response']
+
+
+def get_versions() -> dict:
+    """
+    Returns the current version of every model. Taken before executing a
+    query, so that models changed during the execution invalidate its
+    response.
+    """
+    labels = set(get_models_by_table().values())
+    versions = get_cache().get_many([VERSION_PREFIX + label for label in labels])
+    return {label: versions.get(VERSION_PREFIX + label, 0) for label in labels}
+
+
+def set_response(key: str, response: dict, labels: Iterable[str], versions: dict) -> None:
+    """
+    Caches a response computed from the given models, at the given versions
+    (see get_versions).
+    """
+    get_cache().set(key, {
+        'response': response,
+        'versions': {label: versions.get(label, 0) for label in labels},
+    }, get_response_cache_settings()['TIMEOUT'])
+    _count('stores')
+
+
+def invalidate_models(labels: Iterable[str]) -> None:
+    """
+    Bumps the version of the given models (and of the models deriving from
+    them), so that the responses computed from them are no longer served.
+    """
+    dependencies = get_response_cache_settings()['DEPENDENCIES']
+    labels = set(labels)
+    for label in list(labels):
+        labels.update(dependencies.get(label, ()))
+    # Responses computed before the commit, from the previous data, were
+    # stored with the previous versions
+    transaction.on_commit(lambda: _bump_versions(labels))
+
+
+def _bump_versions(labels: set) -> None:
+    cache = get_cache()
+    for label in labels:
+        key = VERSION_PREFIX + label
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Unknown key: set it, unless another process just did
+            if not cache.add(key, 1, None):
+                cache.incr(key)
+    _count('invalidations', len(labels))
+
+
+class TableRecorder:
+    """
+    A database execute wrapper (see connection.execute_wrapper) recording the
+    models whose tables are read, in `labels`.
+    """
+
+    def __init__(self):
+        self.labels = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        tables = get_models_by_table()
+        for table in TABLE_RE.findall(sql):
+            if table in tables:
+                self.labels.add(tables[table])
+        return execute(sql, params, many, context)
+
+
+_models_by_table = {}
+
+
+def get_models_by_table() -> dict:
+    """
+    Returns the labels ('app_label.ModelName') of the models, by table name.
+    """
+    if not _models_by_table:
+        _models_by_table.update(
+            (model._meta.db_table, model._meta.label)
+            for model in apps.get_models(include_auto_created=True)
+        )
+    return _models_by_table
+
+
+def get_stats() -> dict:
+    """
+    Returns the cache's hits, misses (stale entries included), stale entries,
+    stores and invalidations since the process started.
+    """
+    with _stats_lock:
+        return {
+            name: _stats[name]
+            for name in ('hits', 'misses', 'stale', 'stores', 'invalidations')
+        }
+
+
+def _count(name: str, value: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += value
+
+
+# ########## INVALIDATION ########## #
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_saved_model(sender, raw=False, **kwargs):
+    """
+    Invalidates the responses using a model whenever one of its instances is
+    saved or deleted.
+    """
+    if not raw:
+        invalidate_models([sender._meta.label])
+
+
+@receiver(m2m_changed)
+def invalidate_m2m_relation(sender, action, **kwargs):
+    """
+    Invalidates the responses using a many-to-many relation when it changes.
+    """
+    if action.startswith('post_'):
+        invalidate_models([sender._meta.label])
@@ -1,13 +1,26 @@
 """
-Django storage class overide
+Django storage classes override
 """
+import hashlib
+import os.path
+import re
 
+from django.core.files.base import File
 from django.core.files.storage import get_storage_class
+from django.utils import timezone
+
+from lib.models import StoredFile
+
+HASH_LENGTH = 12
+
+HASHED_ROOT_RE = re.compile(r'\.[0-9a-f]{%d}$' % HASH_LENGTH)
 
 
 class OverwriteStorage(get_storage_class()):
     """
     Django storage class overide. It replace a file if one have the same name
+
+    No longer used, kept for the migrations referencing it.
     """
 
     def _save(self, name, content):
@@ -24,3 +37,50 @@ class OverwriteStorage(get_storage_class()):
         """
         # pylint: disable=unused-argument
         return name
+
+
+class ContentAddressedStorage(get_storage_class()):
+    """
+    Names files after their content: `avatar/<pk>.png` is stored as
+    `avatar/<pk>.<sha256 prefix>.png`. A file is never rewritten, its URL can
+    be cached forever (see lib.media), and saving the same content twice
+    writes it once.
+
+    Files aren't deleted when they stop being used, since other rows may
+    reference them: every saved name is recorded in lib.models.StoredFile,
+    and `manage.py collect_media_garbage` deletes those no longer referenced
+    by a FileField using this storage.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        # Recorded before checking for the file: collect_media_garbage only
+        # deletes files not saved since it found them unreferenced
+        StoredFile.objects.update_or_create(
+            name=name,
+            defaults={'size': content.size, 'last_saved': timezone.now()},
+        )
+        if not self.exists(name):
+            saved = super().save(name, content, max_length=max_length)
+            if saved != name:
+                # Only names too long for max_length are changed
+                StoredFile.objects.filter(name=name).update(name=saved)
+                name = saved
+        return name
+
+    @staticmethod
+    def get_hashed_name(name: str, content) -> str:
+        """
+        Returns name with the hash of content inserted before the extension.
+        """
+        sha256 = hashlib.sha256()
+        # chunks() starts from the beginning of the file
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        root, ext = os.path.splitext(name)
+        root = HASHED_ROOT_RE.sub('', root)
+        return '{}.{}{}'.format(root, sha256.hexdigest()[:HASH_LENGTH], ext)
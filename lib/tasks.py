@@ -0,0 +1,70 @@
+"""
+Background tasks.
+
+Work that doesn't need to delay the response, such as image processing, is
+handed to a pool of worker threads once the current transaction is committed
+(immediately outside of transactions), so that the task sees the committed
+data. Tasks are plain functions, which must tolerate being run again (e.g. by
+a backfill command) and report their own failures: exceptions are only logged.
+
+BACKGROUND_TASKS['WORKERS'] sets the number of threads per process. With
+BACKGROUND_TASKS['EAGER'], tasks are run synchronously instead, e.g. for
+management commands or tests.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections, transaction
+
+DEFAULTS = {
+    'WORKERS': 2,
+    'EAGER': False,
+}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_tasks_settings() -> dict:
+    """
+    Returns the DEFAULTS overridden by the BACKGROUND_TASKS setting.
+    """
+    return dict(DEFAULTS, **getattr(settings, 'BACKGROUND_TASKS', {}))
+
+
+def run_in_background(function, *args, **kwargs) -> None:
+    """
+    Runs function(*args, **kwargs) in a worker thread, after the current
+    transaction is committed.
+    """
+    if get_tasks_settings()['EAGER']:
+        transaction.on_commit(lambda: _run(function, args, kwargs, close=False))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run, function, args, kwargs))
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_tasks_settings()['WORKERS'],
+                thread_name_prefix='tasks',
+            )
+        return _executor
+
+
+def _run(function, args, kwargs, close=True) -> None:
+    try:
+        function(*args, **kwargs)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Background task %s failed", function.__qualname__)
+    finally:
+        if close:
+            # Worker threads get their own connections, which Django's
+            # request cycle doesn't close
+            connections.close_all()
@@ -0,0 +1,184 @@
+"""
+Recording of the GraphQL operations served, to replay them in benchmarks
+(see `manage.py benchmark_graphql --replay`).
+
+When TRAFFIC_RECORDING['PATH'] is set, LeviathanGraphQLView appends a sample
+of the operations it executes (TRAFFIC_RECORDING['SAMPLE_RATE']) to that
+file, one JSON object per line in the format of requests.jsonl:
+
+    {"request_id": "...", "title": "<operation name>",
+     "body": {"query": ..., "variables": ..., "operationName": ..., "user": <pk>}}
+
+The values of the variables named in TRAFFIC_RECORDING['REDACTED'] (the
+passwords and tokens) are replaced by REDACTED, which replays substitute, as
+are the string literals given to the arguments and input fields of the same
+names in the query itself. The variables named in
+TRAFFIC_RECORDING['DROPPED'] (the uploaded images) are left out. Lines are
+small and written with a single append, so that several processes may
+record to the same file.
+"""
+import json
+import random
+import uuid
+from threading import Lock
+
+from django.conf import settings
+from graphql.error import GraphQLSyntaxError
+from graphql.language import ast
+from graphql.language.parser import parse
+from graphql.language.visitor import Visitor, visit
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.shortcuts import get_user_by_token
+from graphql_jwt.utils import get_http_authorization
+
+from lib.metrics import get_operation_name
+
+DEFAULTS = {
+    'PATH': None,
+    'SAMPLE_RATE': 1.0,
+    'REDACTED': (
+        'password', 'password1', 'password2', 'oldPassword', 'newPassword', 'newPassword1', 'newPassword2',
+        'token', 'refreshToken',
+    ),
+    'DROPPED': ('avatar',),
+}
+
+REDACTED = '<redacted>'
+
+_recording_lock = Lock()
+
+
+def get_recording_settings() -> dict:
+    """
+    Returns the DEFAULTS overridden by the TRAFFIC_RECORDING setting.
+    """
+    return dict(DEFAULTS, **getattr(settings, 'TRAFFIC_RECORDING', {}))
+
+
+def record_operation(request, query: str, variables: dict = None, operation_name: str = None) -> None:
+    """
+    Appends the operation to the recording, if enabled and sampled.
+    """
+    options = get_recording_settings()
+    if not options['PATH'] or not query or random.random() >= options['SAMPLE_RATE']:
+        return
+
+    recorded_query = redact_query(query, options['REDACTED'])
+    if recorded_query is None:
+        return
+
+    user = get_request_user(request)
+    line = json.dumps({
+        'request_id': uuid.uuid4().hex,
+        'title': get_operation_name(query, operation_name),
+        'body': {
+            'query': recorded_query,
+            'variables': redact(variables or {}, options['REDACTED'], options['DROPPED']),
+            'operationName': operation_name,
+            'user': user.pk if user is not None else None,
+        },
+    }, default=str)
+    with _recording_lock, open(options['PATH'], 'a') as recording:
+        recording.write(line + '\n')
+
+
+def get_request_user(request):
+    """
+    Returns the user the operation is executed for, or None. JSON web tokens
+    are only checked later, by the GraphQL middleware.
+    """
+    token = get_http_authorization(request)
+    if token:
+        try:
+            return get_user_by_token(token, request)
+        except JSONWebTokenError:
+            return None
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def redact(value, names, dropped=()):
+    """
+    Returns value with the items named in names replaced by REDACTED, and
+    those named in dropped left out, at any depth (e.g. in input objects).
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in names else redact(item, names, dropped)
+            for key, item in value.items()
+            if key not in dropped
+        }
+    if isinstance(value, list):
+        return [redact(item, names, dropped) for item in value]
+    return value
+
+
+def redact_query(query: str, names):
+    """
+    Returns query with the string literals given to the arguments and input
+    fields named in names replaced by REDACTED, or None if it can't be parsed
+    (and so checked).
+    """
+    try:
+        document = parse(query)
+    except GraphQLSyntaxError:
+        return None
+    visitor = RedactedLiteralVisitor(names)
+    visit(document, visitor)
+    # From the end, so that the locations of the previous literals still hold
+    for start, end in sorted(visitor.locations, reverse=True):
+        query = query[:start] + json.dumps(REDACTED) + query[end:]
+    return query
+
+
+class RedactedLiteralVisitor(Visitor):
+    """
+    Collects the (start, end) locations of the string literals given to the
+    arguments and input fields named in names.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.locations = []
+
+    def enter_Argument(self, node, *args):
+        self.collect(node)
+
+    def enter_ObjectField(self, node, *args):
+        self.collect(node)
+
+    def collect(self, node):
+        if node.name.value in self.names and isinstance(node.value, ast.StringValue):
+            self.locations.append((node.value.loc.start, node.value.loc.end))
+
+
+def unredact_query(query: str, replacement: str) -> str:
+    """
+    Returns query with the REDACTED string literals replaced by replacement.
+    """
+    return query.replace(json.dumps(REDACTED), json.dumps(replacement))
+
+
+def unredact(value, replacement):
+    """
+    Returns value with the REDACTED items replaced by replacement.
+    """
+    if isinstance(value, dict):
+        return {key: unredact(item, replacement) for key, item in value.items()}
+    if isinstance(value, list):
+        return [unredact(item, replacement) for item in value]
+    return replacement if value == REDACTED else value
+
+
+def read_recording(path: str) -> list:
+    """
+    Returns the operations recorded in path, as the bodies of its lines.
+    """
+    operations = []
+    with open(path) as recording:
+        for line in recording:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                operations.append(dict(entry['body'], request_id=entry.get('request_id')))
+    return operations
@@ -0,0 +1,119 @@
+"""
+Views shared by all apps.
+"""
+import json
+
+from django.db import connection
+from graphene_django.views import GraphQLView
+from graphql.execution import ExecutionResult
+
+from lib.documents import get_persisted_query, PersistedQueryError
+from lib.loaders import LoaderRegistry
+from lib.metrics import measure_operation
+from lib.traffic import record_operation
+from lib.response_cache import (
+    TableRecorder,
+    get_entry_key,
+    get_response,
+    get_versions,
+    is_cacheable_request,
+    set_response,
+)
+
+
+class LeviathanGraphQLView(GraphQLView):
+    """
+    The /graphql endpoint. Attaches a fresh set of DataLoaders to every request
+    so that resolvers can batch their queries (see lib.loaders), resolves
+    persisted queries (see lib.documents), caches the responses of
+    anonymous queries (see lib.response_cache), measures the operations
+    (see lib.metrics) and records them if enabled (see lib.traffic).
+    """
+
+    def get_context(self, request):
+        request.loaders = LoaderRegistry()
+        return request
+
+    def execute_graphql_request(
+            self, request, data, query, variables, operation_name, show_graphiql=False,
+    ):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                extensions = None
+        try:
+            query = get_persisted_query(query, extensions)
+        except PersistedQueryError as error:
+            return ExecutionResult(errors=[error])
+
+        record_operation(request, query, variables, operation_name)
+        with measure_operation(request, query, operation_name) as sample:
+            if query and is_cacheable_request(request):
+                result = self.execute_cached_graphql_request(
+                    request, data, query, variables, operation_name, show_graphiql,
+                )
+            else:
+                result = super().execute_graphql_request(
+                    request, data, query, variables, operation_name, show_graphiql,
+                )
+            if sample is not None and result is not None and result.errors:
+                sample.errors = len(result.errors)
+        if result is not None:
+            request.graphql_extensions = result.extensions
+        return result
+
+    def execute_cached_graphql_request(
+            self, request, data, query, variables, operation_name, show_graphiql=False,
+    ):
+        """
+        Serves anonymous queries from the response cache (see
+        lib.response_cache).
+        """
+        execute = super().execute_graphql_request
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+        except Exception:  # pylint: disable=broad-except
+            document = None
+        if (
+                document is None
+                or not hasattr(document, 'normalized_hash')
+                or document.get_operation_type(operation_name) != 'query'
+        ):
+            return execute(request, data, query, variables, operation_name, show_graphiql)
+
+        key = get_entry_key(document, operation_name, variables)
+        response = get_response(key)
+        if response is not None:
+            request.response_cache_status = 'HIT'
+            return ExecutionResult(data=response['data'], extensions=response['extensions'])
+
+        versions = get_versions()
+        recorder = TableRecorder()
+        with connection.execute_wrapper(recorder):
+            result = execute(request, data, query, variables, operation_name, show_graphiql)
+        if result is not None and not result.errors and not result.invalid:
+            set_response(
+                key,
+                {'data': result.data, 'extensions': result.extensions},
+                recorder.labels,
+                versions,
+            )
+        request.response_cache_status = 'MISS'
+        return result
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        status = getattr(request, 'response_cache_status', None)
+        if status is not None:
+            response['X-Response-Cache'] = status
+        return response
+
+    def json_encode(self, request, d, pretty=False):
+        # graphene-django leaves the result's extensions (e.g. the query's
+        # cost, see lib.cost) out of the response.
+        extensions = getattr(request, 'graphql_extensions', None)
+        if extensions:
+            d = dict(d, extensions=extensions)
+        return super().json_encode(request, d, pretty)
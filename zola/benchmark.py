@@ -0,0 +1,161 @@
+"""
+Mix of GraphQL operations run by `manage.py benchmark_graphql` (see the
+command), as issued by the frontend.
+
+load_dataset() samples the objects the operations are run against from the
+database, preferably a large one generated by `manage.py seed_scale`, whose
+users all share a known password (used by TokenAuth). Variables are then
+drawn from the sample by each operation, with the benchmark's random
+generator. Operations are skipped when the sample lacks the objects they
+require.
+"""
+from django.db.models import Max, Min
+from graphql_relay import to_global_id
+
+from accounts.models import User
+from books.models import Book, BookTagCount
+from comments.models import Comment
+
+SAMPLE_SIZE = 500
+
+BOOK_ORDERS = (
+    'title_ASC', 'title_DESC', 'publicationDate_DESC', 'creationDate_DESC', 'genre_ASC',
+)
+
+STATUSES = ('wish', 'read', 'like')
+
+BOOK_FIELDS = '''
+    pk title genre tags cover(size: THUMB) coverPlaceholder
+    owner { username }
+    writer { name }
+    wishCount readCount likeCount
+'''
+
+OPERATIONS = [
+    {
+        'name': 'BenchmarkBooks',
+        'weight': 25,
+        'query': '''
+            query BenchmarkBooks($orderBy: BookOrderBy) {
+              viewer { books(first: 20, orderBy: $orderBy) { edges { node { %s } } } }
+            }
+        ''' % BOOK_FIELDS,
+        'variables': lambda dataset, rng: {'orderBy': rng.choice(BOOK_ORDERS)},
+    },
+    {
+        'name': 'BenchmarkBooksByTag',
+        'weight': 20,
+        'requires': ('books', 'tags'),
+        'query': '''
+            query BenchmarkBooksByTag($tags: [String], $orderBy: BookOrderBy) {
+              viewer { books(first: 20, tags: $tags, orderBy: $orderBy) { edges { node { %s } } } }
+            }
+        ''' % BOOK_FIELDS,
+        'variables': lambda dataset, rng: {
+            'tags': [rng.choice(dataset['tags'])],
+            'orderBy': rng.choice(BOOK_ORDERS),
+        },
+    },
+    {
+        'name': 'BenchmarkBookNode',
+        'weight': 30,
+        'requires': ('books',),
+        'query': '''
+            query BenchmarkBookNode($id: ID!) {
+              node(id: $id) {
+                ... on BookType {
+                  title description tags
+                  writer { name }
+                  wishCount readCount likeCount
+                  similarBooks(first: 5) { title }
+                  comments(first: 10) { edges { node { message replyCount owner { username } } } }
+                }
+              }
+            }
+        ''',
+        'variables': lambda dataset, rng: {'id': to_global_id('BookType', rng.choice(dataset['books']))},
+    },
+    {
+        'name': 'BenchmarkTokenAuth',
+        'weight': 5,
+        'requires': ('users',),
+        'mutation': True,
+        'query': '''
+            mutation BenchmarkTokenAuth($input: ObtainJSONWebTokenInput!) {
+              tokenAuth(input: $input) { token }
+            }
+        ''',
+        'variables': lambda dataset, rng: {
+            'input': {'email': rng.choice(dataset['users'])[1], 'password': dataset['password']},
+        },
+    },
+    {
+        'name': 'BenchmarkCreateReader',
+        'weight': 12,
+        'requires': ('books', 'users'),
+        'mutation': True,
+        'user': True,
+        'query': '''
+            mutation BenchmarkCreateReader($bookId: Int!, $status: String!) {
+              createReader(bookId: $bookId, statuts: $status) { status }
+            }
+        ''',
+        'variables': lambda dataset, rng: {
+            'bookId': rng.choice(dataset['books']),
+            'status': rng.choice(STATUSES),
+        },
+    },
+    {
+        'name': 'BenchmarkCreateComment',
+        'weight': 8,
+        'requires': ('comments', 'users'),
+        'mutation': True,
+        'user': True,
+        'query': '''
+            mutation BenchmarkCreateComment($input: CreateCommentMutationInput!) {
+              createComment(input: $input) { comment { id } errors { field messages } }
+            }
+        ''',
+        'variables': lambda dataset, rng: get_comment_input(dataset, rng),
+    },
+]
+
+
+def get_comment_input(dataset: dict, rng) -> dict:
+    # Comments are replies: the mutation requires a parent
+    parent, book = rng.choice(dataset['comments'])
+    return {'input': {'message': 'Benchmark reply', 'content': book, 'parent': parent}}
+
+
+def load_dataset(rng, password: str, prefix: str = 'seed') -> dict:
+    """
+    Returns samples of the books, popular tags, users (pk and email, those
+    prefixed with prefix if any) and comments (pk and book) to run the
+    operations against.
+    """
+    users = User.objects.filter(username__startswith=prefix)
+    if not users.exists():
+        users = User.objects.all()
+    return {
+        'books': sample_pks(Book.objects.all(), rng),
+        'tags': list(BookTagCount.objects.filter(count__gt=0).order_by('-count').values_list(
+            'tag__name', flat=True,
+        )[:SAMPLE_SIZE]),
+        'users': list(users.order_by('username').values_list('pk', 'email')[:SAMPLE_SIZE]),
+        'comments': sample_pks(Comment.objects.all(), rng, 'content_id'),
+        'password': password,
+    }
+
+
+def sample_pks(queryset, rng, *fields) -> list:
+    """
+    Returns about SAMPLE_SIZE primary keys of queryset (with fields, if
+    given), drawn uniformly between the first and last ones: cheaper than a
+    random ordering on large tables, and reproducible.
+    """
+    bounds = queryset.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return []
+    candidates = {rng.randint(bounds['first'], bounds['last']) for _ in range(SAMPLE_SIZE)}
+    rows = queryset.filter(pk__in=candidates).order_by('pk').values_list('pk', *fields)
+    return list(rows) if fields else [row[0] for row in rows]
@@ -0,0 +1,202 @@
+"""
+Catalogue of representative GraphQL operations and of their SQL query
+budgets, checked by `manage.py check_query_budgets` (see the command).
+
+seed(size) creates a fixture whose every relation grows with size; an
+operation whose number of queries changes from one size to the other runs
+queries per object (N+1).
+"""
+from graphql_relay import to_global_id
+
+from accounts.models import User
+from books.models import Book, Reader, Writer
+from comments.models import Comment
+
+STATUSES = ('wish', 'read', 'like')
+
+OPERATIONS = [
+    {
+        'name': 'BookList',
+        'budget': 4,
+        'query': '''
+            query BookList {
+              viewer {
+                books(first: 10) {
+                  edges { node {
+                    pk title genre tags cover(size: THUMB) coverPlaceholder
+                    owner { username }
+                    writer { name }
+                    wishCount readCount likeCount
+                  } }
+                }
+              }
+            }
+        ''',
+    },
+    {
+        'name': 'BookDetail',
+        'budget': 8,
+        'query': '''
+            query BookDetail($id: ID!) {
+              node(id: $id) {
+                ... on BookType {
+                  title description tags
+                  writer { name }
+                  reader(first: 10) { edges { node { status user { username avatar } } } }
+                  similarBooks(first: 5) { title writer { name } }
+                  comments(first: 10) {
+                    edges { node { message replyCount owner { username } } }
+                  }
+                }
+              }
+            }
+        ''',
+        'variables': lambda fixture: {'id': to_global_id('BookType', fixture['book'])},
+    },
+    {
+        'name': 'CurrentUser',
+        'budget': 1,
+        'user': True,
+        'query': '''
+            query CurrentUser {
+              viewer { isLoggedIn currentUser { username email avatar tags } }
+            }
+        ''',
+    },
+    {
+        'name': 'UserList',
+        'budget': 2,
+        'query': '''
+            query UserList {
+              viewer {
+                users(first: 10) {
+                  edges { node { username avatar location tags } }
+                }
+              }
+            }
+        ''',
+    },
+    {
+        'name': 'CommentThreads',
+        'budget': 3,
+        'query': '''
+            query CommentThreads($id: ID!) {
+              node(id: $id) {
+                ... on BookType {
+                  commentThreads(depth: 3) {
+                    message owner { username }
+                    children {
+                      message owner { username }
+                      children { message owner { username } }
+                    }
+                  }
+                }
+              }
+            }
+        ''',
+        'variables': lambda fixture: {'id': to_global_id('BookType', fixture['book'])},
+    },
+    {
+        'name': 'CommentReplies',
+        'budget': 4,
+        'query': '''
+            query CommentReplies($id: ID!) {
+              node(id: $id) {
+                ... on CommentType {
+                  message replyCount
+                  thread(depth: 2) { message owner { username } children { message } }
+                  replies(first: 10) { edges { node { message replyCount } } }
+                }
+              }
+            }
+        ''',
+        'variables': lambda fixture: {'id': to_global_id('CommentType', fixture['comment'])},
+    },
+    {
+        'name': 'BookComments',
+        'budget': 4,
+        'query': '''
+            query BookComments($id: ID!) {
+              node(id: $id) {
+                ... on BookType {
+                  comments(first: 10) {
+                    edges { node {
+                      message owner { username }
+                      replies(first: 3) { edges { node { message replyCount owner { username } } } }
+                    } }
+                  }
+                }
+              }
+            }
+        ''',
+        'variables': lambda fixture: {'id': to_global_id('BookType', fixture['book'])},
+    },
+    {
+        'name': 'BookListComments',
+        'budget': 3,
+        'query': '''
+            query BookListComments {
+              viewer {
+                books(first: 10) {
+                  edges { node {
+                    title
+                    comments(first: 3) { edges { node { message replyCount owner { username } } } }
+                  } }
+                }
+              }
+            }
+        ''',
+    },
+]
+
+
+def seed(size: int) -> dict:
+    """
+    Creates size users, books and comment threads per book, the books being
+    read by size users. Returns the primary keys of the objects the
+    operations start from, and of the user logged in.
+    """
+    prefix = 'budget{}-'.format(size)
+    users = [
+        User.objects.create(
+            username='{}{}'.format(prefix, i),
+            email='{}{}@example.com'.format(prefix, i),
+            location='Paris',
+        )
+        for i in range(size)
+    ]
+    for i, user in enumerate(users):
+        user.tags.add(*('{}tag{}'.format(prefix, (i + k) % size) for k in range(3)))
+
+    books = []
+    for i in range(size):
+        book = Book.objects.create(
+            title='{}book {}'.format(prefix, i),
+            description='A book.',
+            genre='sf',
+            owner=users[i],
+        )
+        book.writer.add(*(
+            Writer.objects.get_or_create(name='{}writer {}'.format(prefix, (i + k) % size))[0]
+            for k in range(2)
+        ))
+        book.tags.add(*('{}tag{}'.format(prefix, (i + k) % size) for k in range(3)))
+        for j, user in enumerate(users):
+            Reader.objects.create(user=user, book=book, status=STATUSES[(i + j) % len(STATUSES)])
+        books.append(book)
+
+    book = books[0]
+    for i in range(size):
+        comment = Comment.objects.create(message='Comment {}'.format(i), content=book, owner=users[i])
+        for j in range(size):
+            reply = Comment.objects.create(
+                message='Reply {}'.format(j), content=book, owner=users[j], parent=comment,
+            )
+            Comment.objects.create(
+                message='Nested reply', content=book, owner=users[(i + j) % size], parent=reply,
+            )
+    return {
+        'user': users[0].pk,
+        'book': book.pk,
+        'comment': Comment.objects.filter(content=book, level=0).order_by('pk').first().pk,
+    }
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'taggit',
     'mptt',
 
+    'lib',
     'accounts',
     'books',
     'comments',
@@ -132,9 +133,100 @@ GRAPHENE = {
     'SCHEMA': 'zola.schema.schema',
     'MIDDLEWARE': [
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
+        'lib.metrics.MetricsMiddleware',
     ],
 }
 
+# Number of parsed and validated GraphQL documents kept by each process
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+
+# 'auto': automatic persisted queries, ad-hoc documents are accepted.
+# 'allowlist': only the documents of GRAPHQL_QUERY_ALLOWLIST are executed.
+# See lib.documents.
+GRAPHQL_PERSISTED_QUERIES = 'auto'
+
+# In 'auto' mode, registered documents expire after a day, and registrations
+# are bounded in size and per hour
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = 24 * 3600
+GRAPHQL_PERSISTED_QUERY_MAX_LENGTH = 20000
+GRAPHQL_PERSISTED_QUERY_REGISTRATIONS = 1000
+
+# Path to a JSON {sha256: document} object
+GRAPHQL_QUERY_ALLOWLIST = None
+
+# Cache of the anonymous queries' responses, see lib.response_cache. Writes
+# only invalidate the entries of the cache they are made with: it is enabled
+# when the entries are shared by every worker process (RESPONSE_CACHE_DIR, see
+# CACHES), local memory being only safe with a single process.
+RESPONSE_CACHE = {
+    'ENABLED': bool(os.environ.get('RESPONSE_CACHE_DIR')),
+    'CACHE': 'responses',
+    'TIMEOUT': 300,
+    # Models updated in bulk along with the models they derive from
+    'DEPENDENCIES': {
+        'books.Reader': ['books.ReaderStatusCount', 'books.BookSimilarity'],
+        'books.TaggedBook': ['books.BookTagCount', 'books.BookSimilarity'],
+        'accounts.TaggedUser': ['accounts.UserTagCount'],
+    },
+}
+
+# Limits of the operations' static cost analysis, see lib.cost
+GRAPHQL_COST = {
+    'MAX_COST': 5000,
+    'MAX_DEPTH': 8,
+    'MAX_PAGE_SIZE': 100,
+    'FIELD_COSTS': {
+        # Computed with a GROUP BY over the tagged users
+        'UserType.similarUsers': 10,
+    },
+    'LIST_SIZES': {
+        'BookType.similarBooks': 20,
+        'UserType.similarUsers': 20,
+    },
+}
+
+# Catalogue of operations checked by `manage.py check_query_budgets`
+GRAPHQL_QUERY_BUDGETS = 'zola.query_budgets'
+
+# Operation mix run by `manage.py benchmark_graphql`
+GRAPHQL_BENCHMARK = 'zola.benchmark'
+
+# Operations measured for /metrics, see lib.metrics
+METRICS = {
+    'SAMPLE_RATE': 1.0,
+    # Fraction of the measured operations whose resolvers are timed
+    'RESOLVER_SAMPLE_RATE': 0.01,
+    # Required as a bearer token by /metrics, which is only open without one
+    # when DEBUG is on
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+}
+
+# Operations recorded for `manage.py benchmark_graphql --replay`, see
+# lib.traffic
+TRAFFIC_RECORDING = {
+    'PATH': os.environ.get('GRAPHQL_RECORDING_PATH'),
+    'SAMPLE_RATE': 0.1,
+}
+
+
+# ############ CACHES ########################
+
+# Use a shared backend in production so that every process benefits from the
+# cached responses, e.g. FileBasedCache or a Redis cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['RESPONSE_CACHE_DIR'],
+    } if os.environ.get('RESPONSE_CACHE_DIR') else {
+        # Per process: only used by single-process setups (see RESPONSE_CACHE)
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+    },
+}
+
 
 # ############ AUTH ########################
 AUTH_USER_MODEL = 'accounts.User'
@@ -187,3 +279,18 @@ MAX_FILE_SIZES = {
     "video_thumbnail": 5*1024*1024,
     "audio_thumbnail": 5*1024*1024,
 }
+
+# Worker threads running the background tasks, such as rendering the covers
+# (see lib.tasks)
+BACKGROUND_TASKS = {
+    'WORKERS': 2,
+    'EAGER': False,
+}
+
+# Serving of the uploaded files, see lib.media
+MEDIA_SERVING = {
+    'MAX_AGE': 3600,
+    # Set when nginx serves MEDIA_ROOT from an internal location
+    'ACCEL_REDIRECT_PREFIX': None,
+    'SENDFILE': False,
+}
@@ -36,6 +36,9 @@ DATABASES = {
 
 GRAPHQL_JWT['JWT_EXPIRATION_DELTA'] = timedelta(hours=12)
 
+# runserver is a single process, whose local memory cache is up to date
+RESPONSE_CACHE['ENABLED'] = True
+
 # ############ Storage ########################
 
 MEDIA_ROOT = PARENT_DIR / 'medias'